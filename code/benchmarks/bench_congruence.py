@@ -0,0 +1,60 @@
+"""
+Times equality queries answered by ``src.congruence`` on a grid of commuting squares, each stated as an equation.
+
+Run from the ``code`` directory with::
+
+    python -m benchmarks.bench_congruence [squares along each side] [number of queries]
+"""
+import random
+import sys
+import time
+
+from src.congruence import Congruence
+from src.morphism_parser import MorphismParser
+
+
+def grid_equations(n: int) -> list[str]:
+    """
+    :return: an equation for each square of an ``n`` by ``n`` grid, where ``f_{i,j}`` goes down from ``(i, j)`` and
+    ``g_{i,j}`` goes right from it
+    """
+    return [f"{{g_{{{i + 1},{j}}}}}{{f_{{{i},{j}}}}} = {{f_{{{i},{j + 1}}}}}{{g_{{{i},{j}}}}}"
+            for i in range(n) for j in range(n)]
+
+
+def random_path(n: int, rng: random.Random) -> str:
+    """
+    :return: a composite going from the top left of the grid to the bottom right
+    """
+    i = j = 0
+    morphs = []
+    while i < n or j < n:
+        if j == n or (i < n and rng.random() < 0.5):
+            morphs.append(f"{{f_{{{i},{j}}}}}")
+            i += 1
+        else:
+            morphs.append(f"{{g_{{{i},{j}}}}}")
+            j += 1
+    return "".join(reversed(morphs))
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    num_queries = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    rng = random.Random(0)
+    queries = [(random_path(n, rng), random_path(n, rng)) for _ in range(num_queries)]
+    congruence = Congruence(MorphismParser.from_stream(grid_equations(n)))
+    start = time.perf_counter()
+    if not congruence.equal(*queries[0]):
+        raise Exception("Paths through the grid should all be equal")
+    first_time = time.perf_counter() - start
+    start = time.perf_counter()
+    for first, second in queries:
+        congruence.equal(first, second)
+    query_time = time.perf_counter() - start
+    print(f"{n}x{n} grid: first query in {first_time:.3f}s, {len(congruence)} classes, "
+          f"then {num_queries / query_time:.0f} queries/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+Measures how long the parsers take to import in a fresh interpreter, using ``python -X importtime``, and fails if it's
+over budget or if networkx is imported, since short-lived conversion processes spend much of their time starting up.
+
+Run from the ``code`` directory with::
+
+    python -m benchmarks.bench_import [budget in milliseconds]
+
+Exits with status 1 if the budget is exceeded.
+"""
+import os
+import subprocess
+import sys
+
+MODULES = ("src.diagram_parser", "src.morphism_parser", "src.batch")
+RUNS = 5
+
+
+def import_times() -> tuple[dict[str, int], set[str]]:
+    """
+    Imports ``MODULES`` in a fresh interpreter.
+    :return: the cumulative import time of each module in microseconds, and every module that was imported
+    """
+    code = "import " + ", ".join(MODULES)
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True,
+                            check=True, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    times = {}
+    imported = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        name = name.strip()
+        imported.add(name)
+        times[name] = int(cumulative)
+    return times, imported
+
+
+def main() -> int:
+    budget_ms = float(sys.argv[1]) if len(sys.argv) > 1 else 150
+    best: dict[str, int] = {}
+    imported: set[str] = set()
+    for _ in range(RUNS):
+        times, imported = import_times()
+        for module in MODULES:
+            best[module] = min(best.get(module, times.get(module, 0)), times.get(module, 0))
+    total_ms = sum(best.values()) / 1000
+    for module in MODULES:
+        print(f"{module:22} {best[module] / 1000:8.1f} ms")
+    print(f"{'total':22} {total_ms:8.1f} ms (budget {budget_ms:.0f} ms)")
+    failed = False
+    if "networkx" in imported:
+        print("networkx was imported", file=sys.stderr)
+        failed = True
+    if total_ms > budget_ms:
+        print("import time is over budget", file=sys.stderr)
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
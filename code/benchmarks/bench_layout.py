@@ -0,0 +1,78 @@
+"""
+Compares the layouts ``Converter.position_nodes`` can use on grids of commuting squares, which are planar, and on
+random diagrams, which mostly aren't, and laying out many random diagrams as one diagram or each on its own.
+
+Run from the ``code`` directory with::
+
+    python -m benchmarks.bench_layout [largest number of objects]
+"""
+import random
+import sys
+import time
+
+from src.compact_graph import CompactGraph
+from src.converter import Converter
+
+
+def squares(n: int) -> CompactGraph:
+    edges = []
+    for i in range(n + 1):
+        for j in range(n + 1):
+            if i < n:
+                edges.append(((i, j), (i + 1, j), f"{{f_{i}_{j}}}"))
+            if j < n:
+                edges.append(((i, j), (i, j + 1), f"{{g_{i}_{j}}}"))
+    return CompactGraph.from_edges(edges)
+
+
+def random_diagram(num_nodes: int, seed: int = 0) -> CompactGraph:
+    rnd = random.Random(seed)
+    edges = set()
+    while len(edges) < 3 * num_nodes:
+        domain, codomain = rnd.sample(range(num_nodes), 2)
+        edges.add((domain, codomain))
+    return CompactGraph.from_edges((domain, codomain, f"{{f_{domain}_{codomain}}}") for domain, codomain in edges)
+
+
+def atlas(num_diagrams: int, num_nodes: int) -> CompactGraph:
+    """
+    :return: ``num_diagrams`` random diagrams with ``num_nodes`` objects each, as the components of one diagram
+    """
+    edges = []
+    for diagram in range(num_diagrams):
+        graph = random_diagram(num_nodes, diagram)
+        edges.extend(((diagram, graph.nodes[graph.edge_src[edge]]), (diagram, graph.nodes[graph.edge_dst[edge]]),
+                      graph.edge_labels[edge]) for edge in graph.edges())
+    return CompactGraph.from_edges(edges)
+
+
+def time_layout(graph: CompactGraph, layout: str, components: bool = False) -> float:
+    converter = Converter()
+    converter.core = graph
+    start = time.perf_counter()
+    converter.position_nodes(layout=layout, components=components)
+    return time.perf_counter() - start
+
+
+def main():
+    Converter.layout_cache = None
+    largest = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    print("diagram              objects  layout   seconds")
+    num_nodes = 100
+    while num_nodes <= largest:
+        side = int(num_nodes ** 0.5)
+        for name, graph, layouts in ((f"squares {side}x{side}", squares(side - 1), ("grid", "layered", "force", "spring")),
+                                     ("random", random_diagram(num_nodes), ("layered", "force", "spring"))):
+            for layout in layouts:
+                seconds = time_layout(graph, layout)
+                print(f"{name:20} {graph.number_of_nodes():7}  {layout:7} {seconds:8.3f}")
+        num_nodes *= 4
+    graph = atlas(largest // 40, 40)
+    for layout in ("layered", "force", "spring"):
+        for components in (False, True):
+            name = f"{largest // 40} random, {'apart' if components else 'together'}"
+            print(f"{name:20} {graph.number_of_nodes():7}  {layout:7} {time_layout(graph, layout, components):8.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""
+Compares parsing a large morphism file in one process with parsing it in chunks, see ``MorphismParser``'s
+``workers``.
+
+Run from the ``code`` directory with::
+
+    python -m benchmarks.bench_parse_chunks [number of squares] [workers ...]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_snapshot import latex_ladder
+from src.morphism_parser import MorphismParser
+
+
+def ladder_equations(n: int) -> list[str]:
+    """
+    :return: an equation for each square of a ladder of ``n`` squares, with labels like those in real diagrams, in a
+    random order so that most chunks share morphisms with others
+    """
+    edges = latex_ladder(n)
+    lines = []
+    for i in range(n):
+        # a_i, b_i and r_i, then r_n last
+        a, b, r = (morph for morph, _, _ in edges[3 * i:3 * i + 3])
+        r_next = edges[3 * i + 5][0] if i < n - 1 else edges[-1][0]
+        lines.append(f"{{{r_next}}}{{{a}}} = {{{b}}}{{{r}}}")
+    random.Random(0).shuffle(lines)
+    return lines
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    worker_counts = [int(arg) for arg in sys.argv[2:]] or [2, 4, os.cpu_count() or 1]
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "equations.txt")
+        with open(path, "w") as f:
+            f.write("\n".join(ladder_equations(size)))
+        start = time.perf_counter()
+        expected = MorphismParser(path)
+        sequential = time.perf_counter() - start
+        print(f"{os.path.getsize(path) / 1e6:.1f}MB, {len(expected.morphs)} morphisms, {os.cpu_count()} CPUs")
+        print(f"    sequential: {sequential:.3f}s")
+        for workers in worker_counts:
+            start = time.perf_counter()
+            parser = MorphismParser(path, workers=workers)
+            seconds = time.perf_counter() - start
+            if parser.counter != expected.counter or len(parser.obj_parent) != len(expected.obj_parent):
+                raise Exception("The chunked parse doesn't match the sequential one")
+            print(f"{workers:3} workers: {seconds:.3f}s, {sequential / seconds:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""
+Shows how ``Converter.to_morphism_representation`` scales on long chains, ladders of commuting squares, and wide fan-out
+diagrams. Chains and ladders this long used to exceed Python's recursion limit.
+
+Run from the ``code`` directory with::
+
+    python -m benchmarks.bench_search
+"""
+import time
+
+from src.compact_graph import CompactGraph
+from src.converter import Converter
+
+
+def chain(n: int) -> CompactGraph:
+    return CompactGraph.from_edges((i, i + 1, f"{{f_{i}}}") for i in range(n))
+
+
+def ladder(n: int) -> CompactGraph:
+    edges = []
+    for i in range(n):
+        edges.append((("a", i), ("a", i + 1), f"{{a_{i}}}"))
+        edges.append((("b", i), ("b", i + 1), f"{{b_{i}}}"))
+        edges.append((("a", i), ("b", i), f"{{r_{i}}}"))
+    return CompactGraph.from_edges(edges)
+
+
+def fan_out(n: int) -> CompactGraph:
+    edges = []
+    for i in range(n):
+        edges.append(("source", i, f"{{f_{i}}}"))
+        edges.append((i, "sink", f"{{g_{i}}}"))
+    return CompactGraph.from_edges(edges)
+
+
+def time_representation(graph: CompactGraph) -> tuple[float, int]:
+    converter = Converter()
+    converter.core = graph
+    start = time.perf_counter()
+    rep = converter.to_morphism_representation()
+    return time.perf_counter() - start, rep.count("\n") + 1
+
+
+def main():
+    for name, generator, sizes in (("chain", chain, (1000, 4000, 16000, 64000)),
+                                   ("ladder", ladder, (25, 50, 100, 200)),
+                                   ("fan-out", fan_out, (1000, 4000, 16000, 64000))):
+        prev_time = None
+        for n in sizes:
+            elapsed, lines = time_representation(generator(n))
+            growth = f"{elapsed / prev_time:.1f}x" if prev_time else "-"
+            print(f"{name:>8} n={n:<6} {elapsed:8.3f}s  {lines:6} lines  growth {growth}")
+            prev_time = elapsed
+
+
+if __name__ == '__main__':
+    main()
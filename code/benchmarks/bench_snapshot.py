@@ -0,0 +1,56 @@
+"""
+Compares parsing large diagrams with loading them from a snapshot, see ``src.snapshot``.
+
+Run from the ``code`` directory with::
+
+    python -m benchmarks.bench_snapshot [number of squares]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_suite import diagram_text, ladder, star
+from src.diagram_parser import DiagramParser
+from src.morphism_parser import MorphismParser
+from src.snapshot import load
+
+
+def latex_ladder(n: int) -> list[tuple[str, str, str]]:
+    """
+    :return: ``ladder(n)`` with labels like those in real diagrams
+    """
+    return [(f"\\mathscr{{A}}^{{\\mathrm{{op}}}} \\times \\mathscr{{B}}_{{{morph}}}",
+             f"\\mathbf{{Set}}^{{\\mathscr{{C}}_{{{domain}}}}}", f"\\mathbf{{Set}}^{{\\mathscr{{C}}_{{{codomain}}}}}")
+            for morph, domain, codomain in ladder(n)]
+
+
+def compare(name: str, path: str, parser_class):
+    start = time.perf_counter()
+    parsed = parser_class(path)
+    parse_time = time.perf_counter() - start
+    load(path, parser_class)  # writes the snapshot
+    start = time.perf_counter()
+    loaded = load(path, parser_class)
+    load_time = time.perf_counter() - start
+    if loaded.to_diagram_representation() != parsed.to_diagram_representation():
+        raise Exception("The snapshot doesn't match the parsed diagram")
+    print(f"{name:>10}: {os.path.getsize(path) / 1e6:5.1f}MB source, {os.path.getsize(path + '.snap') / 1e6:5.1f}MB "
+          f"snapshot, parsed in {parse_time:.3f}s, loaded in {load_time:.3f}s, {parse_time / load_time:.1f}x faster")
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 30000
+    with tempfile.TemporaryDirectory() as directory:
+        diagram_path = os.path.join(directory, "diagram.txt")
+        with open(diagram_path, "w") as f:
+            f.write(diagram_text(latex_ladder(size)))
+        compare("diagram", diagram_path, DiagramParser)
+        morphism_path = os.path.join(directory, "morphisms.txt")
+        with open(morphism_path, "w") as f:
+            f.write(DiagramParser.from_stream(diagram_text(star(size)).splitlines()).to_morphism_representation())
+        compare("morphisms", morphism_path, MorphismParser)
+
+
+if __name__ == '__main__':
+    main()
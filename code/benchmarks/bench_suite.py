@@ -0,0 +1,238 @@
+"""
+Times each stage of the conversion pipeline on synthetic diagrams of growing size, and reports the results as JSON.
+
+Each family of diagrams is written out as a diagram representation, parsed with ``DiagramParser``, converted with
+``to_morphism_representation``, written out again, parsed with ``MorphismParser``, converted back with
+``to_diagram_representation`` and laid out with ``position_nodes``. For every stage the report has the time at each
+size and the growth exponent between the two largest sizes, ``log(time ratio) / log(size ratio)``, which is about 1 for
+a linear stage.
+
+Run from the ``code`` directory with::
+
+    python -m benchmarks.bench_suite [--family NAME ...] [--scale S] [--budget SECONDS] [--output FILE]
+                                     [--keep DIR] [--max-exponent E]
+
+A stage that takes longer than the budget isn't run on the larger sizes of that family. With ``--max-exponent`` the
+benchmark exits with status 1 if any stage grows faster than that.
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from typing import Callable, Optional
+
+from src.converter import Converter
+from src.diagram_parser import DiagramParser
+from src.morphism_parser import MorphismParser
+
+Edges = list[tuple[str, str, str]]
+STAGES = ("parse diagram", "to_morphism_representation", "parse morphisms", "to_diagram_representation",
+          "to_morphism_representation cycles", "position_nodes")
+# a stage has to take at least this long at both sizes for its growth exponent to mean anything
+MIN_SECONDS = 0.005
+
+
+def squares(n: int) -> Edges:
+    """
+    :return: an ``n`` by ``n`` grid of commuting squares
+    """
+    edges = []
+    for i in range(n + 1):
+        for j in range(n + 1):
+            if i < n:
+                edges.append((f"f_{{{i},{j}}}", f"A_{{{i},{j}}}", f"A_{{{i + 1},{j}}}"))
+            if j < n:
+                edges.append((f"g_{{{i},{j}}}", f"A_{{{i},{j}}}", f"A_{{{i},{j + 1}}}"))
+    return edges
+
+
+def ladder(n: int) -> Edges:
+    """
+    :return: a row of ``n`` commuting squares
+    """
+    edges = []
+    for i in range(n):
+        edges.append((f"a_{{{i}}}", f"A_{{{i}}}", f"A_{{{i + 1}}}"))
+        edges.append((f"b_{{{i}}}", f"B_{{{i}}}", f"B_{{{i + 1}}}"))
+        edges.append((f"r_{{{i}}}", f"A_{{{i}}}", f"B_{{{i}}}"))
+    edges.append((f"r_{{{n}}}", f"A_{{{n}}}", f"B_{{{n}}}"))
+    return edges
+
+
+def star(n: int) -> Edges:
+    """
+    :return: ``n`` morphisms out of one object, each followed by a morphism into another
+    """
+    edges = []
+    for i in range(n):
+        edges.append((f"f_{{{i}}}", "S", f"A_{{{i}}}"))
+        edges.append((f"g_{{{i}}}", f"A_{{{i}}}", "T"))
+    return edges
+
+
+def random_dag(n: int, seed: int = 0) -> Edges:
+    """
+    :return: ``n`` objects with about two morphisms out of each, each going to one of the next few objects, so that
+    the number of paths between two objects stays reasonable
+    """
+    rnd = random.Random(seed)
+    pairs = set()
+    for i in range(n - 1):
+        for _ in range(2):
+            pairs.add((i, rnd.randint(i + 1, min(n - 1, i + 4))))
+    return [(f"f_{{{i},{j}}}", f"A_{{{i}}}", f"A_{{{j}}}") for i, j in sorted(pairs)]
+
+
+def cyclic(n: int) -> Edges:
+    """
+    :return: two cycles of ``n`` objects, joined by a morphism between each pair of corresponding objects
+    """
+    edges = []
+    for i in range(n):
+        edges.append((f"a_{{{i}}}", f"A_{{{i}}}", f"A_{{{(i + 1) % n}}}"))
+        edges.append((f"b_{{{i}}}", f"B_{{{i}}}", f"B_{{{(i + 1) % n}}}"))
+        edges.append((f"r_{{{i}}}", f"A_{{{i}}}", f"B_{{{i}}}"))
+    return edges
+
+
+def nested(depth: int, length: int = 20) -> Edges:
+    """
+    :return: a ladder of ``length`` squares where every label is nested ``depth`` groups deep
+    """
+    def nest(label: str) -> str:
+        return "\\overline{" * depth + label + "}" * depth
+    return [(nest(morph), nest(domain), nest(codomain)) for morph, domain, codomain in ladder(length)]
+
+
+FAMILIES: dict[str, tuple[Callable[[int], Edges], tuple[int, ...]]] = {
+    "squares": (squares, (4, 8, 16, 32)),
+    "ladder": (ladder, (100, 400, 1600, 6400)),
+    "star": (star, (250, 1000, 4000, 16000)),
+    "random_dag": (random_dag, (250, 1000, 4000, 16000)),
+    "cyclic": (cyclic, (100, 400, 1600, 6400)),
+    "nested": (nested, (8, 32, 128, 512)),
+}
+
+
+def diagram_text(edges: Edges) -> str:
+    return "\n".join(f"{{{morph}}}{{{domain}}}{{{codomain}}}" for morph, domain, codomain in edges) + "\n"
+
+
+def timed(func: Callable, *args) -> tuple[float, object]:
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def run_size(edges: Edges, directory: str, name: str, skip: set[str]) -> dict:
+    """
+    Runs every stage not in ``skip`` on one diagram, writing its representations to ``directory``.
+    :return: the sizes of the diagram and the time each stage took, ``None`` for skipped stages
+    """
+    diagram_path = os.path.join(directory, name + ".diagram.txt")
+    morphism_path = os.path.join(directory, name + ".morphisms.txt")
+    text = diagram_text(edges)
+    with open(diagram_path, "w") as f:
+        f.write(text)
+    seconds: dict[str, Optional[float]] = dict.fromkeys(STAGES)
+    seconds["parse diagram"], diagram = timed(DiagramParser, diagram_path)
+    rep = ""
+    if "to_morphism_representation" not in skip:
+        seconds["to_morphism_representation"], rep = timed(diagram.to_morphism_representation)
+        with open(morphism_path, "w") as f:
+            f.write(rep)
+        if "parse morphisms" not in skip:
+            seconds["parse morphisms"], morphisms = timed(MorphismParser, morphism_path)
+            if "to_diagram_representation" not in skip:
+                seconds["to_diagram_representation"], _ = timed(morphisms.to_diagram_representation)
+    if "to_morphism_representation cycles" not in skip:
+        seconds["to_morphism_representation cycles"], _ = timed(diagram.to_morphism_representation, "cycles")
+    if "position_nodes" not in skip:
+        seconds["position_nodes"], _ = timed(diagram.position_nodes)
+    core = diagram.compact_graph()
+    return {"objects": core.number_of_nodes(), "morphisms": core.number_of_edges(), "diagram_bytes": len(text),
+            "morphism_bytes": len(rep) if seconds["to_morphism_representation"] is not None else None,
+            "equations": rep.count("\n") + 1 if rep else 0, "seconds": seconds}
+
+
+def exponent(small: dict, large: dict, stage: str, size_key: str) -> Optional[float]:
+    """
+    :return: how fast ``stage`` grows between two runs, relative to ``size_key``, if both runs took long enough to tell
+    """
+    t_small, t_large = small["seconds"][stage], large["seconds"][stage]
+    if t_small is None or t_large is None or min(t_small, t_large) < MIN_SECONDS:
+        return None
+    if large[size_key] == small[size_key]:
+        return None
+    return math.log(t_large / t_small) / math.log(large[size_key] / small[size_key])
+
+
+def run_family(name: str, scale: float, budget: float, directory: str) -> dict:
+    generator, sizes = FAMILIES[name]
+    runs = []
+    skip: set[str] = set()
+    for size in sizes:
+        size = max(1, round(size * scale))
+        result = run_size(generator(size), directory, f"{name}_{size}", skip)
+        result["size"] = size
+        runs.append(result)
+        print(f"{name:>10} size={size:<6} " + " ".join(
+            f"{stage}={seconds:.3f}s" for stage, seconds in result["seconds"].items() if seconds is not None),
+            file=sys.stderr)
+        skip.update(stage for stage, seconds in result["seconds"].items() if seconds is not None and seconds > budget)
+    # nested diagrams all have the same number of morphisms, but longer labels
+    size_key = "diagram_bytes" if name == "nested" else "morphisms"
+    exponents = {}
+    for stage in STAGES:
+        measured = [run for run in runs if run["seconds"][stage] is not None]
+        exponents[stage] = exponent(measured[-2], measured[-1], stage, size_key) if len(measured) >= 2 else None
+    return {"family": name, "size_measure": size_key, "runs": runs, "exponents": exponents}
+
+
+def main() -> int:
+    arg_parser = argparse.ArgumentParser(description="Times each stage of the conversion pipeline on synthetic "
+                                                     "diagrams of growing size.")
+    arg_parser.add_argument("--family", action="append", choices=sorted(FAMILIES),
+                            help="a family of diagrams to run, by default all of them")
+    arg_parser.add_argument("--scale", type=float, default=1.0, help="multiplies every size")
+    arg_parser.add_argument("--budget", type=float, default=5.0,
+                            help="seconds a stage may take before it is skipped on larger sizes")
+    arg_parser.add_argument("--output", default=None, help="file to write the JSON report to, instead of stdout")
+    arg_parser.add_argument("--keep", default=None, metavar="DIR",
+                            help="directory to keep the generated representations in")
+    arg_parser.add_argument("--max-exponent", type=float, default=None,
+                            help="fail if any stage grows faster than size to this power")
+    args = arg_parser.parse_args()
+
+    # every diagram is new, so the cache would only cost time
+    Converter.layout_cache = None
+    # so that the first layout doesn't include importing networkx
+    DiagramParser.from_stream(["{f}{A}{B}"]).position_nodes()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        directory = args.keep or temp_dir
+        os.makedirs(directory, exist_ok=True)
+        families = [run_family(name, args.scale, args.budget, directory) for name in args.family or FAMILIES]
+    report = {"python": platform.python_version(), "machine": platform.machine(), "scale": args.scale,
+              "families": families}
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.max_exponent is not None:
+        too_fast = [(family["family"], stage, value) for family in families
+                    for stage, value in family["exponents"].items() if value is not None and value > args.max_exponent]
+        for family, stage, value in too_fast:
+            print(f"{family}: {stage} grows as size^{value:.2f}", file=sys.stderr)
+        return 1 if too_fast else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,129 @@
+"""
+Compares ``src.tokenizer`` against the character-by-character loops the parsers used to use.
+
+Run from the ``code`` directory with::
+
+    python -m benchmarks.bench_tokenizer [size in MB]
+"""
+import sys
+import time
+
+from src.tokenizer import scan
+
+LABELS = [
+    "{\\mathscr{A}^{\\mathrm{op}} \\times \\mathscr{B}}",
+    "{\\mathscr{A}^{\\mathrm{op}} \\times \\mathscr{A}}",
+    "{\\mathrm{Hom}_{\\mathscr{A}}}",
+    "{F^{\\mathrm{op}} \\times 1}",
+    "{\\mathbf{I}^{\\mathscal{A}}_{X,Y}}",
+    "{[\\mathscal{A}^{\\op},X](-,-)}",
+]
+
+
+def make_diagram_text(size: int) -> str:
+    lines = []
+    length = 0
+    i = 0
+    while length < size:
+        line = LABELS[i % 6] + LABELS[(i + 1) % 6] + LABELS[(i + 2) % 6] + " % comment {not a label}"
+        lines.append(line)
+        length += len(line) + 1
+        i += 1
+    return "\n".join(lines)
+
+
+def make_morphism_text(size: int) -> str:
+    lines = []
+    length = 0
+    i = 0
+    while length < size:
+        line = LABELS[i % 6] + LABELS[(i + 1) % 6] + " = " + LABELS[(i + 2) % 6] + LABELS[(i + 3) % 6]
+        lines.append(line)
+        length += len(line) + 1
+        i += 1
+    return "\n".join(lines)
+
+
+def legacy_extract_label(line: str, start_pos: int) -> tuple[str, int]:
+    unmatched_brackets: int = 1
+    i: int = start_pos
+    while unmatched_brackets != 0:
+        if line[i] == "{":
+            unmatched_brackets += 1
+        elif line[i] == "}":
+            unmatched_brackets -= 1
+        i += 1
+    return line[start_pos - 1:i], i
+
+
+def legacy_scan_diagram(text: str) -> int:
+    """The loop from the old ``DiagramParser.__parse_morph_line``, returning the number of labels found."""
+    found = 0
+    for line in text.split("\n"):
+        num_objs = 0
+        i = 0
+        while i < len(line):
+            c = line[i]
+            if c == "{":
+                obj, i = legacy_extract_label(line, i + 1)
+                num_objs += 1
+            elif c == "%":
+                break
+            else:
+                i += 1
+            if num_objs == 3:
+                break
+        found += num_objs
+    return found
+
+
+def legacy_scan_morphisms(text: str) -> int:
+    """The loops from the old ``MorphismParser.parse_line``, returning the number of labels found."""
+    found = 0
+    for line in text.split("\n"):
+        i = 0
+        while i < len(line):
+            char = line[i]
+            if char == "%":
+                break
+            if char == "{":
+                while i < len(line) and line[i] != "=" and line[i] != "%":
+                    if line[i] == "{":
+                        morph, i = legacy_extract_label(line, i + 1)
+                        found += 1
+                    else:
+                        i += 1
+            else:
+                i += 1
+    return found
+
+
+def scan_count(text: str) -> int:
+    found = 0
+    for tokens in scan(text):
+        for token in tokens:
+            if token != "=":
+                found += 1
+    return found
+
+
+def time_it(func, text: str) -> tuple[float, int]:
+    start = time.perf_counter()
+    result = func(text)
+    return time.perf_counter() - start, result
+
+
+def main():
+    size = int(float(sys.argv[1]) * 1_000_000) if len(sys.argv) > 1 else 4_000_000
+    for name, text, legacy in (("diagram", make_diagram_text(size), legacy_scan_diagram),
+                               ("morphism", make_morphism_text(size), legacy_scan_morphisms)):
+        legacy_time, legacy_found = time_it(legacy, text)
+        new_time, new_found = time_it(scan_count, text)
+        if legacy_found != new_found:
+            raise Exception(f"Tokenizers disagree: {legacy_found} labels vs {new_found}")
+        print(f"{name:>8}: {len(text) / 1e6:.1f}MB, {new_found} labels, legacy {legacy_time:.3f}s, "
+              f"tokenizer {new_time:.3f}s, {legacy_time / new_time:.1f}x faster")
+
+
+if __name__ == '__main__':
+    main()
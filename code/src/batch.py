@@ -0,0 +1,232 @@
+"""
+Converts many diagram or morphism files at once, spreading the work over a pool of processes.
+
+From the ``code`` directory::
+
+    python -m src.batch --from diagram --to tikz --workers 8 --output-dir out tests/testfiles/graph_txt
+"""
+import argparse
+import glob
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import NamedTuple, Optional
+
+from src.cache import LayoutCache
+from src.converter import Converter
+from src.diagram_parser import DiagramParser
+from src.morphism_parser import MorphismParser
+
+PARSERS = {
+    "diagram": DiagramParser,
+    "morphism": MorphismParser,
+}
+
+OUTPUTS = {
+    "tikz": Converter.to_tikz_diagram,
+    "tikzcd": Converter.to_tikzcd_diagram,
+    "diagram": Converter.to_diagram_representation,
+    "morphism": Converter.to_morphism_representation,
+}
+
+EXTENSIONS = {
+    "tikz": ".tex",
+    "tikzcd": ".tex",
+    "diagram": ".txt",
+    "morphism": ".txt",
+}
+
+
+class BatchResult(NamedTuple):
+    path: str
+    output: Optional[str]
+    error: Optional[str]
+
+
+def find_inputs(paths: list[str]) -> list[str]:
+    """
+    Expands directories and glob patterns into the files they contain.
+    :param paths: files, directories, or glob patterns. Directories are not searched recursively.
+    :return: the files to convert, in the order given, with each directory or pattern sorted by name
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(os.path.join(path, name) for name in os.listdir(path)
+                                if os.path.isfile(os.path.join(path, name)) and not name.startswith(".")))
+        elif glob.has_magic(path):
+            files.extend(sorted(name for name in glob.glob(path) if os.path.isfile(name)))
+        else:
+            files.append(path)
+    return files
+
+
+def convert_file(path: str, input_format: str, output_format: str) -> str:
+    """
+    Parses a single file and converts it.
+    :param path: the file to convert
+    :param input_format: ``"diagram"`` or ``"morphism"``, the representation used in the file
+    :param output_format: ``"tikz"``, ``"tikzcd"``, ``"diagram"`` or ``"morphism"``
+    :return: the converted diagram
+    """
+    parser = PARSERS[input_format](path)
+    return OUTPUTS[output_format](parser)
+
+
+def use_layout_cache(directory: str):
+    """
+    Makes every conversion in this process keep its layouts in ``directory``, so they can be reused by later runs.
+    """
+    cache = Converter.layout_cache
+    if cache is None or cache.disk is None or cache.disk.directory != directory:
+        Converter.layout_cache = LayoutCache(directory=directory)
+
+
+def _convert(job: tuple[str, str, str, Optional[str]]) -> BatchResult:
+    path, input_format, output_format, layout_cache = job
+    if layout_cache is not None:
+        use_layout_cache(layout_cache)
+    try:
+        return BatchResult(path, convert_file(path, input_format, output_format), None)
+    except Exception as e:
+        return BatchResult(path, None, f"{type(e).__name__}: {e}")
+
+
+def _convert_chunk(jobs: list[tuple[str, str, str, Optional[str]]]) -> list[BatchResult]:
+    return list(map(_convert, jobs))
+
+
+def _run_in_pool(jobs: list[tuple[str, str, str, Optional[str]]], workers: Optional[int],
+                 chunksize: int) -> list[Optional[BatchResult]]:
+    """
+    Runs ``jobs`` in a pool of processes, ``chunksize`` jobs at a time.
+    :return: a result for each job, or ``None`` for the jobs that didn't finish because a worker process died, which
+    leaves the pool unusable
+    """
+    results: list[Optional[BatchResult]] = [None] * len(jobs)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [(start, pool.submit(_convert_chunk, jobs[start:start + chunksize]))
+                   for start in range(0, len(jobs), chunksize)]
+        for start, future in futures:
+            try:
+                chunk_results = future.result()
+            except BrokenProcessPool:
+                continue
+            results[start:start + len(chunk_results)] = chunk_results
+    return results
+
+
+def convert_batch(paths: list[str], input_format: str, output_format: str,
+                  workers: Optional[int] = None, layout_cache: Optional[str] = None) -> list[BatchResult]:
+    """
+    Converts every file in ``paths``. A file that fails to convert doesn't stop the rest of the batch, its error is
+    recorded in its result instead.
+    :param paths: the files to convert
+    :param input_format: ``"diagram"`` or ``"morphism"``, the representation used in the files
+    :param output_format: ``"tikz"``, ``"tikzcd"``, ``"diagram"`` or ``"morphism"``
+    :param workers: the number of processes to use, defaults to the number of CPUs. With 1 worker everything runs in
+    this process. If a worker process dies, e.g. because it ran out of memory, the files it didn't finish are retried,
+    and only a file that kills its worker again fails.
+    :param layout_cache: a directory to keep layouts in between runs, see ``src.cache.LayoutCache``
+    :return: a result for each file, in the same order as ``paths``
+    """
+    if input_format not in PARSERS:
+        raise ValueError(f"Unknown input format: {input_format}")
+    if output_format not in OUTPUTS:
+        raise ValueError(f"Unknown output format: {output_format}")
+    if workers is not None and workers < 1:
+        raise ValueError(f"workers must be at least 1, got {workers}")
+    jobs = [(path, input_format, output_format, layout_cache) for path in paths]
+    if workers == 1 or len(jobs) <= 1:
+        return list(map(_convert, jobs))
+    # larger chunks cut down on inter-process overhead when there are thousands of small files
+    chunksize = max(1, len(jobs) // (4 * (workers or os.cpu_count() or 1)))
+    results = _run_in_pool(jobs, workers, chunksize)
+    missing = [i for i, result in enumerate(results) if result is None]
+    if missing:
+        # a worker died. Retry what it took down with it one file at a time, then anything still missing in a pool of
+        # its own, so the file that killed it is the only one that fails
+        retried = _run_in_pool([jobs[i] for i in missing], workers, 1)
+        for i, result in zip(missing, retried):
+            if result is None:
+                result = _run_in_pool([jobs[i]], 1, 1)[0]
+            if result is None:
+                result = BatchResult(jobs[i][0], None, "BrokenProcessPool: the worker process converting it died")
+            results[i] = result
+    return results
+
+
+def output_path(path: str, output_dir: str, output_format: str) -> str:
+    """
+    :return: where the conversion of ``path`` is written in ``output_dir``
+    """
+    name = os.path.splitext(os.path.basename(path))[0] + EXTENSIONS[output_format]
+    return os.path.join(output_dir, name)
+
+
+def positive_int(value: str) -> int:
+    """
+    An ``argparse`` type for counts that must be at least 1.
+    """
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid int value: {value!r}")
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+    return number
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    arg_parser = argparse.ArgumentParser(prog="python -m src.batch", description=__doc__.splitlines()[1])
+    arg_parser.add_argument("inputs", nargs="+", help="files, directories, or glob patterns to convert")
+    arg_parser.add_argument("--from", dest="input_format", choices=sorted(PARSERS), required=True,
+                            help="the representation used by the input files")
+    arg_parser.add_argument("--to", dest="output_format", choices=sorted(OUTPUTS), default="tikz",
+                            help="the representation to convert to")
+    arg_parser.add_argument("-j", "--workers", type=positive_int, default=None,
+                            help="number of worker processes, defaults to the number of CPUs")
+    arg_parser.add_argument("-o", "--output-dir", default=None,
+                            help="write each result to a file in this directory instead of stdout")
+    arg_parser.add_argument("--layout-cache", default=None, metavar="DIR",
+                            help="keep layouts in this directory, so unchanged diagrams aren't laid out again")
+    args = arg_parser.parse_args(argv)
+
+    paths = find_inputs(args.inputs)
+    results = convert_batch(paths, args.input_format, args.output_format, args.workers, args.layout_cache)
+    if args.output_dir is not None:
+        os.makedirs(args.output_dir, exist_ok=True)
+    # real paths of the inputs, and of each output file written so far with the input it came from, so that nothing
+    # is silently overwritten when inputs from different directories share a name, or the output is an input
+    inputs = {os.path.realpath(path) for path in paths}
+    written: dict[str, str] = {}
+    failures = 0
+    for result in results:
+        error = result.error
+        if error is None and args.output_dir is not None:
+            out_path = output_path(result.path, args.output_dir, args.output_format)
+            real_out_path = os.path.realpath(out_path)
+            if real_out_path in inputs:
+                error = f"not writing {out_path}, it is one of the inputs"
+            elif real_out_path in written:
+                error = f"not writing {out_path}, it was already written for {written[real_out_path]}"
+            else:
+                written[real_out_path] = result.path
+        if error is not None:
+            failures += 1
+            print(f"{result.path}: {error}", file=sys.stderr)
+        elif args.output_dir is not None:
+            with open(out_path, "w") as f:
+                f.write(result.output)
+        else:
+            print(f"% {result.path}")
+            print(result.output)
+    if failures:
+        print(f"{failures} of {len(results)} files failed to convert", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,184 @@
+import hashlib
+import json
+import os
+import tempfile
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+from src.compact_graph import CompactGraph
+
+
+class LRUCache:
+    """
+    A dictionary holding at most ``max_entries`` items, dropping the least recently used when it's full.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.__entries: OrderedDict[Hashable, Any] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.__entries
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        :return: the value stored for ``key``, or ``None`` if there isn't one
+        """
+        value = self.__entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.__entries.move_to_end(key)
+        return value
+
+    def put(self, key: Hashable, value: Any):
+        self.__entries[key] = value
+        self.__entries.move_to_end(key)
+        while len(self.__entries) > self.max_entries:
+            self.__entries.popitem(last=False)
+
+    def clear(self):
+        self.__entries.clear()
+
+
+class DiskCache:
+    """
+    Stores JSON values in a directory, one file per key, so they last between runs. Once the files take up more than
+    ``max_bytes`` the least recently used are deleted. Files are written to a temporary file first and then renamed, so
+    several processes can share a directory.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 64 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+        self.__size = sum(entry.stat().st_size for entry in self.__entries())
+
+    def __entries(self) -> list[os.DirEntry]:
+        return [entry for entry in os.scandir(self.directory) if entry.name.endswith(".json")]
+
+    def __path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ".json")
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        :return: the value stored for ``key``, or ``None`` if there isn't one or it can't be read
+        """
+        path = self.__path(key)
+        try:
+            with open(path, "r") as f:
+                value = json.load(f)
+            os.utime(path)  # the modification time is used as the last time it was used
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def put(self, key: str, value: Any):
+        data = json.dumps(value, separators=(",", ":"))
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            f.write(data)
+        os.replace(temp_path, self.__path(key))
+        self.__size += len(data)
+        if self.__size > self.max_bytes:
+            self.__evict()
+
+    def __evict(self):
+        """
+        Deletes the least recently used files until they take up at most three quarters of ``max_bytes``, leaving room
+        so this doesn't need to happen on every ``put``.
+        """
+        entries = []
+        for entry in self.__entries():
+            try:
+                stat = entry.stat()
+            except OSError:  # deleted by another process
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+        entries.sort()
+        self.__size = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if self.__size <= self.max_bytes * 3 // 4:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            self.__size -= size
+
+    def clear(self):
+        for entry in self.__entries():
+            os.remove(entry.path)
+        self.__size = 0
+
+
+class LayoutCache:
+    """
+    Caches node positions found by ``Converter.position_nodes``, keyed by a hash of everything the layout depends on,
+    so a diagram that hasn't changed doesn't need to be laid out again. Recently used layouts are kept in memory, and
+    if ``directory`` is given every layout is also saved there so it can be reused by later runs.
+    """
+
+    def __init__(self, max_entries: int = 1024, directory: Optional[str] = None,
+                 max_disk_bytes: int = 64 * 1024 * 1024):
+        self.memory = LRUCache(max_entries)
+        self.disk = DiskCache(directory, max_disk_bytes) if directory is not None else None
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(graph: CompactGraph, *params) -> str:
+        """
+        :param graph: the diagram being laid out
+        :param params: anything else the layout depends on, e.g. its scale
+        :return: a hash of the nodes, edges and labels of ``graph`` in order, and of ``params``
+        """
+        digest = hashlib.sha256()
+        digest.update(repr(params).encode())
+        for node, label in zip(graph.nodes, graph.node_labels):
+            digest.update(f"\0{node!r}\1{label!r}".encode())
+        digest.update(b"\2")
+        for edge in graph.edges():
+            digest.update(f"\0{graph.edge_src[edge]}\1{graph.edge_dst[edge]}\1{graph.edge_labels[edge]!r}".encode())
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[list[list[float]]]:
+        """
+        :return: the position of each node, in the order of the graph's nodes, or ``None`` if the layout isn't cached
+        """
+        positions = self.memory.get(key)
+        if positions is None and self.disk is not None:
+            positions = self.disk.get(key)
+            if positions is not None:
+                self.memory.put(key, positions)
+        if positions is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return positions
+
+    def put(self, key: str, positions: list[list[float]]):
+        self.memory.put(key, positions)
+        if self.disk is not None:
+            self.disk.put(key, positions)
+
+    def stats(self) -> dict[str, int]:
+        """
+        :return: the number of hits and misses overall, and of each tier
+        """
+        stats = {"hits": self.hits, "misses": self.misses,
+                 "memory_hits": self.memory.hits, "memory_misses": self.memory.misses}
+        if self.disk is not None:
+            stats["disk_hits"] = self.disk.hits
+            stats["disk_misses"] = self.disk.misses
+        return stats
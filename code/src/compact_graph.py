@@ -0,0 +1,280 @@
+from array import array
+from typing import Any, Iterable, Optional
+
+
+class CompactGraph:
+    """
+    A directed graph with no parallel edges, like ``nx.DiGraph``, but with objects and morphisms interned to integer
+    ids. Labels are kept in side tables indexed by id, and adjacency is stored CSR-style in flat ``array`` buffers built
+    the first time it's needed.
+
+    Node and edge ids are given out in insertion order, and successors are kept in the order their edges were added, so
+    iterating over a ``CompactGraph`` visits everything in the same order as the equivalent ``nx.DiGraph``. Removed
+    edges are left in place with both ends set to -1, so the ids of the other edges don't change.
+    """
+
+    def __init__(self):
+        self.nodes: list[Any] = []  # id -> node
+        self.node_ids: dict[Any, int] = {}
+        self.node_labels: list[Any] = []
+        self.edge_src = array("l")
+        self.edge_dst = array("l")
+        self.edge_labels: list[Any] = []
+        self.edge_ids: dict[tuple[int, int], int] = {}
+        self.__index: Optional[tuple[array, ...]] = None
+        self.__removed_edges = 0
+        # incremented on every change, so anything derived from the graph can tell when it's out of date
+        self.version = 0
+
+    @classmethod
+    def from_edges(cls, edges: Iterable[tuple[Any, Any, Any]]) -> "CompactGraph":
+        """
+        :param edges: ``(domain, codomain, label)`` for each morphism
+        :return: a graph containing the given morphisms
+        """
+        graph = cls()
+        for domain, codomain, label in edges:
+            graph.add_edge(domain, codomain, label)
+        return graph
+
+    @classmethod
+    def from_arrays(cls, nodes: list[Any], node_labels: list[Any], edge_src: array, edge_dst: array,
+                    edge_labels: list[Any]) -> "CompactGraph":
+        """
+        Makes a graph out of its side tables, e.g. as read by ``src.snapshot``, without adding the nodes and edges one
+        at a time. ``node_ids`` and ``edge_ids`` are only built the first time they're used, since reading a diagram
+        and writing it out again never needs them.
+        :param edge_src: the id of the domain of each edge, with no removed edges
+        :param edge_dst: the id of the codomain of each edge
+        """
+        graph = cls()
+        graph.nodes = nodes
+        graph.node_labels = node_labels
+        graph.edge_src = edge_src
+        graph.edge_dst = edge_dst
+        graph.edge_labels = edge_labels
+        del graph.node_ids, graph.edge_ids
+        return graph
+
+    def __getattr__(self, name: str) -> Any:
+        # only called for attributes that aren't set, which is how from_arrays leaves node_ids and edge_ids. Once built
+        # they're ordinary attributes again
+        if name == "node_ids":
+            self.node_ids = dict(zip(self.nodes, range(len(self.nodes))))
+            return self.node_ids
+        if name == "edge_ids":
+            self.edge_ids = dict(zip(zip(self.edge_src, self.edge_dst), range(len(self.edge_src))))
+            return self.edge_ids
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+
+    @classmethod
+    def from_networkx(cls, nx_graph) -> "CompactGraph":
+        """
+        Copies the nodes, edges and their ``label`` attributes out of a ``nx.DiGraph``.
+        """
+        graph = cls()
+        for node, label in nx_graph.nodes(data="label"):
+            graph.add_node(node, label)
+        for domain, codomain, label in nx_graph.edges(data="label"):
+            graph.add_edge(domain, codomain, label)
+        return graph
+
+    def to_networkx(self):
+        """
+        :return: a ``nx.DiGraph`` with the same nodes and edges as this graph, and their labels as ``label`` attributes.
+        """
+        import networkx as nx
+        graph = nx.DiGraph()
+        for node, label in zip(self.nodes, self.node_labels):
+            if label is None:
+                graph.add_node(node)
+            else:
+                graph.add_node(node, label=label)
+        nodes = self.nodes
+        for domain, codomain, label in zip(self.edge_src, self.edge_dst, self.edge_labels):
+            if domain < 0:
+                continue  # removed
+            elif label is None:
+                graph.add_edge(nodes[domain], nodes[codomain])
+            else:
+                graph.add_edge(nodes[domain], nodes[codomain], label=label)
+        return graph
+
+    def matches_networkx(self, nx_graph) -> bool:
+        """
+        :return: whether ``nx_graph`` has the same nodes, edges and labels as this graph, with nodes and successors in
+        the same order, so converting either gives the same result
+        """
+        if len(nx_graph) != len(self.nodes) or nx_graph.number_of_edges() != self.number_of_edges():
+            return False
+        nodes = self.nodes
+        node_labels = self.node_labels
+        edge_dst = self.edge_dst
+        edge_labels = self.edge_labels
+        for node_id, (node, label) in enumerate(nx_graph.nodes(data="label")):
+            if nodes[node_id] != node or node_labels[node_id] != label:
+                return False
+            successors = nx_graph.adj[node]
+            out_edges = self.out_edges(node_id)
+            if len(successors) != len(out_edges):
+                return False
+            for edge_id, (codomain, data) in zip(out_edges, successors.items()):
+                if nodes[edge_dst[edge_id]] != codomain or edge_labels[edge_id] != data.get("label"):
+                    return False
+        return True
+
+    def number_of_nodes(self) -> int:
+        return len(self.nodes)
+
+    def number_of_edges(self) -> int:
+        return len(self.edge_src) - self.__removed_edges
+
+    def add_node(self, node, label=None) -> int:
+        """
+        Adds ``node`` if it isn't already in the graph. If ``label`` is given it replaces the node's label.
+        :return: the id of ``node``
+        """
+        node_id = self.node_ids.get(node)
+        if node_id is None:
+            node_id = len(self.nodes)
+            self.node_ids[node] = node_id
+            self.nodes.append(node)
+            self.node_labels.append(label)
+            self.__index = None
+            self.version += 1
+        elif label is not None:
+            self.node_labels[node_id] = label
+            self.version += 1
+        return node_id
+
+    def add_edge(self, domain, codomain, label=None) -> int:
+        """
+        Adds an edge from ``domain`` to ``codomain``, adding them if needed. If there is already an edge between them
+        its label is replaced.
+        :return: the id of the edge
+        """
+        domain_id = self.add_node(domain)
+        codomain_id = self.add_node(codomain)
+        key = (domain_id, codomain_id)
+        edge_id = self.edge_ids.get(key)
+        if edge_id is None:
+            edge_id = len(self.edge_src)
+            self.edge_ids[key] = edge_id
+            self.edge_src.append(domain_id)
+            self.edge_dst.append(codomain_id)
+            self.edge_labels.append(label)
+            self.__index = None
+        else:
+            self.edge_labels[edge_id] = label
+        self.version += 1
+        return edge_id
+
+    def remove_edge(self, domain, codomain) -> int:
+        """
+        Removes the edge from ``domain`` to ``codomain``, leaving both objects in the graph as ``nx.DiGraph`` does.
+        :return: the id the edge had
+        """
+        edge_id = self.edge_ids.pop((self.node_ids[domain], self.node_ids[codomain]))
+        self.edge_src[edge_id] = -1
+        self.edge_dst[edge_id] = -1
+        self.edge_labels[edge_id] = None
+        self.__removed_edges += 1
+        self.__index = None
+        self.version += 1
+        return edge_id
+
+    def has_edge(self, domain, codomain) -> bool:
+        domain_id = self.node_ids.get(domain)
+        codomain_id = self.node_ids.get(codomain)
+        return (domain_id, codomain_id) in self.edge_ids
+
+    def edge_id(self, domain_id: int, codomain_id: int) -> int:
+        return self.edge_ids[(domain_id, codomain_id)]
+
+    def edge_label(self, domain_id: int, codomain_id: int) -> Any:
+        return self.edge_labels[self.edge_ids[(domain_id, codomain_id)]]
+
+    def __build_index(self) -> tuple[array, ...]:
+        """
+        Counting sorts the edges by domain and by codomain, keeping them in insertion order within each node.
+        :return: ``(out_offsets, out_edges, in_offsets, in_edges, out_degree, in_degree)``, where the edges out of node
+        ``u`` are ``out_edges[out_offsets[u]:out_offsets[u + 1]]``, and the same for the edges into it.
+        """
+        num_nodes = len(self.nodes)
+        removed = self.__removed_edges
+        index = []
+        degrees = []
+        for ends in (self.edge_src, self.edge_dst):
+            degree = array("l", [0]) * num_nodes
+            for node in ends:
+                degree[node] += 1
+            if removed:
+                degree[-1] -= removed  # removed edges were counted as going from/to the last node
+            offsets = array("l", [0]) * (num_nodes + 1)
+            for node in range(num_nodes):
+                offsets[node + 1] = offsets[node] + degree[node]
+            edges = array("l", [0]) * (len(ends) - removed)
+            next_slot = offsets[:-1]
+            for edge_id, node in enumerate(ends):
+                if node < 0:
+                    continue
+                edges[next_slot[node]] = edge_id
+                next_slot[node] += 1
+            index.append(offsets)
+            index.append(edges)
+            degrees.append(degree)
+        return index[0], index[1], index[2], index[3], degrees[0], degrees[1]
+
+    @property
+    def index(self) -> tuple[array, ...]:
+        if self.__index is None:
+            self.__index = self.__build_index()
+        return self.__index
+
+    @property
+    def out_degree(self) -> array:
+        return self.index[4]
+
+    @property
+    def in_degree(self) -> array:
+        return self.index[5]
+
+    def out_edges(self, node_id: int) -> array:
+        out_offsets, out_edges = self.index[:2]
+        return out_edges[out_offsets[node_id]:out_offsets[node_id + 1]]
+
+    def in_edges(self, node_id: int) -> array:
+        in_offsets, in_edges = self.index[2:4]
+        return in_edges[in_offsets[node_id]:in_offsets[node_id + 1]]
+
+    def successors(self, node_id: int) -> list[int]:
+        edge_dst = self.edge_dst
+        return [edge_dst[edge_id] for edge_id in self.out_edges(node_id)]
+
+    def predecessors(self, node_id: int) -> list[int]:
+        edge_src = self.edge_src
+        return [edge_src[edge_id] for edge_id in self.in_edges(node_id)]
+
+    def edges(self) -> list[int]:
+        """
+        :return: the ids of every edge, in the order ``nx.DiGraph.edges`` would visit them, i.e. grouped by domain.
+        """
+        return list(self.index[1])
+
+    def reverse(self) -> "CompactGraph":
+        """
+        :return: a copy of this graph with every edge reversed, with nodes and successors in the same order as
+        ``nx.DiGraph.reverse`` gives.
+        """
+        reverse = CompactGraph()
+        reverse.nodes = self.nodes.copy()
+        reverse.node_ids = self.node_ids.copy()
+        reverse.node_labels = self.node_labels.copy()
+        for edge_id in self.edges():
+            domain = self.edge_dst[edge_id]
+            codomain = self.edge_src[edge_id]
+            reverse.edge_ids[(domain, codomain)] = len(reverse.edge_src)
+            reverse.edge_src.append(domain)
+            reverse.edge_dst.append(codomain)
+            reverse.edge_labels.append(self.edge_labels[edge_id])
+        return reverse
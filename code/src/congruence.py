@@ -0,0 +1,298 @@
+from typing import Any
+
+from src.morphism_parser import MorphismParser
+from src.tokenizer import scan_line, split_chains
+
+# a partial match of one side of an equation: the equation, the side, how many of its morphisms have been matched and
+# the class the match started at
+Match = tuple[int, int, int, int]
+
+
+class Congruence:
+    """
+    Decides whether two composites of morphisms are equal under the equations read by a ``MorphismParser``, by
+    congruence closure over an e-graph of composites.
+
+    Each class of the e-graph is a set of composites known to be equal, all going between the same two objects. A node
+    ``(m, c)`` is the morphism ``m`` applied after the composites in class ``c``, and each object has a class for its
+    identity, so a composite is found by applying its morphisms one at a time to the identity of its domain. Whenever
+    two classes are merged, so are the classes of ``(m, c)`` for each of them, as composing equal morphisms with ``m``
+    gives equal composites.
+
+    An equation holds after any composite ending where it starts, so wherever one side of an equation can be followed
+    through the e-graph from a class, its other sides are added after that class too and the classes they all end at
+    are merged. Sides are matched incrementally: a partial match waits at the class it has reached for the node of the
+    next morphism, and moves on as soon as that node is added or the class is merged with one that has it. Any
+    composite that can be rewritten into one in the e-graph is then in the same class as it, so a query is just a
+    lookup of each side, without going through the composites equal to them.
+
+    Only the composites in queries and those they can be rewritten into are added, so the rest of the diagram is never
+    searched. Equations around a cycle can make infinitely many composites equal to one another, so the e-graph is
+    limited to ``max_classes``. Every equality it has found is still true if it stops.
+    """
+
+    def __init__(self, parser: MorphismParser, max_classes: int = 1_000_000):
+        """
+        :param parser: the morphisms and equations. Lines parsed by it later, e.g. with ``add_equation``, are used from
+        the next query on
+        :param max_classes: the most classes the e-graph can have, after which ``RuntimeError`` is raised
+        """
+        self.parser = parser
+        self.max_classes = max_classes
+        # union-find over the classes
+        self.__parent: list[int] = []
+        self.__size: list[int] = []
+        self.__num_classes = 0
+        # class -> the object its composites end at, as it was when the class was made
+        self.__object: list[Any] = []
+        # (morphism, child class) -> the class of the morphism applied after the child, for every child that's a root
+        self.__nodes: dict[tuple[str, int], int] = {}
+        # class -> the keys in __nodes with it as their child, so they can be moved when it's merged
+        self.__uses: list[list[tuple[str, int]]] = []
+        # class -> the partial matches waiting at it, by the morphism they need next
+        self.__waiting: list[dict[str, list[Match]]] = []
+        # every equation, each side in the order its morphisms are applied
+        self.__equations: list[tuple[tuple[str, ...], ...]] = []
+        # these are keyed by objects as they were when added, and merged when the parser merges the objects
+        self.__identities: dict[Any, int] = {}
+        self.__classes_at: dict[Any, list[int]] = {}
+        self.__equations_at: dict[Any, list[int]] = {}
+        self.__equations_read = 0
+        self.__merges_read = 0
+        # (equation, class) for every equation whose sides have all been added after a class
+        self.__applied: set[tuple[int, int]] = set()
+        # partial matches to move on from the classes they've reached, and classes waiting to be merged
+        self.__arrivals: list[tuple[Match, int]] = []
+        self.__unions: list[tuple[int, int]] = []
+
+    def __len__(self) -> int:
+        """
+        :return: the number of classes of composites found so far
+        """
+        return self.__num_classes
+
+    def add_equation(self, line: str):
+        """
+        Parses a line of the morphism representation, e.g. ``"{g}{f} = {i}{h}"``, adding any new morphisms, and uses
+        its equation from the next query on.
+        """
+        self.parser.parse_line(line)
+
+    def equal(self, first: str, second: str) -> bool:
+        """
+        :param first: a composite written as in the morphism representation, e.g. ``"{m}{l}{h}"``
+        :param second: another composite
+        :return: whether the equations imply ``first`` and ``second`` are equal. Composites between different objects
+        never are
+        """
+        self.__update()
+        first_side = self.__side(first)
+        second_side = self.__side(second)
+        domain = self.__domain(first_side)
+        if domain != self.__domain(second_side) or self.__codomain(first_side) != self.__codomain(second_side):
+            return False
+        first_class = self.__apply(first_side, self.__identity(domain))
+        second_class = self.__apply(second_side, self.__identity(domain))
+        self.__rebuild()
+        return self.__find(first_class) == self.__find(second_class)
+
+    def __side(self, composite: str) -> tuple[str, ...]:
+        """
+        :return: the morphisms in ``composite`` in the order they are applied
+        """
+        chains = split_chains(scan_line(composite))
+        if len(chains) != 1:
+            raise ValueError(f"Expected a single composite of morphisms: {composite}")
+        for morph in chains[0]:
+            if morph not in self.parser.morphs:
+                raise KeyError(f"Unknown morphism {morph}")
+        return tuple(reversed(chains[0]))
+
+    def __domain(self, side: tuple[str, ...]) -> Any:
+        return self.parser.find_object(self.parser.morphs[side[0]][0])
+
+    def __codomain(self, side: tuple[str, ...]) -> Any:
+        return self.parser.find_object(self.parser.morphs[side[-1]][1])
+
+    def __find(self, cls: int) -> int:
+        parent = self.__parent
+        while parent[cls] != cls:
+            parent[cls] = parent[parent[cls]]  # path halving
+            cls = parent[cls]
+        return cls
+
+    def __new_class(self, obj: Any) -> int:
+        cls = len(self.__parent)
+        if cls >= self.max_classes:
+            raise RuntimeError(f"Gave up after finding {cls} classes of composites")
+        self.__parent.append(cls)
+        self.__size.append(1)
+        self.__num_classes += 1
+        self.__object.append(obj)
+        self.__uses.append([])
+        self.__waiting.append({})
+        self.__classes_at.setdefault(obj, []).append(cls)
+        self.__start_matches(cls, self.__equations_at.get(obj, ()))
+        return cls
+
+    def __start_matches(self, cls: int, equations):
+        """
+        Starts matching every side of each of ``equations`` at ``cls``.
+        """
+        for equation in equations:
+            for side in range(len(self.__equations[equation])):
+                self.__arrivals.append(((equation, side, 0, cls), cls))
+
+    def __identity(self, obj: Any) -> int:
+        cls = self.__identities.get(obj)
+        if cls is None:
+            cls = self.__identities[obj] = self.__new_class(obj)
+        return cls
+
+    def __apply(self, side: tuple[str, ...], cls: int) -> int:
+        """
+        :return: the class of the composite of ``side`` applied after the composites in ``cls``, made if needed
+        """
+        nodes = self.__nodes
+        for morph in side:
+            cls = self.__find(cls)
+            key = (morph, cls)
+            applied = nodes.get(key)
+            if applied is None:
+                find_object = self.parser.find_object
+                domain, codomain = self.parser.morphs[morph]
+                if find_object(domain) != find_object(self.__object[cls]):
+                    raise ValueError(f"{morph} can't be composed with the morphism before it")
+                applied = nodes[key] = self.__new_class(find_object(codomain))
+                self.__uses[cls].append(key)
+                # matches waiting for this node can follow it now
+                for match in self.__waiting[cls].pop(morph, ()):
+                    self.__arrivals.append((match, cls))
+            cls = applied
+        return cls
+
+    def __update(self):
+        """
+        Catches up with objects merged and equations added by the parser since the last query.
+        """
+        parser = self.parser
+        parser.compact_graph()  # so parser.morphs is up to date
+        if len(parser.obj_parent) != self.__merges_read:
+            self.__merge_objects()
+            self.__merges_read = len(parser.obj_parent)
+        for chains in parser.equations[self.__equations_read:]:
+            equation = len(self.__equations)
+            self.__equations.append(tuple(tuple(reversed(chain)) for chain in chains))
+            domain = self.__domain(self.__equations[equation][0])
+            self.__equations_at.setdefault(domain, []).append(equation)
+            for cls in self.__classes_at.get(domain, ()):
+                self.__start_matches(cls, (equation,))
+        self.__equations_read = len(parser.equations)
+        self.__rebuild()
+
+    def __merge_objects(self):
+        """
+        Re-keys everything by the objects the parser has merged them into. The identities of objects that have been
+        merged are merged, and the classes at them are matched against the equations of the objects merged with theirs.
+        """
+        find_object = self.parser.find_object
+        merged = set()
+        classes_at: dict[Any, list[int]] = {}
+        for obj, classes in self.__classes_at.items():
+            root = find_object(obj)
+            if root in classes_at:
+                classes_at[root].extend(classes)
+                merged.add(root)
+            else:
+                classes_at[root] = classes
+        self.__classes_at = classes_at
+        equations_at: dict[Any, list[int]] = {}
+        for obj, equations in self.__equations_at.items():
+            root = find_object(obj)
+            if root in equations_at:
+                equations_at[root].extend(equations)
+                merged.add(root)
+            else:
+                equations_at[root] = equations
+        self.__equations_at = equations_at
+        identities: dict[Any, int] = {}
+        for obj, cls in self.__identities.items():
+            root = find_object(obj)
+            if root in identities:
+                self.__unions.append((identities[root], cls))
+            else:
+                identities[root] = cls
+        self.__identities = identities
+        for root in merged:
+            # matching an equation at a class twice finds nothing new, so it's simplest to match all of them again
+            for cls in classes_at.get(root, ()):
+                self.__start_matches(cls, equations_at.get(root, ()))
+
+    def __rebuild(self):
+        """
+        Merges classes and moves partial matches on until there's nothing left to do.
+        """
+        arrivals = self.__arrivals
+        unions = self.__unions
+        while arrivals or unions:
+            while unions:
+                self.__union(*unions.pop())
+            if arrivals:
+                self.__arrive(*arrivals.pop())
+
+    def __arrive(self, match: Match, cls: int):
+        """
+        Moves ``match`` on from ``cls`` along the nodes already in the e-graph, and adds the other sides of its
+        equation if it gets to the end of its side.
+        """
+        equation, side, matched, start = match
+        sides = self.__equations[equation]
+        morphs = sides[side]
+        nodes = self.__nodes
+        cls = self.__find(cls)
+        while matched < len(morphs):
+            applied = nodes.get((morphs[matched], cls))
+            if applied is None:
+                self.__waiting[cls].setdefault(morphs[matched], []).append((equation, side, matched, start))
+                return
+            matched += 1
+            cls = self.__find(applied)
+        key = (equation, self.__find(start))
+        if key not in self.__applied:
+            self.__applied.add(key)
+            for other in sides:
+                self.__unions.append((cls, self.__apply(other, start)))
+
+    def __union(self, first: int, second: int):
+        first = self.__find(first)
+        second = self.__find(second)
+        if first == second:
+            return
+        size = self.__size
+        if size[first] < size[second]:
+            first, second = second, first
+        self.__parent[second] = first
+        size[first] += size[second]
+        self.__num_classes -= 1
+        # every node applied after second is now applied after first, and is the same as any node already applied
+        # after first with the same morphism
+        nodes = self.__nodes
+        uses = self.__uses
+        waiting = self.__waiting[first]
+        for key in uses[second]:
+            cls = nodes.pop(key)
+            new_key = (key[0], first)
+            existing = nodes.get(new_key)
+            if existing is None:
+                nodes[new_key] = cls
+                uses[first].append(new_key)
+                for match in waiting.pop(key[0], ()):
+                    self.__arrivals.append((match, first))
+            else:
+                self.__unions.append((existing, cls))
+        uses[second] = []
+        # the matches waiting at second carry on from first
+        for matches in self.__waiting[second].values():
+            for match in matches:
+                self.__arrivals.append((match, first))
+        self.__waiting[second] = {}
@@ -1,15 +1,117 @@
-# import heapq
 # from collections import deque
-from typing import Any
+import hashlib
+import heapq
+from array import array
+from typing import TYPE_CHECKING, Any, KeysView, Optional
 
-import networkx as nx
+from src.cache import LayoutCache
+from src.compact_graph import CompactGraph
+from src.path_trie import PathTrie
+from src.stats import Stats, stage
+from src.tokenizer import extract_label
+
+if TYPE_CHECKING:
+    import networkx as nx
+
+# networkx, and src.layout which needs it, take longer to import than most conversions take to run, so they are only
+# imported by the methods that use them. Parsing, to_morphism_representation and to_diagram_representation never do
 
 
 class Converter:
+    # shared by every converter, so a diagram laid out once is never laid out again. Replace it with a LayoutCache with
+    # a directory to keep layouts between runs, or None to turn caching off
+    layout_cache: Optional[LayoutCache] = LayoutCache()
+    # records the time taken by each stage of a conversion, see src.stats.Stats. None, the default, records nothing.
+    # Setting it here records every conversion, and setting it on a converter only records that converter's
+    stats: Optional[Stats] = None
+
     def __init__(self):
         # self.comp_morph_eqs: dict[tuple[Any, Any], set[str]] = {}
-        self.graph: nx.DiGraph = nx.DiGraph()
-        self.comp_morph_paths: dict[Any, dict[Any, list[list[Any]]]] = {}
+        # the diagram is stored in core, and only converted to networkx if self.graph is used
+        self.core: CompactGraph = CompactGraph()
+        # paths found by to_morphism_representation, between node ids of self.core, as spans of self.path_trie
+        self.comp_morph_paths: dict[int, dict[int, array]] = {}
+        self.path_trie = PathTrie()
+        # kept by add_morphism and remove_morphism, see __update_morphism_index
+        self.__morphism_index_core: Optional[CompactGraph] = None
+        self.__morphism_index_version = -1
+
+    @property
+    def core(self) -> CompactGraph:
+        """
+        The diagram as a ``CompactGraph``, which every conversion works on.
+        """
+        return self.compact_graph()
+
+    @core.setter
+    def core(self, core: CompactGraph):
+        self._core = core
+        self._graph: Optional["nx.DiGraph"] = None
+        # set once self.graph has been handed out or assigned, since it may then be edited at any time
+        self._graph_shared = False
+
+    @property
+    def graph(self) -> "nx.DiGraph":
+        """
+        The diagram as a ``nx.DiGraph``, with a ``label`` attribute on every node and edge. It is built from the compact
+        core the first time it's used, after which it is the definitive copy of the diagram, so it can be edited or
+        replaced freely, including through a reference kept from earlier.
+
+        Once it has been handed out the core is checked against it before every conversion, and rebuilt if they
+        differ.
+        """
+        graph = self._networkx_graph()
+        self._graph_shared = True
+        return graph
+
+    @graph.setter
+    def graph(self, graph: "nx.DiGraph"):
+        self._graph = graph
+        self._graph_shared = True
+
+    def _networkx_graph(self) -> "nx.DiGraph":
+        """
+        :return: ``self.graph``, for use inside the converter where it won't be edited
+        """
+        self._update()
+        if self._graph is None:
+            self._graph = self._core.to_networkx()
+        return self._graph
+
+    def _update(self):
+        """
+        Called before the diagram is read. Subclasses that build the diagram lazily override it to finish building.
+        """
+
+    def compact_graph(self) -> CompactGraph:
+        """
+        :return: the diagram as a ``CompactGraph``, rebuilt from ``self.graph`` if that has been handed out and no
+        longer matches it
+        """
+        self._update()
+        if self._graph_shared and not self._core.matches_networkx(self._graph):
+            self._core = CompactGraph.from_networkx(self._graph)
+        return self._core
+
+    def _has_node(self, node) -> bool:
+        if self._graph is not None:
+            return node in self._graph
+        return node in self._core.node_ids
+
+    # these write to both copies of the diagram without checking the core first, so parsing a line is never slowed down
+    # by a shared self.graph. If the core was out of date it's rebuilt by the next conversion anyway
+    def _add_node(self, node, label=None):
+        self._core.add_node(node, label)
+        if self._graph is not None:
+            if label is None:
+                self._graph.add_node(node)
+            else:
+                self._graph.add_node(node, label=label)
+
+    def _add_edge(self, domain, codomain, label):
+        self._core.add_edge(domain, codomain, label)
+        if self._graph is not None:
+            self._graph.add_edge(domain, codomain, label=label)
 
     @staticmethod
     def extract_label(line: str, start_pos: int) -> tuple[str, int]:
@@ -19,15 +121,7 @@ class Converter:
         :param start_pos: the position of the first character of the Label.
         :return: tuple of the form ``({Label},`` the position of the closing "``}``"+1``)``
         """
-        unmatched_brackets: int = 1  # we should always start with an unmatched bracket
-        i: int = start_pos
-        while unmatched_brackets != 0:
-            if line[i] == "{":
-                unmatched_brackets += 1
-            elif line[i] == "}":
-                unmatched_brackets -= 1
-            i += 1
-        return line[start_pos - 1:i], i  # the start position is just after the opening {, so we need to decrement
+        return extract_label(line, start_pos)
 
     @staticmethod
     def lists_to_latex_matrix(lst: list[list[Any]]) -> str:
@@ -43,131 +137,633 @@ class Converter:
             i += 1
         return " \\\\ ".join(rows)
 
-    def to_tikz_diagram(self, scale=4):
-        positions = self.position_nodes(scale)
-        return nx.to_latex_raw(self.graph, pos=positions, edge_label="label", default_edge_options="[->, auto]",
-                               node_label="label")
+    def to_tikz_diagram(self, scale=4, layout="auto", **options):
+        import networkx as nx
+        positions = self.position_nodes(scale, layout, **options)
+        graph = self._networkx_graph()
+        with stage(self.stats, "emit"):
+            return nx.to_latex_raw(graph, pos=positions, edge_label="label", default_edge_options="[->, auto]",
+                                   node_label="label")
+
+    def to_tikzcd_diagram(self, layout="auto", **options) -> str:
+        """
+        Converts the diagram to a ``tikzcd`` environment, from the ``tikz-cd`` package. The objects are placed in a
+        matrix by snapping the positions found by ``position_nodes`` to a grid, see ``src.layout.grid_cells``, and each
+        morphism is an arrow in the cell of its domain pointing to its codomain, e.g. ``\\arrow[r, "{f}"]``.
+        :param layout: the layout to use, see ``position_nodes``
+        :param options: passed on to the layout
+        :return: the ``tikzcd`` environment
+        """
+        from src.layout import grid_cells
+        core = self.compact_graph()
+        positions = self.position_nodes(1, layout, **options)
+        with stage(self.stats, "emit"):
+            return self.__tikzcd(core, grid_cells([positions[node] for node in core.nodes]))
+
+    def __tikzcd(self, core: CompactGraph, cells: list[tuple[int, int]]) -> str:
+        """
+        :return: the ``tikzcd`` environment with each node of ``core`` in its cell, see ``to_tikzcd_diagram``
+        """
+        # each row only goes as far as its last object
+        widths = [0] * (max((row for row, _ in cells), default=-1) + 1)
+        for row, column in cells:
+            widths[row] = max(widths[row], column + 1)
+        matrix = [[""] * width for width in widths]
+        for node, (row, column) in enumerate(cells):
+            label = core.node_labels[node]
+            label = str(core.nodes[node]) if label is None else str(label)
+            if len(label) > 1 and label[0] == "$" and label[-1] == "$":
+                label = label[1:-1]  # the matrix is already in maths mode
+            matrix[row][column] = label
+        for edge in core.edges():
+            domain_row, domain_column = cells[core.edge_src[edge]]
+            codomain_row, codomain_column = cells[core.edge_dst[edge]]
+            rows = codomain_row - domain_row
+            columns = codomain_column - domain_column
+            direction = ("r" * columns if columns > 0 else "l" * -columns) + ("d" * rows if rows > 0 else "u" * -rows)
+            arrow_options = [direction or "loop right"]
+            label = core.edge_labels[edge]
+            if label is not None:
+                label = str(label)
+                if not self.__is_group(label):
+                    label = f"{{{label}}}"  # so commas, quotes and brackets in it don't end the arrow's options
+                arrow_options.append(f'"{label}"')
+            matrix[domain_row][domain_column] += f" \\arrow[{', '.join(arrow_options)}]"
+        return "\\begin{tikzcd}\n" + self.lists_to_latex_matrix(matrix) + "\n\\end{tikzcd}"
+
+    @staticmethod
+    def __is_group(label: str) -> bool:
+        """
+        :return: whether ``label`` is a single balanced ``{...}`` group
+        """
+        if not label.startswith("{"):
+            return False
+        try:
+            return extract_label(label, 1)[1] == len(label)
+        except Exception:
+            return False
+
+    def position_nodes(self, scale=4, layout="auto", components=False, workers: Optional[int] = None,
+                       **options) -> dict[Any, tuple[float, float]]:
+        """
+        Positions the nodes of the diagram using one of the layouts:
+
+        * ``"grid"``: a straight-line drawing on an integer grid with no crossing edges, in linear time, see
+          ``src.layout.planar_grid_positions``. Only for planar diagrams.
+        * ``"layered"``: layers with every morphism pointing down and few crossings, see
+          ``src.layout.layered_positions``, which takes ``iterations`` and ``heuristic`` as ``options``.
+        * ``"force"``: a vectorised force-directed layout, much faster than ``"spring"`` on large diagrams, see
+          ``src.layout.force_positions``, which takes ``seed``, ``iterations`` and ``threshold`` as ``options``.
+        * ``"spring"``: networkx's force-directed ``spring_layout``, starting from ``nx.planar_layout`` if the diagram
+          is planar. Any ``options``, e.g. ``seed``, are passed on to it.
+        * ``"auto"``: ``"grid"`` if the diagram is planar, otherwise ``"layered"``.
+
+        Layouts are cached in ``Converter.layout_cache``, keyed by the diagram, ``scale``, ``layout`` and ``options``,
+        so laying out a diagram that has been laid out before is just a lookup. Set it to ``None`` to always lay out
+        from scratch.
+
+        With ``components``, each weakly connected component is laid out on its own and cached under its own key, so
+        a component that hasn't changed is never laid out again, and the components are packed next to each other
+        with ``src.layout.pack_rectangles``. Each layout takes more than linear time, so this is much faster on a
+        diagram made of many components, and the layout of one doesn't depend on the others. Each component is scaled
+        by the square root of its number of objects, so objects are about as far apart in every component.
+        :param components: whether to lay out each weakly connected component separately
+        :param workers: the number of processes to lay out the components in, implying ``components``, or ``None``
+        to lay them out in this one
+        :param options: passed on to the layout
+        :return: the position of each node
+        """
+        from src.layout import LAYOUTS
+        if layout not in LAYOUTS:
+            raise ValueError(f"Unknown layout: {layout}")
+        if workers is not None and workers < 1:
+            raise ValueError(f"workers must be at least 1, got {workers}")
+        # the core is checked against self.graph first, so the key is always for the graph being laid out
+        core = self.compact_graph()
+        if components or workers is not None:
+            points = self.__component_layout(core, scale, layout, options, workers or 1)
+            if points is not None:
+                return dict(zip(core.nodes, points))
+        cache = self.layout_cache
+        if cache is not None:
+            key = cache.key(core, layout, scale, sorted(options.items()))
+            cached = cache.get(key)
+            # an entry with the wrong number of positions can only come from a damaged or foreign cache file
+            if cached is not None and len(cached) == core.number_of_nodes():
+                return {node: (x, y) for node, (x, y) in zip(core.nodes, cached)}
+        points = self.__layout(core, scale, layout, options)
+        if cache is not None:
+            cache.put(key, [list(point) for point in points])
+        return dict(zip(core.nodes, points))
+
+    def __component_layout(self, core: CompactGraph, scale, layout: str, options: dict[str, Any],
+                           workers: int) -> Optional[list[tuple[float, float]]]:
+        """
+        :return: the position of each node of ``core`` with each of its weakly connected components laid out by
+        ``layout`` on its own, in a pool of ``workers`` processes, and packed together, see ``position_nodes``.
+        ``None`` if ``core`` only has one component, which is laid out as the whole diagram
+        """
+        from concurrent.futures import ProcessPoolExecutor
+        from src.layout import pack_rectangles, rescale
+        incident = self.__incident_edges(core)
+        node_component = [-1] * core.number_of_nodes()
+        components = []
+        for node in range(core.number_of_nodes()):
+            if node_component[node] == -1:
+                components.append(self.__component_subgraph(core, incident, node_component, len(components), node))
+        if len(components) <= 1:
+            return None
+        cache = self.layout_cache
+        params = sorted(options.items())
+        # a component without morphisms is a single object, which needs no layout
+        layouts: list[Optional[list[tuple[float, float]]]] = [
+            None if subgraph is not None else [(0.0, 0.0)] for subgraph, _ in components]
+        keys: list[Optional[str]] = [None] * len(components)
+        missing = []
+        for component, (subgraph, nodes) in enumerate(components):
+            if subgraph is None:
+                continue
+            component_scale = len(nodes) ** 0.5
+            if cache is not None:
+                keys[component] = cache.key(subgraph, layout, component_scale, params)
+                cached = cache.get(keys[component])
+                if cached is not None and len(cached) == len(nodes):
+                    layouts[component] = [(x, y) for x, y in cached]
+                    continue
+            missing.append(component)
+        subgraphs = [components[component][0] for component in missing]
+        scales = [len(components[component][1]) ** 0.5 for component in missing]
+        if len(missing) <= 1 or workers == 1:
+            results = [_component_positions(subgraph, component_scale, layout, options, self.stats)
+                       for subgraph, component_scale in zip(subgraphs, scales)]
+        else:
+            with stage(self.stats, "layout"):
+                with ProcessPoolExecutor(min(workers, len(missing))) as pool:
+                    results = list(pool.map(_component_positions, subgraphs, scales, [layout] * len(missing),
+                                            [options] * len(missing),
+                                            chunksize=max(1, len(missing) // (4 * workers))))
+        for component, points in zip(missing, results):
+            layouts[component] = points
+            if cache is not None:
+                cache.put(keys[component], [list(point) for point in points])
+
+        with stage(self.stats, "pack"):
+            # each component's bounding box, with room around it for the labels of its objects
+            boxes = []
+            for points in layouts:
+                xs = [x for x, _ in points]
+                ys = [y for _, y in points]
+                boxes.append((min(xs), min(ys), max(xs) - min(xs) + 1, max(ys) - min(ys) + 1))
+            corners = pack_rectangles([(width, height) for _, _, width, height in boxes])
+            positions: list[tuple[float, float]] = [(0.0, 0.0)] * core.number_of_nodes()
+            for (_, nodes), points, (min_x, min_y, _, _), (x, y) in zip(components, layouts, boxes, corners):
+                for node, (point_x, point_y) in zip(nodes, points):
+                    positions[node] = (point_x - min_x + x + 0.5, point_y - min_y + y + 0.5)
+            return rescale(positions, scale)
 
-    def position_nodes(self, scale=4):
+    def __layout(self, core: CompactGraph, scale, layout: str, options: dict[str, Any]) -> list[tuple[float, float]]:
         """
-        Positions nodes of graph naively in a grid structure.
+        :return: the position of each node of ``core`` found by ``layout``, see ``position_nodes``
         """
-        if nx.is_planar(self.graph):
-            return nx.spring_layout(self.graph, pos=nx.planar_layout(self.graph), scale=scale)
+        from src.layout import planar_embedding
+        embedding = None
+        if layout not in ("layered", "force"):
+            # planarity is only tested once, and its embedding is reused by whichever layout needs it
+            with stage(self.stats, "planarity"):
+                embedding = planar_embedding(core)
+            if layout == "grid" and embedding is None:
+                raise ValueError("The diagram isn't planar, so it can't be drawn on a grid")
+        with stage(self.stats, "layout"):
+            return self.__positions(core, scale, layout, embedding, options)
+
+    def __positions(self, core: CompactGraph, scale, layout: str, embedding: Optional["nx.PlanarEmbedding"],
+                    options: dict[str, Any]) -> list[tuple[float, float]]:
+        import networkx as nx
+        from src.layout import force_positions, layered_positions, planar_grid_positions, rescale
+        if layout == "layered" or (layout == "auto" and embedding is None):
+            return rescale(layered_positions(core, **options), scale)
+        if layout == "force":
+            return rescale(force_positions(core, **options), scale)
+        if layout != "spring":
+            return rescale(planar_grid_positions(core, embedding), scale)
+        graph = self._networkx_graph()
+        if embedding is not None and len(embedding):
+            start = {core.nodes[node]: point for node, point in nx.planar_layout(embedding).items()}
+            positions = nx.spring_layout(graph, pos=start, scale=scale, **options)
         else:
-            return nx.spring_layout(self.graph, scale=scale)
+            positions = nx.spring_layout(graph, scale=scale, **options)
+        return [(float(positions[node][0]), float(positions[node][1])) for node in core.nodes]
 
-    def to_morphism_representation(self) -> str:
+    def to_morphism_representation(self, method="search", workers: Optional[int] = None) -> str:
         """
-        Converts self.graph into a morphism representation
+        Converts self.graph into a morphism representation, with one of the methods:
+
+        * ``"search"``: a search for parallel paths between objects where paths split and join, which also finds
+          ``comp_morph_paths``. Its equations can be redundant, and the search can take much longer than the diagram
+          is large.
+        * ``"cycles"``: an equation for each cycle in a cycle basis of the diagram that is made of two parallel paths,
+          in about O(E·V) time. This is at most one equation for each morphism that closes a cycle, and far fewer lines
+          than ``"search"`` on large diagrams, but cycles made of more than two paths give no equation.
+
+        Neither method ever leaves the weakly connected component it starts in, so with ``workers`` the components are
+        found first and searched in that many processes at once, giving the same lines. ``comp_morph_paths`` is then
+        left empty, as the paths are found in the other processes.
+        :param workers: the number of processes to use, or ``None`` to search the whole diagram in this one
         :return: the morphism representation of the graph
         """
-        graph = self.graph.reverse()
+        if method not in ("search", "cycles"):
+            raise ValueError(f"Unknown method: {method}")
+        if workers is not None and workers < 1:
+            raise ValueError(f"workers must be at least 1, got {workers}")
+        if workers is not None:
+            equations = self.__parallel_equations(self.compact_graph(), method, workers)
+        elif method == "search":
+            equations = self.__morphism_equations(self.compact_graph())
+        else:
+            equations = self.__cycle_equations(self.compact_graph())
+        with stage(self.stats, "emit"):
+            return "\n".join(equations)
+
+    def __parallel_equations(self, core: CompactGraph, method: str, workers: int) -> set[str]:
+        """
+        :return: the lines of the morphism representation found by ``method`` for each weakly connected component of
+        ``core``, in a pool of ``workers`` processes
+        """
+        from concurrent.futures import ProcessPoolExecutor
+        self.comp_morph_paths = {}
+        self.path_trie = PathTrie()
+        with stage(self.stats, "search"):
+            incident = self.__incident_edges(core)
+            node_component = [-1] * core.number_of_nodes()
+            subgraphs = []
+            for node in range(core.number_of_nodes()):
+                if node_component[node] == -1:
+                    subgraph, _ = self.__component_subgraph(core, incident, node_component, node, node)
+                    if subgraph is not None:
+                        subgraphs.append(subgraph)
+            if len(subgraphs) <= 1 or workers == 1:
+                results = [_component_equations(subgraph, method) for subgraph in subgraphs]
+            else:
+                # an atlas can have thousands of tiny components, so they're sent to the workers in chunks
+                with ProcessPoolExecutor(min(workers, len(subgraphs))) as pool:
+                    results = list(pool.map(_component_equations, subgraphs, [method] * len(subgraphs),
+                                            chunksize=max(1, len(subgraphs) // (4 * workers))))
+        equations = set().union(*results)
+        if self.stats is not None:
+            self.stats.count("equations", len(equations))
+        return equations
+
+    def add_morphism(self, morph, domain, codomain):
+        """
+        Adds the morphism ``morph: domain -> codomain`` to the diagram, replacing the label of any morphism already
+        going from ``domain`` to ``codomain``, and updates ``morphism_equations``.
+
+        Only the weakly connected component containing the morphism is searched again, since the search in
+        ``to_morphism_representation`` never leaves the component it starts in.
+        """
+        core = self.__update_morphism_index()
+        components = {self.__node_component[core.node_ids[obj]] for obj in (domain, codomain) if obj in core.node_ids}
+        for component in components:
+            self.__drop_component(component)
+        is_new = not core.has_edge(domain, codomain)
+        for obj in (domain, codomain):
+            if obj not in core.node_ids:
+                self._add_node(obj, self._object_label(obj))
+        self._add_edge(domain, codomain, morph)
+        domain_id = core.node_ids[domain]
+        codomain_id = core.node_ids[codomain]
+        for _ in range(len(self.__incident), core.number_of_nodes()):
+            self.__incident.append([])
+            self.__node_component.append(-1)
+        if is_new:
+            edge = core.edge_id(domain_id, codomain_id)
+            self.__incident[domain_id].append(edge)
+            if codomain_id != domain_id:
+                self.__incident[codomain_id].append(edge)
+        self.__add_component(core, domain_id)
+        self.__morphism_index_version = core.version
+
+    def remove_morphism(self, domain, codomain):
+        """
+        Removes the morphism going from ``domain`` to ``codomain``, and updates ``morphism_equations``. As with
+        ``add_morphism`` only the component that contained it is searched again.
+        """
+        core = self.__update_morphism_index()
+        if not core.has_edge(domain, codomain):
+            raise KeyError(f"No morphism from {domain} to {codomain}")
+        domain_id = core.node_ids[domain]
+        codomain_id = core.node_ids[codomain]
+        self.__drop_component(self.__node_component[domain_id])
+        edge = core.remove_edge(domain, codomain)
+        if self._graph is not None:
+            self._graph.remove_edge(domain, codomain)
+        self.__incident[domain_id].remove(edge)
+        if codomain_id != domain_id:
+            self.__incident[codomain_id].remove(edge)
+        # removing the morphism may have split the component in two
+        self.__add_component(core, domain_id)
+        if self.__node_component[codomain_id] == -1:
+            self.__add_component(core, codomain_id)
+        self.__morphism_index_version = core.version
+
+    def _object_label(self, obj) -> Any:
+        """
+        :return: the label given to ``obj`` when ``add_morphism`` adds it to the diagram
+        """
+        return None
+
+    def morphism_equations(self) -> KeysView[str]:
+        """
+        :return: the lines of the morphism representation, kept up to date by ``add_morphism`` and
+        ``remove_morphism``. If the diagram has been changed in any other way they are found again from scratch.
+        """
+        self.__update_morphism_index()
+        return self.__equation_counts.keys()
+
+    def morphism_component(self, node) -> Optional["Converter"]:
+        """
+        :return: a converter holding the weakly connected component containing ``node``, with its ``comp_morph_paths``
+        found, as kept up to date by ``add_morphism`` and ``remove_morphism``. ``None`` if ``node`` has no morphisms.
+        """
+        core = self.__update_morphism_index()
+        return self.__components[self.__node_component[core.node_ids[node]]][0]
+
+    def __update_morphism_index(self) -> CompactGraph:
+        """
+        Makes sure the index used by ``add_morphism`` and ``remove_morphism`` matches the diagram, building it from
+        scratch if the diagram has changed since it was last updated.
+        :return: ``self.core``
+        """
+        core = self.compact_graph()
+        if self.__morphism_index_core is core and self.__morphism_index_version == core.version:
+            return core
+        self.__morphism_index_core = core
+        # the edges into and out of each node, the component each node is in, and for each component a converter for
+        # it with its paths found, its equations, and its nodes
+        self.__incident = self.__incident_edges(core)
+        self.__node_component: list[int] = [-1] * core.number_of_nodes()
+        self.__components: dict[int, tuple[Optional[Converter], set[str], list[int]]] = {}
+        # how many components have each equation, since two components with the same labels can share one
+        self.__equation_counts: dict[str, int] = {}
+        self.__next_component = 0
+        for node in range(core.number_of_nodes()):
+            if self.__node_component[node] == -1:
+                self.__add_component(core, node)
+        self.__morphism_index_version = core.version
+        return core
+
+    def __drop_component(self, component: int):
+        _, equations, nodes = self.__components.pop(component)
+        for node in nodes:
+            self.__node_component[node] = -1
+        counts = self.__equation_counts
+        for equation in equations:
+            counts[equation] -= 1
+            if not counts[equation]:
+                del counts[equation]
+
+    @staticmethod
+    def __incident_edges(core: CompactGraph) -> list[list[int]]:
+        """
+        :return: the edges into and out of each node of ``core``, with a loop only listed once
+        """
+        incident: list[list[int]] = [[] for _ in range(core.number_of_nodes())]
+        for edge in core.edges():
+            incident[core.edge_src[edge]].append(edge)
+            if core.edge_dst[edge] != core.edge_src[edge]:
+                incident[core.edge_dst[edge]].append(edge)
+        return incident
+
+    @staticmethod
+    def __component_subgraph(core: CompactGraph, incident: list[list[int]], node_component: list[int], component: int,
+                             start: int) -> tuple[Optional[CompactGraph], list[int]]:
+        """
+        Finds the weakly connected component containing ``start``, marking each of its nodes as in ``component`` in
+        ``node_component``.
+        :param incident: as given by ``__incident_edges``
+        :return: the component as a graph of its own, or ``None`` if it has no edges, and the ids of its nodes in
+        ``core``
+        """
+        edge_src = core.edge_src
+        edge_dst = core.edge_dst
+        node_component[start] = component
+        nodes = [start]
+        edges = []
+        for node in nodes:
+            for edge in incident[node]:
+                if edge_src[edge] != node:
+                    adj_node = edge_src[edge]
+                else:
+                    edges.append(edge)  # only added from its domain, so it's only added once
+                    adj_node = edge_dst[edge]
+                if node_component[adj_node] != component:
+                    node_component[adj_node] = component
+                    nodes.append(adj_node)
+        if not edges:
+            return None, nodes
+        # keeping the nodes and edges in the same order as in core means the search runs exactly as it would over the
+        # whole diagram
+        nodes.sort()
+        edges.sort()
+        subgraph = CompactGraph()
+        for node in nodes:
+            subgraph.add_node(core.nodes[node], core.node_labels[node])
+        for edge in edges:
+            subgraph.add_edge(core.nodes[edge_src[edge]], core.nodes[edge_dst[edge]], core.edge_labels[edge])
+        return subgraph, nodes
+
+    def __add_component(self, core: CompactGraph, start: int):
+        """
+        Finds the weakly connected component containing ``start`` and its equations.
+        """
+        component = self.__next_component
+        self.__next_component += 1
+        subgraph, nodes = self.__component_subgraph(core, self.__incident, self.__node_component, component, start)
+        if subgraph is None:
+            self.__components[component] = (None, set(), nodes)
+            return
+        converter = Converter()
+        converter.core = subgraph
+        converter.stats = self.stats
+        equations = converter.__morphism_equations(subgraph)
+        self.__components[component] = (converter, equations, nodes)
+        counts = self.__equation_counts
+        for equation in equations:
+            counts[equation] = counts.get(equation, 0) + 1
+
+    def __morphism_equations(self, graph: CompactGraph) -> set[str]:
+        """
+        :param graph: the diagram
+        :return: the lines of its morphism representation
+        """
+        graph = graph.reverse()
+        num_nodes = graph.number_of_nodes()
+        in_degree = graph.in_degree
+        out_degree = graph.out_degree
 
         rep = set()  # the morphism representation
+        self.comp_morph_paths = {}
+        self.path_trie = PathTrie()
+        # scratch space for the search, indexed by node id, or edge id for line_keys. Only comp_morph_paths and
+        # path_trie are kept once the representation is found
+        visited: list[Optional[set[int]]] = [None] * num_nodes
+        codomain_children: list[Optional[dict[int, int]]] = [None] * num_nodes
+        line_keys: list[Optional[set[tuple[int, int]]]] = [None] * graph.number_of_edges()
 
         # finding all possible starts
         possible_starts = []
-        for node in graph.nodes:
-            if graph.out_degree[node] > 1 or graph.in_degree[node] == 0:
-                possible_starts.append((graph.in_degree[node], node))
+        for node in range(num_nodes):
+            if out_degree[node] > 1 or in_degree[node] == 0:
+                # sorting by the node itself rather than its id keeps the order the same as it was with networkx
+                possible_starts.append((in_degree[node], graph.nodes[node], node))
 
         possible_starts.sort()
 
+        stats = self.stats
         # modified dfs
-        for _, source in possible_starts:
-            if "visited" in graph.nodes[source]:
-                # if visited no need to search from here, we already know what we will find
-                continue
-            self.__search_for_comp_morph_paths(graph, source, [], [], set())
+        with stage(stats, "search"):
+            for _, _, source in possible_starts:
+                if visited[source] is not None:
+                    # if visited no need to search from here, we already know what we will find
+                    continue
+                self.__search_for_comp_morph_paths(graph, source, visited, codomain_children)
 
         composition_lines = []
-        self.__parse_paths(composition_lines, graph, rep)
+        with stage(stats, "parse paths"):
+            self.__parse_paths(composition_lines, graph, rep, line_keys)
 
-        self.__find_links(composition_lines, graph, rep)
+        with stage(stats, "find links"):
+            self.__find_links(composition_lines, graph, rep, line_keys)
 
-        return "\n".join(rep)
+        if stats is not None:
+            # counted afterwards, so the search isn't slowed down when nothing is being recorded
+            stats.count("nodes visited", sum(len(sources) for sources in visited if sources is not None))
+            stats.count("paths stored", sum(len(spans) for paths in self.comp_morph_paths.values()
+                                            for spans in paths.values()))
+            stats.count("equations", len(rep))
+        return rep
 
-    def __search_for_comp_morph_paths(self, graph: nx.DiGraph, curr_node: Any, path: list[Any],
-                                      prev_domains: list[tuple[Any, int]], prev_codomains: set[tuple[Any, int]]):
+    def __search_for_comp_morph_paths(self, graph: CompactGraph, source: int, visited: list[Optional[set[int]]],
+                                      codomain_children: list[Optional[dict[int, int]]]):
         """
-        A modified depth first search that searches for all paths between a domain and codomain starting from curr_node,
-         while trying to minimise redundancy.
+        A modified depth first search that searches for all paths between a domain and codomain starting from source,
+        while trying to minimise redundancy.
+
+        The search uses an explicit stack, so it isn't limited by Python's recursion limit. The path to the current
+        node, and the domains and codomains along it, are kept in stacks shared by every branch which are truncated
+        when the search backtracks, rather than being copied for each branch.
+
+        Paths are stored as spans of ``self.path_trie`` rather than lists of nodes. The current path is always a branch
+        of the trie, so any part of it ending at the current node is stored without copying it, and a path joining part
+        of the current path to a path found earlier just links the two.
         :param graph: the graph we are searching over, assumed to be the reverse of whatever graph is representing
         the commutative diagram
-        :param curr_node: the node we are currently searching from
-        :param path: a list of nodes showing the path taken to reach this node from the first node this dfs was called
-        on
-        :param prev_domains: a list of all the previous domains in path and their position in path, in the order they
-        appear in path
-        :param prev_codomains: a set of all codomains and their position in path
-        :return:
+        :param source: the node to search from
+        :param visited: for each node, the sources it has been reached from
+        :param codomain_children: for each codomain, the path to each codomain found after it
         """
-        node_pos = len(path)
-        path.append(curr_node)
-        if "visited" not in graph.nodes[curr_node]:
-            graph.nodes[curr_node]["visited"] = {path[0]}
-        else:
-            graph.nodes[curr_node]["visited"].add(path[0])
-        is_domain = graph.out_degree[curr_node] > 1 or graph.in_degree[curr_node] == 0
-        is_codomain = graph.in_degree[curr_node] > 1 or graph.out_degree[curr_node] == 0
-
-        if is_codomain:
-            graph.nodes[curr_node]['codomain_children']: dict[Any, list[Any]] = {}
-            for domain, domain_pos in prev_domains:
-                self.__store_path(domain, curr_node, path[domain_pos:])
-            for codomain, codomain_pos in prev_codomains:
-                graph.nodes[codomain]['codomain_children'][curr_node] = path[codomain_pos:]
-            prev_codomains = prev_codomains.copy()
-            prev_codomains.add((curr_node, node_pos))
-            if "codomain_children" not in graph.nodes[curr_node]:
-                graph.nodes[curr_node]['codomain_children'] = {}
-
-        if is_domain:
-            prev_domains.append((curr_node, node_pos))
-
-        for adj_node in graph.adj[curr_node]:
-            if "visited" not in graph.nodes[adj_node]:
-                branch_path = path.copy()
-                self.__search_for_comp_morph_paths(graph, adj_node, branch_path, prev_domains.copy(), prev_codomains)
-            else:
-                for prev_domain, prev_domain_pos in reversed(prev_domains):
-                    found_existing_path = (prev_domain in self.comp_morph_paths
-                                           and adj_node in self.comp_morph_paths[prev_domain])
-                    path_to = path[prev_domain_pos:]
-                    path_to.append(adj_node)
-                    self.__store_path(prev_domain, adj_node, path_to)
-                    if found_existing_path:
-                        break
+        trie = self.path_trie
+        in_degree = graph.in_degree
+        out_degree = graph.out_degree
+        # the nodes on the path from source to the current node, and their entries in trie
+        path: list[int] = []
+        entries: list[int] = []
+        # all the domains and codomains in path and their position in path, in the order they appear in path
+        prev_domains: list[tuple[int, int]] = []
+        prev_codomains: list[tuple[int, int]] = []
+        # a frame for each node in path: [node, its successors, index of the next successor to search,
+        # len(prev_domains) and len(prev_codomains) before the node was added]
+        stack: list[list] = []
+
+        adj_node = source
+        while True:
+            if adj_node is not None:
+                # entering a node for the first time
+                curr_node = adj_node
+                node_pos = len(path)
+                stack.append([curr_node, graph.successors(curr_node), 0, len(prev_domains), len(prev_codomains)])
+                path.append(curr_node)
+                entry = trie.add(entries[-1] if entries else -1, curr_node)
+                entries.append(entry)
+                if visited[curr_node] is None:
+                    visited[curr_node] = {source}
+                else:
+                    visited[curr_node].add(source)
+                is_domain = out_degree[curr_node] > 1 or in_degree[curr_node] == 0
+                is_codomain = in_degree[curr_node] > 1 or out_degree[curr_node] == 0
+
+                if is_codomain:
+                    codomain_children[curr_node] = {}
+                    for domain, domain_pos in prev_domains:
+                        self.__store_path(domain, curr_node, trie.add_span(entry, node_pos + 1 - domain_pos))
+                    for codomain, codomain_pos in prev_codomains:
+                        codomain_children[codomain][curr_node] = trie.add_span(entry, node_pos + 1 - codomain_pos)
+                    prev_codomains.append((curr_node, node_pos))
+
+                if is_domain:
+                    prev_domains.append((curr_node, node_pos))
+
+            frame = stack[-1]
+            successors = frame[1]
+            if frame[2] == len(successors):
+                # backtracking
+                stack.pop()
+                path.pop()
+                entries.pop()
+                del prev_domains[frame[3]:]
+                del prev_codomains[frame[4]:]
+                if not stack:
+                    return
+                adj_node = None
+                continue
+            adj_node = successors[frame[2]]
+            frame[2] += 1
+            if visited[adj_node] is None:
+                continue
 
-                if "codomain_children" not in graph.nodes[adj_node]:
-                    graph.nodes[adj_node]['codomain_children'] = {}
+            # path followed by adj_node, only added to the trie if it's stored
+            path_end = len(path)
+            leaf = -1
+            for prev_domain, prev_domain_pos in reversed(prev_domains):
+                found_existing_path = (prev_domain in self.comp_morph_paths
+                                       and adj_node in self.comp_morph_paths[prev_domain])
+                if leaf == -1:
+                    leaf = trie.add(entries[-1], adj_node)
+                self.__store_path(prev_domain, adj_node, trie.add_span(leaf, path_end + 1 - prev_domain_pos))
+                if found_existing_path:
+                    break
 
+            if codomain_children[adj_node] is None:
+                codomain_children[adj_node] = {}
+
+            for prev_codomain, prev_codomain_pos in prev_codomains:
+                if adj_node in codomain_children[prev_codomain]:
+                    continue
+                if leaf == -1:
+                    leaf = trie.add(entries[-1], adj_node)
+                codomain_children[prev_codomain][adj_node] = trie.add_span(leaf, path_end + 1 - prev_codomain_pos)
+
+            for codomain in codomain_children[adj_node]:
+                # future_path starts at adj_node, so it continues the end of path
+                future_path = codomain_children[adj_node][codomain]
                 for prev_codomain, prev_codomain_pos in prev_codomains:
-                    if adj_node in graph.nodes[prev_codomain]["codomain_children"]:
-                        continue
-                    path_to = path[prev_codomain_pos:]
-                    path_to.append(adj_node)
-                    graph.nodes[prev_codomain]["codomain_children"][adj_node] = path_to
-
-                for codomain in graph.nodes[adj_node]['codomain_children']:
-                    future_path = graph.nodes[adj_node]['codomain_children'][codomain]
-                    for prev_codomain, prev_codomain_pos in prev_codomains:
-                        if codomain not in graph.nodes[prev_codomain]['codomain_children']:
-                            new_path = path[prev_codomain_pos:] + future_path
-                            graph.nodes[prev_codomain]['codomain_children'][codomain] = new_path
-                    if path[0] not in graph.nodes[adj_node]["visited"]:
-                        for prev_domain, prev_domain_pos in prev_domains:
-                            found_existing_path = (prev_domain in self.comp_morph_paths
-                                                   and codomain in self.comp_morph_paths[prev_domain])
-                            new_path = path[prev_domain_pos:] + future_path
-                            self.__store_path(prev_domain, codomain, new_path)
-                            if found_existing_path:
-                                break
-                    graph.nodes[codomain]['visited'].add(path[0])
-                graph.nodes[adj_node]['visited'].add(path[0])
-
-    def __parse_paths(self, composition_lines, graph, rep):
+                    if codomain not in codomain_children[prev_codomain]:
+                        new_path = trie.add_span(entries[-1], path_end - prev_codomain_pos, future_path)
+                        codomain_children[prev_codomain][codomain] = new_path
+                if source not in visited[adj_node]:
+                    for prev_domain, prev_domain_pos in prev_domains:
+                        found_existing_path = (prev_domain in self.comp_morph_paths
+                                               and codomain in self.comp_morph_paths[prev_domain])
+                        new_path = trie.add_span(entries[-1], path_end - prev_domain_pos, future_path)
+                        self.__store_path(prev_domain, codomain, new_path)
+                        if found_existing_path:
+                            break
+                visited[codomain].add(source)
+            visited[adj_node].add(source)
+            adj_node = None
+
+    def __parse_paths(self, composition_lines, graph: CompactGraph, rep, line_keys):
+        trie = self.path_trie
         for source in self.comp_morph_paths:
             # we may have sinks stored in here
             is_source = graph.out_degree[source] > 1 or graph.in_degree[source] == 0
@@ -177,53 +773,52 @@ class Converter:
                 paths = self.comp_morph_paths[source][sink]
                 if len(paths) > 1:
                     comp_morphs = []
-                    for path in paths:
+                    for span in paths:
+                        path = trie.path(span)
                         morphs = []
                         for i in range(len(path) - 1):
-                            domain = path[i]
-                            codomain = path[i + 1]
-                            edge_data = graph.edges[domain, codomain]
-                            morphs.append(edge_data["label"])
-                            if "line_keys" in edge_data:
-                                edge_data["line_keys"].add((source, sink))
+                            edge = graph.edge_id(path[i], path[i + 1])
+                            morphs.append(graph.edge_labels[edge])
+                            if line_keys[edge] is not None:
+                                line_keys[edge].add((source, sink))
                             else:
-                                edge_data["line_keys"]: set = {(source, sink)}
+                                line_keys[edge] = {(source, sink)}
                         comp_morphs.append("".join(morphs))
                     rep.add(" = ".join(comp_morphs))
                 elif len(paths) == 1:
                     if source == sink:
-                        path = paths.pop()
-                        first_morph = graph.edges[path[0], path[1]]["label"]
+                        path = trie.path(paths.pop())
+                        first_morph = graph.edge_label(path[0], path[1])
                         morphs = [first_morph]
                         for i in range(1, len(path)-1):
-                            morphs.append(graph.edges[path[i], path[i+1]]["label"])
+                            morphs.append(graph.edge_label(path[i], path[i+1]))
                         morphs.append(first_morph)
                         rep.add("".join(morphs))
                         continue
                     else:
                         composition_lines.append((source, sink))
 
-    def __find_links(self, composition_lines, graph, rep):
+    def __find_links(self, composition_lines, graph: CompactGraph, rep, line_keys):
         for source, sink in composition_lines:
-            path = self.comp_morph_paths[source][sink][0]
-            prev_edge = (path[0], path[1])
-            if "line_keys" not in graph.edges[prev_edge]:
-                graph.edges[prev_edge]["line_keys"] = set()
-            prev_line_keys: set = graph.edges[prev_edge]["line_keys"]
+            path = self.path_trie.path(self.comp_morph_paths[source][sink][0])
+            prev_edge = graph.edge_id(path[0], path[1])
+            if line_keys[prev_edge] is None:
+                line_keys[prev_edge] = set()
+            prev_line_keys: set = line_keys[prev_edge]
             links = []
             prev_was_link = False
             for i in range(1, len(path) - 1):
-                curr_edge = (path[i], path[i + 1])
-                if "line_keys" not in graph.edges[curr_edge]:
-                    graph.edges[curr_edge]["line_keys"] = set()
-                curr_line_keys: set = graph.edges[curr_edge]["line_keys"]
+                curr_edge = graph.edge_id(path[i], path[i + 1])
+                if line_keys[curr_edge] is None:
+                    line_keys[curr_edge] = set()
+                curr_line_keys: set = line_keys[curr_edge]
                 if prev_line_keys.isdisjoint(curr_line_keys):
                     if prev_was_link:
-                        links.append(curr_edge)
+                        links[-1].append(curr_edge)
                     else:
                         links.append([prev_edge, curr_edge])
-                        graph.edges[prev_edge]["line_keys"].add((source, sink))
-                    graph.edges[curr_edge]["line_keys"].add((source, sink))
+                        line_keys[prev_edge].add((source, sink))
+                    line_keys[curr_edge].add((source, sink))
                     prev_was_link = True
                 else:
                     prev_was_link = False
@@ -232,18 +827,306 @@ class Converter:
             for link_path in links:
                 morphs = []
                 for edge in link_path:
-                    morphs.append(graph.edges[edge]["label"])
+                    morphs.append(graph.edge_labels[edge])
                 rep.add("".join(morphs))
 
-    def __store_path(self, domain, codomain, path):
+    def __store_path(self, domain, codomain, span: int):
         if domain in self.comp_morph_paths.keys():
             domain_dict = self.comp_morph_paths[domain]
             if codomain in domain_dict.keys():
-                domain_dict[codomain].append(path)
+                domain_dict[codomain].append(span)
             else:
-                domain_dict[codomain] = [path]
+                domain_dict[codomain] = array("l", [span])
         else:
-            self.comp_morph_paths[domain] = {codomain: [path]}
+            self.comp_morph_paths[domain] = {codomain: array("l", [span])}
+
+    def __cycle_equations(self, graph: CompactGraph) -> set[str]:
+        """
+        Finds the morphism representation from a cycle basis of the diagram, see ``to_morphism_representation``.
+
+        A spanning forest is grown from the sources, following morphisms forwards wherever it can, so each morphism
+        that isn't in it closes a cycle that's usually two parallel paths. Each of those cycles gives an equation and
+        each directed cycle a loop. Sources and sinks whose morphisms the equations don't join up get an equation
+        between the shortest paths out of, or into, them that meet, and every other object not joined up is joined by
+        composing a morphism into it with one out of it. Any morphism still missing is written on its own.
+        :param graph: the diagram
+        :return: the lines of its morphism representation
+        """
+        self.comp_morph_paths = {}
+        self.path_trie = PathTrie()
+        num_nodes = graph.number_of_nodes()
+        edge_src = graph.edge_src
+        edge_dst = graph.edge_dst
+        labels = graph.edge_labels
+        rep = set()
+
+        with stage(self.stats, "search"):
+            parent_edge = self.__spanning_forest(graph)
+            depth = [0] * num_nodes
+            for node in self.__tree_order(graph, parent_edge):
+                edge = parent_edge[node]
+                if edge != -1:
+                    depth[node] = depth[edge_src[edge] if edge_dst[edge] == node else edge_dst[edge]] + 1
+            tree_edges = set(parent_edge)
+            # the chains written so far, as lists of edges in the order they're applied, each side of an equation
+            # being a separate chain
+            chains: list[list[int]] = []
+            equation_sides: list[tuple[int, int]] = []  # the indices of the chains on each side of an equation
+            for edge in graph.edges():
+                if edge in tree_edges:
+                    continue
+                cycle = self.__fundamental_cycle(graph, edge, parent_edge, depth)
+                paths = self.__parallel_paths(cycle)
+                if paths is None:
+                    continue
+                if len(paths) == 1:
+                    chains.append(paths[0])
+                else:
+                    equation_sides.append((len(chains), len(chains) + 1))
+                    chains.extend(paths)
+
+        with stage(self.stats, "find links"):
+            # joins the ends of the morphisms the way parsing the lines will: each morphism has a domain end 2 * edge
+            # and a codomain end 2 * edge + 1
+            ends = list(range(2 * len(labels)))
+
+            def find(end: int) -> int:
+                while ends[end] != end:
+                    ends[end] = ends[ends[end]]
+                    end = ends[end]
+                return end
+
+            def join(first: int, second: int):
+                ends[find(first)] = find(second)
+
+            def join_chain(chain: list[int]):
+                for before, after in zip(chain, chain[1:]):
+                    join(2 * before + 1, 2 * after)
+
+            for chain in chains:
+                join_chain(chain)
+            for first, second in equation_sides:
+                join(2 * chains[first][0], 2 * chains[second][0])
+                join(2 * chains[first][-1] + 1, 2 * chains[second][-1] + 1)
+            links = []
+            for node in range(num_nodes):
+                in_edges = graph.in_edges(node)
+                out_edges = graph.out_edges(node)
+                if not in_edges or not out_edges:
+                    # the morphisms out of a source can only be joined by an equation, as can those into a sink
+                    forwards = not in_edges
+                    edges = out_edges if forwards else in_edges
+                    node_end = 0 if forwards else 1
+                    for edge in edges[1:]:
+                        if find(2 * edge + node_end) == find(2 * edges[0] + node_end):
+                            continue
+                        paths = self.__meeting_paths(graph, edges[0], edge, forwards)
+                        if paths is not None:
+                            equation_sides.append((len(chains), len(chains) + 1))
+                            chains.extend(paths)
+                            join_chain(paths[0])
+                            join_chain(paths[1])
+                            join(2 * paths[0][0], 2 * paths[1][0])
+                            join(2 * paths[0][-1] + 1, 2 * paths[1][-1] + 1)
+                    continue
+                for edge in in_edges:
+                    if find(2 * edge + 1) != find(2 * out_edges[0]):
+                        links.append([edge, out_edges[0]])
+                        join_chain(links[-1])
+                for edge in out_edges:
+                    if find(2 * edge) != find(2 * in_edges[0] + 1):
+                        links.append([in_edges[0], edge])
+                        join_chain(links[-1])
+
+        def composite(chain: list[int]) -> str:
+            return "".join(labels[edge] for edge in reversed(chain))
+
+        in_equation = set()
+        for first, second in equation_sides:
+            in_equation.update((first, second))
+            rep.add(" = ".join(sorted((composite(chains[first]), composite(chains[second])))))
+        for i, chain in enumerate(chains):
+            if i not in in_equation:
+                rep.add(composite(chain))
+        for link in links:
+            rep.add(composite(link))
+        written = {edge for chain in chains + links for edge in chain}
+        for edge in graph.edges():
+            if edge not in written:
+                rep.add(labels[edge])
+        if self.stats is not None:
+            self.stats.count("equations", len(rep))
+        return rep
+
+    @staticmethod
+    def __spanning_forest(graph: CompactGraph) -> list[int]:
+        """
+        Finds a spanning tree of each weakly connected component out of depth first searches that only follow
+        morphisms forwards, from each source in turn and then from any object they didn't reach. Within a search the
+        morphisms not in the tree go from an object to one after it, before it or beside it in the search, and so close
+        a cycle of two parallel paths or a directed cycle. Each search is joined to the trees of earlier ones by the
+        first morphism it found into each of them, with the tree being joined rerooted at the end of that morphism.
+        :return: the edge joining each node to its parent in the tree, or -1 for the root
+        """
+        num_nodes = graph.number_of_nodes()
+        in_degree = graph.in_degree
+        edge_src = graph.edge_src
+        edge_dst = graph.edge_dst
+        parent_edge = [-1] * num_nodes
+        search = [-1] * num_nodes  # the search that reached each node
+        joined = []  # union-find over the searches, joined when their trees are
+
+        def find(tree: int) -> int:
+            while joined[tree] != tree:
+                joined[tree] = joined[joined[tree]]
+                tree = joined[tree]
+            return tree
+
+        for root in sorted(range(num_nodes), key=lambda node: in_degree[node] > 0):
+            if search[root] != -1:
+                continue
+            current = len(joined)
+            joined.append(current)
+            search[root] = current
+            crossing = []  # morphisms into the trees of earlier searches
+            stack = [(root, iter(graph.out_edges(root)))]
+            while stack:
+                node, edges = stack[-1]
+                for edge in edges:
+                    adj_node = edge_dst[edge]
+                    if search[adj_node] == -1:
+                        search[adj_node] = current
+                        parent_edge[adj_node] = edge
+                        stack.append((adj_node, iter(graph.out_edges(adj_node))))
+                        break
+                    if search[adj_node] != current:
+                        crossing.append(edge)
+                else:
+                    stack.pop()
+            for edge in crossing:
+                domain = edge_src[edge]
+                earlier = find(search[edge_dst[edge]])
+                if find(current) == earlier:
+                    continue
+                # reroot the tree holding domain at it, then hang it from the codomain
+                node = domain
+                new_parent_edge = edge
+                while node != -1:
+                    old_parent_edge = parent_edge[node]
+                    parent_edge[node] = new_parent_edge
+                    if old_parent_edge == -1:
+                        break
+                    node = edge_src[old_parent_edge] if edge_dst[old_parent_edge] == node else edge_dst[old_parent_edge]
+                    new_parent_edge = old_parent_edge
+                joined[find(current)] = earlier
+        return parent_edge
+
+    @staticmethod
+    def __meeting_paths(graph: CompactGraph, first: int, second: int, forwards: bool) -> Optional[list[list[int]]]:
+        """
+        :param first: a morphism out of a source if ``forwards``, otherwise into a sink
+        :param second: another morphism with the same domain, or codomain
+        :return: the shortest paths starting with ``first`` and ``second`` that end at the same object, or if not
+        ``forwards`` that end with them and start at the same object, with their edges in the order they're applied.
+        ``None`` if there aren't any
+        """
+        edge_src = graph.edge_src
+        edge_dst = graph.edge_dst
+        ends, next_edges = (edge_dst, graph.out_edges) if forwards else (edge_src, graph.in_edges)
+
+        def search(edge: int, stop: Optional[dict[int, int]]) -> tuple[dict[int, int], int]:
+            # the edge each node was reached by, until a node in stop is reached
+            reached = {ends[edge]: edge}
+            queue = [ends[edge]]
+            for node in queue:
+                if stop is not None and node in stop:
+                    return reached, node
+                for next_edge in next_edges(node):
+                    if ends[next_edge] not in reached:
+                        reached[ends[next_edge]] = next_edge
+                        queue.append(ends[next_edge])
+            return reached, -1
+
+        def path(reached: dict[int, int], node: int, start: int) -> list[int]:
+            edges = [reached[node]]
+            while edges[-1] != start:
+                edges.append(reached[edge_src[edges[-1]] if forwards else edge_dst[edges[-1]]])
+            return edges[::-1] if forwards else edges
+
+        first_reached, _ = search(first, None)
+        second_reached, meeting = search(second, first_reached)
+        if meeting == -1:
+            return None
+        return [path(first_reached, meeting, first), path(second_reached, meeting, second)]
+
+    @staticmethod
+    def __tree_order(graph: CompactGraph, parent_edge: list[int]) -> list[int]:
+        """
+        :return: the nodes ordered so that each comes after its parent in the spanning forest
+        """
+        children: list[list[int]] = [[] for _ in parent_edge]
+        order = []
+        for node, edge in enumerate(parent_edge):
+            if edge == -1:
+                order.append(node)
+            else:
+                parent = graph.edge_src[edge] if graph.edge_dst[edge] == node else graph.edge_dst[edge]
+                children[parent].append(node)
+        for node in order:
+            order.extend(children[node])
+        return order
+
+    @staticmethod
+    def __fundamental_cycle(graph: CompactGraph, edge: int, parent_edge: list[int],
+                            depth: list[int]) -> list[tuple[int, bool]]:
+        """
+        :return: the cycle made by ``edge`` and the path between its ends in the spanning forest, as each edge on it
+        and whether it's followed forwards, going around the cycle along ``edge``
+        """
+        edge_src = graph.edge_src
+        edge_dst = graph.edge_dst
+
+        def parent(node: int) -> int:
+            tree_edge = parent_edge[node]
+            return edge_src[tree_edge] if edge_dst[tree_edge] == node else edge_dst[tree_edge]
+
+        # the tree edges from the codomain of edge up to the lowest common ancestor, followed upwards, and from the
+        # domain, which are followed downwards
+        up = []
+        down = []
+        node = edge_dst[edge]
+        other = edge_src[edge]
+        while node != other:
+            if depth[node] >= depth[other]:
+                up.append((parent_edge[node], edge_src[parent_edge[node]] == node))
+                node = parent(node)
+            else:
+                down.append((parent_edge[other], edge_dst[parent_edge[other]] == other))
+                other = parent(other)
+        return [(edge, True)] + up + down[::-1]
+
+    @staticmethod
+    def __parallel_paths(cycle: list[tuple[int, bool]]) -> Optional[list[list[int]]]:
+        """
+        :param cycle: as given by ``__fundamental_cycle``
+        :return: the two paths going from one end of ``cycle`` to the other if it's made of two parallel paths, the
+        cycle starting from its first edge if every edge on it goes the same way, otherwise ``None``
+        """
+        changes = [i for i in range(len(cycle)) if cycle[i][1] != cycle[i - 1][1]]
+        if not changes:
+            edges = [edge for edge, _ in cycle]
+            if not cycle[0][1]:
+                edges.reverse()
+            start = edges.index(min(edges))
+            loop = edges[start:] + edges[:start]
+            # the first morphism is repeated at the end, which joins the end of the loop to its start
+            return [loop + [loop[0]]]
+        if len(changes) != 2:
+            return None
+        first = cycle[changes[0]:changes[1]]
+        second = cycle[changes[1]:] + cycle[:changes[0]]
+        forwards, backwards = (first, second) if first[0][1] else (second, first)
+        return [[edge for edge, _ in forwards], [edge for edge, _ in reversed(backwards)]]
 
     @staticmethod
     def verify_char_is_open_bracket(i, line):
@@ -253,7 +1136,7 @@ class Converter:
         :param line: the line to be checked
         :return:
         """
-        if line[i] != "{":
+        if i >= len(line) or line[i] != "{":
             raise Exception("Unexpected Character\n" + line + '-' * i + '^')
 
     def to_diagram_representation(self) -> str:
@@ -261,21 +1144,94 @@ class Converter:
         Converts stored graph into the diagram representation
         :return: the diagram representation as a string
         """
+        graph = self.compact_graph()
+        with stage(self.stats, "emit"):
+            return self.__diagram_lines(graph)
+
+    @staticmethod
+    def __diagram_lines(graph: CompactGraph) -> str:
         label_lines = []
         morph_lines = []
-        seen_objs = set()
-        for edge in self.graph.edges():
-            for obj in edge:
-                if obj not in seen_objs:
-                    seen_objs.add(obj)
-                    if self.graph.nodes[obj]["label"] != obj:
-                        label = self.graph.nodes[obj]["label"]
-                        label_lines.append(f"L{{{str(obj)}}}{{{str(label)}}}")
-
-            label = self.graph[edge[0]][edge[1]]['label']
-            morph_lines.append(f"{{{str(label)}}}{{{edge[0]}}}{{{edge[1]}}}")
+        seen_objs = [False] * graph.number_of_nodes()
+        for edge in graph.edges():
+            for obj in (graph.edge_src[edge], graph.edge_dst[edge]):
+                if not seen_objs[obj]:
+                    seen_objs[obj] = True
+                    label = graph.node_labels[obj]
+                    # an object without a label is displayed as itself
+                    if label is not None and label != graph.nodes[obj]:
+                        label_lines.append(f"L{{{str(graph.nodes[obj])}}}{{{str(label)}}}")
+
+            label = graph.edge_labels[edge]
+            domain = graph.nodes[graph.edge_src[edge]]
+            codomain = graph.nodes[graph.edge_dst[edge]]
+            morph_lines.append(f"{{{str(label)}}}{{{domain}}}{{{codomain}}}")
 
         return "\n".join(label_lines + morph_lines)
+
+    def canonical_hash(self, object_labels: bool = True) -> str:
+        """
+        Hashes the diagram up to the names of its objects and the order it was built in, so e.g. the same equations
+        parsed in a different order by a ``MorphismParser`` give the same key, and results for one can be reused for
+        the other.
+
+        Every object is coloured by its label, then repeatedly recoloured by its colour together with the labels and
+        colours of the morphisms into and out of it (Weisfeiler-Lehman refinement) until no more objects can be told
+        apart. Colours are numbered in the sorted order of what they were made from, so an object gets the same colour
+        in every copy of the diagram, and the hash is of the labelled, coloured objects and morphisms. Isomorphic
+        diagrams always get the same hash. Different diagrams can only get the same hash if refinement can't tell
+        their objects apart, e.g. one cycle and two half as long with every morphism labelled the same.
+        :param object_labels: whether the labels of objects count, as they do in the TikZ. An object without a label
+        counts as labelled with itself, as that's how it's displayed
+        :return: a hex digest
+        """
+        core = self.compact_graph()
+        if object_labels:
+            labels = [repr(str(node) if label is None else label) for node, label in zip(core.nodes, core.node_labels)]
+        else:
+            labels = [""] * core.number_of_nodes()
+        colours = self.__refine(core, labels)
+        edge_labels = [repr(label) for label in core.edge_labels]
+        digest = hashlib.sha256()
+        digest.update(repr(sorted(zip(colours, labels))).encode())
+        digest.update(repr(sorted((colours[core.edge_src[edge]], edge_labels[edge], colours[core.edge_dst[edge]])
+                                  for edge in core.edges())).encode())
+        return digest.hexdigest()
+
+    @staticmethod
+    def __refine(graph: CompactGraph, labels: list[str]) -> list[int]:
+        """
+        :return: the colour of each node of ``graph`` once no more can be told apart, see ``canonical_hash``
+        """
+        colours = Converter.__rank(labels)
+        num_colours = len(set(colours))
+        edges = graph.edges()
+        edge_labels = [repr(graph.edge_labels[edge]) for edge in edges]
+        # with unique morphism labels every object is told apart in a round or two. Repeated labels can take a round for
+        # each step along the diagram, e.g. a chain of identical morphisms is split one object in from each end a round
+        while num_colours < len(colours):
+            out_edges: list[list[tuple[str, int]]] = [[] for _ in colours]
+            in_edges: list[list[tuple[str, int]]] = [[] for _ in colours]
+            for edge, label in zip(edges, edge_labels):
+                domain = graph.edge_src[edge]
+                codomain = graph.edge_dst[edge]
+                out_edges[domain].append((label, colours[codomain]))
+                in_edges[codomain].append((label, colours[domain]))
+            colours = Converter.__rank([(colour, tuple(sorted(out_edges[node])), tuple(sorted(in_edges[node])))
+                                        for node, colour in enumerate(colours)])
+            # each colour is split or kept, never merged, so if none were split none ever will be
+            if len(set(colours)) == num_colours:
+                break
+            num_colours = len(set(colours))
+        return colours
+
+    @staticmethod
+    def __rank(values: list) -> list[int]:
+        """
+        :return: the position of each value among the distinct values, in sorted order
+        """
+        ranks = {value: rank for rank, value in enumerate(sorted(set(values)))}
+        return [ranks[value] for value in values]
     ####################################################
     # Function graveyard, here lie some old functions. #
     ####################################################
@@ -468,3 +1424,27 @@ class Converter:
     #         self.comp_morph_eqs[key].add(comp_morph)
     #     else:
     #         self.comp_morph_eqs[key] = {comp_morph}
+
+
+def _component_equations(graph: CompactGraph, method: str) -> set[str]:
+    """
+    :return: the lines of the morphism representation of ``graph`` found by ``method``, run in a worker process by
+    ``Converter.to_morphism_representation``
+    """
+    converter = Converter()
+    converter.core = graph
+    return set(converter.to_morphism_representation(method).split("\n")) - {""}
+
+
+def _component_positions(graph: CompactGraph, scale, layout: str, options: dict[str, Any],
+                         stats: Optional[Stats] = None) -> list[tuple[float, float]]:
+    """
+    :return: the position of each node of ``graph`` found by ``layout``, without using the layout cache, run in a
+    worker process by ``Converter.position_nodes`` for each component of a diagram
+    """
+    converter = Converter()
+    converter.core = graph
+    converter.layout_cache = None
+    converter.stats = stats
+    positions = converter.position_nodes(scale, layout, **options)
+    return [positions[node] for node in graph.nodes]
@@ -1,11 +1,15 @@
 import os.path
+from typing import Iterable, Iterator, Optional
 
 from src.converter import Converter
+from src.stats import Stats
+from src.symbols import SymbolTable
+from src.tokenizer import scan, scan_lines
 
 
 class DiagramParser(Converter):
 
-    def __init__(self, filepath: str):
+    def __init__(self, filepath: Optional[str] = None, stats: Optional[Stats] = None):
         """
         Parses a file containing a representation of a commutative diagram.
 
@@ -25,73 +29,110 @@ class DiagramParser(Converter):
         at the beginning of the file. These labels will be displayed in the diagram in place of the object.
 
         ``Domain``, ``Codomain`` and ``Function`` cannot be the empty string, but they may contain \"{\" and \"}\".
-        :param filepath: Location of the text representation of the commutative diagram.
+        :param filepath: Location of the text representation of the commutative diagram. If ``None`` the parser starts
+        with an empty diagram, which can be filled using ``parse_stream``.
+        :param stats: records the time taken to parse the file and by later conversions, see ``Converter.stats``
         """
         super().__init__()
+        if stats is not None:
+            self.stats = stats
+        # every label read is passed through this, so a label used many times is only stored once
+        self.symbols = SymbolTable()
+        if filepath is None:
+            return
         if not os.path.isfile(filepath):
             raise FileNotFoundError("No such file: " + filepath)
         with open(filepath, 'r') as f:
-            line = f.readline()
-            while line[0] == 'L':
-                self.__parse_label_line(line)
-                line = f.readline()
-            self.__parse_morph_line(line)
-            for line in f:
-                if line[0] == "%":  # lets us comment
-                    continue
-                self.__parse_morph_line(line)
-
-    def __parse_morph_line(self, line: str):
+            text = f.read()
+        if self.stats is None:
+            for _ in self.__parse_tokens(scan(text)):
+                pass
+            return
+        # the lines are only tokenized up front when the stages are timed separately
+        with self.stats.stage("tokenize"):
+            token_lines = list(scan(text))
+        with self.stats.stage("build graph"):
+            for _ in self.__parse_tokens(token_lines):
+                pass
+
+    @classmethod
+    def from_stream(cls, stream: Iterable[str]) -> "DiagramParser":
         """
-        Parses a line of the form::
+        Parses a diagram from any stream of lines, e.g. an open file, ``sys.stdin`` or a list of strings, without
+        needing it to be written to disk first.
+        :param stream: an iterable of lines in the diagram representation described in ``__init__``
+        :return: a parser containing the parsed diagram
+        """
+        parser = cls()
+        for _ in parser.parse_stream(stream):
+            pass
+        return parser
+
+    def parse_stream(self, stream: Iterable[str]) -> Iterator[tuple[str, str, str]]:
+        """
+        Lazily parses a stream of lines, adding each morphism to the graph as it is read.
+
+        Label lines are only accepted before the first morphism line, as in a file.
+        :param stream: an iterable of lines in the diagram representation described in ``__init__``
+        :return: a generator yielding ``(Function, Domain, Codomain)`` for each morphism once it has been added
+        """
+        return self.__parse_tokens(scan_lines(stream))
+
+    def __parse_tokens(self, token_lines: Iterable[list[str]]) -> Iterator[tuple[str, str, str]]:
+        reading_labels = True
+        for tokens in token_lines:
+            if not tokens:  # blank line or comment
+                continue
+            if tokens[0][0] == "L":
+                if not reading_labels:
+                    raise Exception("Labels must be given before any morphisms: " + "".join(tokens))
+                self.__parse_label_line(tokens)
+                continue
+            reading_labels = False
+            yield self.__parse_morph_line(tokens)
+
+    def __parse_morph_line(self, tokens: list[str]) -> tuple[str, str, str]:
+        """
+        Parses the tokens of a line of the form::
 
             {Function}{Domain}{Codomian}
 
 
-        :param line: the line to be parsed
+        :param tokens: the tokens of the line to be parsed
+        :return: ``(Function, Domain, Codomain)``
         """
-        objs = [""] * 3
-        num_objs = 0
-        i = 0
-        while i < len(line):
-            c: str = line[i]  # iterate through each character
-            if c == "{":
-                if num_objs <= 3 and line[i + 1] == "}":
-                    raise Exception("Braces cannot be empty")
-                obj, i = self.extract_label(line, i + 1)
-                objs[num_objs] = obj
-                num_objs += 1
-                # if obj is an object and not a map label, and doesn't have a node yet, add it
-                if num_objs > 1 and obj not in self.graph.nodes:
-                    self.graph.add_node(obj, label=obj)
-            elif c == "%":
-                if num_objs == 0:
-                    return
-                else:
-                    break
-            else:
-                i += 1
-            if num_objs == 3:
-                break
-
-        if num_objs != 3:
-            raise Exception(f"Invalid number of objects, expected 3, got {num_objs}.")
-        self.graph.add_edge(objs[1], objs[2], label=objs[0])
-
-    def __parse_label_line(self, line: str):
+        objs = [obj for obj in tokens if obj != "="][:3]
+        if len(objs) != 3:
+            raise Exception(f"Invalid number of objects, expected 3, got {len(objs)}.")
+        if "{}" in objs:
+            raise Exception("Braces cannot be empty")
+        intern = self.symbols.intern
+        morph, domain, codomain = intern(objs[0]), intern(objs[1]), intern(objs[2])
+        # if obj is an object and not a map label, and doesn't have a node yet, add it
+        for obj in (domain, codomain):
+            if not self._has_node(obj):
+                self._add_node(obj, obj)
+        self._add_edge(domain, codomain, morph)
+        return morph, domain, codomain
+
+    def _object_label(self, obj) -> str:
+        # as when parsing, an object is labelled with itself until a label line says otherwise
+        return obj
+
+    def __parse_label_line(self, tokens: list[str]):
         """
-        Parses a line of the form::
+        Parses the tokens of a line of the form::
 
             L{Object}{Label}
 
-        :param line: the line to be parsed
+        :param tokens: the tokens of the line to be parsed
         """
-        self.verify_char_is_open_bracket(1, line)
-        obj, i = self.extract_label(line, 2)
-        if obj == "{}":
-            raise Exception("Braces cannot be empty")
-        self.verify_char_is_open_bracket(i, line)
-        label, _ = self.extract_label(line, i + 1)
-        if label == "{}":
+        # the first token is the L and anything between it and the first "{", which should be nothing
+        self.verify_char_is_open_bracket(1, "".join(tokens))
+        if len(tokens) < 3 or "=" in tokens[1:3]:
+            raise Exception("Invalid label line, expected L{Object}{Label}: " + "".join(tokens))
+        obj, label = tokens[1], tokens[2]
+        if obj == "{}" or label == "{}":
             raise Exception("Braces cannot be empty")
-        self.graph.add_node(obj, label=label)
+        obj, label = self.symbols.intern(obj), self.symbols.intern(label)
+        self._add_node(obj, label)
@@ -0,0 +1,462 @@
+"""
+Layout engines used by ``Converter.position_nodes``. Each takes the diagram as a ``CompactGraph`` and returns the
+position of every node as a list indexed by node id.
+"""
+from typing import Optional
+
+import networkx as nx
+
+from src.compact_graph import CompactGraph
+
+# the layouts Converter.position_nodes can use
+LAYOUTS = ("auto", "force", "grid", "layered", "spring")
+
+
+def undirected(graph: CompactGraph) -> nx.Graph:
+    """
+    :return: the underlying undirected graph of ``graph``, on its node ids, without self-loops
+    """
+    nx_graph = nx.Graph()
+    nx_graph.add_nodes_from(range(graph.number_of_nodes()))
+    nx_graph.add_edges_from((graph.edge_src[edge], graph.edge_dst[edge]) for edge in graph.edges()
+                            if graph.edge_src[edge] != graph.edge_dst[edge])
+    return nx_graph
+
+
+def planar_embedding(graph: CompactGraph) -> Optional[nx.PlanarEmbedding]:
+    """
+    :return: a planar embedding of ``graph`` on its node ids, or ``None`` if it isn't planar
+    """
+    is_planar, embedding = nx.check_planarity(undirected(graph))
+    return embedding if is_planar else None
+
+
+def planar_grid_positions(graph: CompactGraph,
+                          embedding: Optional[nx.PlanarEmbedding] = None) -> Optional[list[tuple[int, int]]]:
+    """
+    Draws a planar graph on an integer grid with straight, non-crossing edges, using the linear time shift method of
+    de Fraysseix, Pach and Pollack as improved by Chrobak and Payne. The drawing only depends on the graph, so the same
+    diagram is always drawn the same way.
+    :param graph: the diagram
+    :param embedding: the diagram's planar embedding if it's already known, see ``planar_embedding``
+    :return: the grid point of each node, or ``None`` if ``graph`` isn't planar
+    """
+    if embedding is None:
+        embedding = planar_embedding(graph)
+        if embedding is None:
+            return None
+    if not len(embedding):
+        return []
+    pos = nx.combinatorial_embedding_to_pos(embedding)
+    return [pos[node] for node in range(graph.number_of_nodes())]
+
+
+def rescale(positions: list[tuple[float, float]], scale: float) -> list[tuple[float, float]]:
+    """
+    Centres ``positions`` on the origin and scales them so the largest coordinate is ``scale``, as
+    ``nx.rescale_layout`` does.
+    """
+    if not positions:
+        return []
+    mean_x = sum(x for x, _ in positions) / len(positions)
+    mean_y = sum(y for _, y in positions) / len(positions)
+    limit = max(max(abs(x - mean_x), abs(y - mean_y)) for x, y in positions)
+    factor = scale / limit if limit > 0 else 0
+    return [((x - mean_x) * factor, (y - mean_y) * factor) for x, y in positions]
+
+
+def pack_rectangles(sizes: list[tuple[float, float]]) -> list[tuple[float, float]]:
+    """
+    Packs rectangles into a roughly square area without overlaps, by placing them on shelves from the top down in
+    order of decreasing height, each shelf filled from the left as far as the width of the widest rectangle or of a
+    square of their total area, whichever is larger. The packing only depends on ``sizes``.
+    :param sizes: the width and height of each rectangle
+    :return: the bottom left corner of each rectangle, with the top of the packing at ``y = 0``
+    """
+    if not sizes:
+        return []
+    width = max(max(w for w, _ in sizes), sum(w * h for w, h in sizes) ** 0.5)
+    corners: list[tuple[float, float]] = [(0.0, 0.0)] * len(sizes)
+    x = shelf_top = shelf_height = 0.0
+    for rect in sorted(range(len(sizes)), key=lambda rect: (-sizes[rect][1], -sizes[rect][0], rect)):
+        rect_width, rect_height = sizes[rect]
+        if x and x + rect_width > width:
+            x = 0.0
+            shelf_top -= shelf_height
+            shelf_height = 0.0
+        if not x:
+            shelf_height = rect_height  # the first rectangle on a shelf is the tallest
+        corners[rect] = (x, shelf_top - rect_height)
+        x += rect_width
+    return corners
+
+
+def feedback_arcs(graph: CompactGraph) -> set[int]:
+    """
+    Finds edges whose reversal leaves ``graph`` without cycles, as the back edges of a depth first search started from
+    the sources first, so a diagram that's already acyclic has none.
+    :return: the ids of the edges, including any self-loops
+    """
+    edge_dst = graph.edge_dst
+    in_degree = graph.in_degree
+    num_nodes = graph.number_of_nodes()
+    state = [0] * num_nodes  # 0 not reached yet, 1 on the search path, 2 finished
+    arcs = set()
+    roots = [node for node in range(num_nodes) if in_degree[node] == 0]
+    roots.extend(node for node in range(num_nodes) if in_degree[node] != 0)
+    for root in roots:
+        if state[root]:
+            continue
+        state[root] = 1
+        stack = [(root, iter(graph.out_edges(root)))]
+        while stack:
+            node, out_edges = stack[-1]
+            for edge in out_edges:
+                child = edge_dst[edge]
+                if state[child] == 1:
+                    arcs.add(edge)
+                elif state[child] == 0:
+                    state[child] = 1
+                    stack.append((child, iter(graph.out_edges(child))))
+                    break
+            else:
+                state[node] = 2
+                stack.pop()
+    return arcs
+
+
+def count_crossings(upper: list[int], down: list[list[int]], order: list[int]) -> int:
+    """
+    :param upper: the nodes of a layer
+    :param down: for each node, its neighbours in the next layer
+    :param order: the position of each node in its layer
+    :return: the number of crossings between the edges from ``upper`` to the next layer, counted as inversions with a
+    Fenwick tree
+    """
+    ends = sorted((order[node], order[child]) for node in upper for child in down[node])
+    if not ends:
+        return 0
+    size = max(end for _, end in ends) + 1
+    tree = [0] * (size + 1)
+    crossings = 0
+    for count, (_, end) in enumerate(ends):
+        # the number of edges seen so far ending at or before end
+        i = end + 1
+        not_crossing = 0
+        while i:
+            not_crossing += tree[i]
+            i -= i & -i
+        crossings += count - not_crossing
+        i = end + 1
+        while i <= size:
+            tree[i] += 1
+            i += i & -i
+    return crossings
+
+
+def layered_positions(graph: CompactGraph, iterations: int = 8, heuristic: str = "median",
+                      max_dummies: Optional[int] = None) -> list[tuple[float, float]]:
+    """
+    Draws the diagram in layers, Sugiyama style, with every morphism pointing down. Cycles are broken by reversing the
+    edges found by ``feedback_arcs``, each object is put in the layer after its furthest predecessor, and morphisms
+    spanning several layers get a dummy node in each layer between their ends, if there aren't too many. The order of each layer is then
+    improved by sweeping down and up the layers, moving each node to the median or barycentre of its neighbours in the
+    layer before, and the order with the fewest crossings is kept.
+    :param graph: the diagram
+    :param iterations: the largest number of sweeps, stopping early once there are no crossings
+    :param heuristic: ``"median"`` or ``"barycentre"``, how the sweeps place a node relative to its neighbours
+    :param max_dummies: the most dummy nodes to add, defaults to four times the size of the graph
+    :return: the position of each node, with its layer as its y coordinate and its position in the layer as its x
+    """
+    if heuristic not in ("median", "barycentre"):
+        raise ValueError(f"Unknown heuristic: {heuristic}")
+    num_nodes = graph.number_of_nodes()
+    edge_src = graph.edge_src
+    edge_dst = graph.edge_dst
+    arcs = feedback_arcs(graph)
+    successors: list[list[int]] = [[] for _ in range(num_nodes)]
+    in_degree = [0] * num_nodes
+    for edge in graph.edges():
+        domain, codomain = edge_src[edge], edge_dst[edge]
+        if domain == codomain:
+            continue
+        if edge in arcs:
+            domain, codomain = codomain, domain
+        successors[domain].append(codomain)
+        in_degree[codomain] += 1
+
+    # longest path layering, in topological order
+    rank = [0] * num_nodes
+    queue = [node for node in range(num_nodes) if in_degree[node] == 0]
+    for node in queue:
+        for child in successors[node]:
+            rank[child] = max(rank[child], rank[node] + 1)
+            in_degree[child] -= 1
+            if not in_degree[child]:
+                queue.append(child)
+
+    # neighbours in the layers above and below. Morphisms spanning several layers get dummy nodes, after the real
+    # ones, unless there would be more than max_dummies of them, as happens when the layering is very deep. Then they
+    # go straight between their ends, which only their ends' positions take into account
+    up: list[list[int]] = [[] for _ in range(num_nodes)]
+    down: list[list[int]] = [[] for _ in range(num_nodes)]
+    if max_dummies is None:
+        max_dummies = 4 * (num_nodes + graph.number_of_edges())
+    use_dummies = sum(rank[child] - rank[node] - 1 for node in range(num_nodes)
+                      for child in successors[node]) <= max_dummies
+    for node in range(num_nodes):
+        for child in successors[node]:
+            prev = node
+            if use_dummies:
+                for layer in range(rank[node] + 1, rank[child]):
+                    dummy = len(rank)
+                    rank.append(layer)
+                    up.append([prev])
+                    down.append([])
+                    down[prev].append(dummy)
+                    prev = dummy
+            down[prev].append(child)
+            up[child].append(prev)
+
+    layers: list[list[int]] = [[] for _ in range(max(rank, default=-1) + 1)]
+    for node in range(len(rank)):
+        layers[rank[node]].append(node)
+    order = [0] * len(rank)
+    for layer in layers:
+        for position, node in enumerate(layer):
+            order[node] = position
+    # crossings are only counted between neighbouring layers
+    next_layer = down if use_dummies else [[child for child in children if rank[child] == rank[node] + 1]
+                                           for node, children in enumerate(down)]
+
+    def crossings() -> int:
+        return sum(count_crossings(layers[i], next_layer, order) for i in range(len(layers) - 1))
+
+    def relative_position(node: int) -> float:
+        # comparable between layers of different widths, for morphisms without dummy nodes
+        return (order[node] + 0.5) / len(layers[rank[node]])
+
+    def sweep_key(node: int, neighbours: list[int]) -> float:
+        if not neighbours:
+            return relative_position(node)
+        positions = sorted(relative_position(neighbour) for neighbour in neighbours)
+        if heuristic == "barycentre":
+            return sum(positions) / len(positions)
+        middle = len(positions) // 2
+        if len(positions) % 2:
+            return positions[middle]
+        return (positions[middle - 1] + positions[middle]) / 2
+
+    best_layers = [layer.copy() for layer in layers]
+    best_crossings = crossings()
+    stalled = 0
+    for iteration in range(iterations):
+        if not best_crossings or stalled == 2:
+            break  # nothing left to improve, or a sweep down and a sweep up have both made no difference
+        if iteration % 2 == 0:
+            sweep = [(layers[i], up) for i in range(1, len(layers))]
+        else:
+            sweep = [(layers[i], down) for i in range(len(layers) - 2, -1, -1)]
+        for layer, neighbours in sweep:
+            # found before sorting, since the layer looks empty to the keys while it's being sorted
+            keys = {node: sweep_key(node, neighbours[node]) for node in layer}
+            layer.sort(key=keys.__getitem__)
+            for position, node in enumerate(layer):
+                order[node] = position
+        current = crossings()
+        if current < best_crossings:
+            best_crossings = current
+            best_layers = [layer.copy() for layer in layers]
+            stalled = 0
+        else:
+            stalled += 1
+
+    positions = [(0.0, 0.0)] * num_nodes
+    for depth, layer in enumerate(best_layers):
+        offset = (len(layer) - 1) / 2
+        for position, node in enumerate(layer):
+            if node < num_nodes:
+                positions[node] = (position - offset, float(-depth))
+    return positions
+
+
+def force_positions(graph: CompactGraph, seed: Optional[int] = 0, iterations: int = 50,
+                    threshold: float = 1e-4) -> list[tuple[float, float]]:
+    """
+    A Fruchterman-Reingold force-directed layout, like ``nx.spring_layout``, with every step vectorised with NumPy and
+    the repulsion between nodes approximated Barnes-Hut style, so an iteration takes O(n log n) time rather than
+    O(n^2).
+
+    The nodes are put in a quadtree, stored as a grid for each level. Two nodes in neighbouring cells of the finest
+    grid repel each other directly, and otherwise each cell is repelled by the centre of mass of the cells in its
+    interaction list at each level: the children of the neighbours of its parent which aren't its neighbours. Every
+    node is in exactly one of those cells for each other node, which is at least its own width away. Above the finest
+    grid the force on a cell is found at its centre of mass and shared by its nodes, which is within about 5% of the
+    exact repulsion.
+    :param graph: the diagram
+    :param seed: the seed for the random starting positions, so the same diagram is always laid out the same way
+    :param iterations: the largest number of iterations
+    :param threshold: stop once the nodes move less than this far on average in an iteration
+    :return: the position of each node
+    """
+    import numpy as np
+
+    num_nodes = graph.number_of_nodes()
+    if num_nodes < 2:
+        return [(0.0, 0.0)] * num_nodes
+    ends = np.array([(graph.edge_src[edge], graph.edge_dst[edge]) for edge in graph.edges()
+                     if graph.edge_src[edge] != graph.edge_dst[edge]], dtype=np.int64).reshape(-1, 2)
+    pos = np.random.default_rng(seed).random((num_nodes, 2))
+    k = 1 / np.sqrt(num_nodes)  # the ideal distance between nodes
+    temperature = 0.1  # the furthest a node can move in an iteration, cooling to 0
+    cooling = temperature / (iterations + 1)
+    # deep enough for about one node per cell of the finest grid
+    depth = max(2, int(np.ceil(np.log(num_nodes) / np.log(4))))
+    for _ in range(iterations):
+        displacement = _repulsion(pos, depth, k)
+        if len(ends):
+            delta = pos[ends[:, 0]] - pos[ends[:, 1]]
+            distance = np.maximum(np.hypot(delta[:, 0], delta[:, 1]), 0.01)
+            pull = delta * (distance / k)[:, None]
+            for axis in range(2):
+                displacement[:, axis] -= np.bincount(ends[:, 0], pull[:, axis], num_nodes)
+                displacement[:, axis] += np.bincount(ends[:, 1], pull[:, axis], num_nodes)
+        length = np.maximum(np.hypot(displacement[:, 0], displacement[:, 1]), 0.01)
+        step = displacement * (np.minimum(length, temperature) / length)[:, None]
+        pos += step
+        temperature -= cooling
+        if np.hypot(step[:, 0], step[:, 1]).sum() / num_nodes < threshold:
+            break
+    return [(float(x), float(y)) for x, y in pos]
+
+
+def _repulsion(pos, depth: int, k: float):
+    """
+    :return: the repulsive force on each node, as ``k^2 / distance`` away from each other node, approximated as
+    described in ``force_positions``
+    """
+    import numpy as np
+
+    num_nodes = len(pos)
+    force = np.zeros_like(pos)
+    low = pos.min(axis=0)
+    width = max(float((pos.max(axis=0) - low).max()), 1e-9) * (1 + 1e-9)
+    unit = (pos - low) / width  # in [0, 1)
+
+    def repel(source_pos, mass, target_pos):
+        delta = source_pos - target_pos
+        distance2 = np.maximum((delta ** 2).sum(axis=1), 1e-8)
+        return delta * (k * k * mass / distance2)[:, None]
+
+    def add_forces(sources, mass, target_pos):
+        push = repel(pos[sources], mass, target_pos)
+        for axis in range(2):
+            force[:, axis] += np.bincount(sources, push[:, axis], num_nodes)
+
+    nodes = np.arange(num_nodes)
+    for level in range(2, depth + 1):
+        size = 1 << level
+        cell = np.minimum((unit * size).astype(np.int64), size - 1)
+        cell_id = cell[:, 0] * size + cell[:, 1]
+        mass = np.bincount(cell_id, minlength=size * size).astype(float)
+        centre = np.stack([np.bincount(cell_id, pos[:, axis], size * size) for axis in range(2)], axis=1)
+        centre /= np.maximum(mass, 1)[:, None]
+        if level < depth:
+            # above the finest grid there are far fewer cells than nodes, so the force is found once for each cell, at
+            # its centre of mass, and shared by the nodes in it
+            occupied = np.flatnonzero(mass)
+            sources = occupied
+            source_cell = np.stack([occupied // size, occupied % size], axis=1)
+        else:
+            sources = nodes
+            source_cell = cell
+        # the 6x6 block of children of the parent cell and its neighbours, for every source at once
+        corner = (source_cell >> 1) * 2 - 2
+        x = np.repeat(corner[:, 0, None] + np.arange(6), 6, axis=1).ravel()
+        y = np.tile(corner[:, 1, None] + np.arange(6), 6).ravel()
+        index = np.repeat(np.arange(len(sources)), 36)
+        keep = ((x >= 0) & (x < size) & (y >= 0) & (y < size)
+                & ((np.abs(x - source_cell[index, 0]) > 1) | (np.abs(y - source_cell[index, 1]) > 1)))
+        target = x[keep] * size + y[keep]
+        index = index[keep]
+        occupied_target = mass[target] > 0
+        target = target[occupied_target]
+        index = index[occupied_target]
+        source_pos = centre[sources] if level < depth else pos
+        push = repel(source_pos[index], mass[target], centre[target])
+        cell_force = np.stack([np.bincount(index, push[:, axis], len(sources)) for axis in range(2)], axis=1)
+        if level < depth:
+            lookup = np.zeros(size * size, dtype=np.int64)
+            lookup[sources] = np.arange(len(sources))
+            force += cell_force[lookup[cell_id]]
+        else:
+            force += cell_force
+
+    # nodes in neighbouring cells of the finest grid repel each other directly
+    size = 1 << depth
+    cell = np.minimum((unit * size).astype(np.int64), size - 1)
+    cell_id = cell[:, 0] * size + cell[:, 1]
+    by_cell = np.argsort(cell_id, kind="stable")
+    counts = np.bincount(cell_id, minlength=size * size)
+    starts = np.cumsum(counts) - counts
+    x = np.repeat(cell[:, 0, None] + np.arange(-1, 2), 3, axis=1).ravel()
+    y = np.tile(cell[:, 1, None] + np.arange(-1, 2), 3).ravel()
+    sources = np.repeat(nodes, 9)
+    keep = (x >= 0) & (x < size) & (y >= 0) & (y < size)
+    sources = sources[keep]
+    target = x[keep] * size + y[keep]
+    count = counts[target]
+    # every pair of a source and a node in its target cell
+    pair_sources = np.repeat(sources, count)
+    offsets = np.arange(count.sum()) - np.repeat(np.cumsum(count) - count, count)
+    pair_targets = by_cell[np.repeat(starts[target], count) + offsets]
+    different = pair_sources != pair_targets
+    add_forces(pair_sources[different], 1.0, pos[pair_targets[different]])
+    return force
+
+
+def grid_cells(positions: list[tuple[float, float]]) -> list[tuple[int, int]]:
+    """
+    Snaps positions to the cells of a matrix, keeping nodes that are left of or above each other in that order, for
+    drawing a diagram as a ``tikzcd`` matrix.
+
+    If the positions only take a few distinct values along each axis, as with ``"grid"`` and ``"layered"`` layouts,
+    each distinct value gets its own column or row. Otherwise they are rounded to a grid of about four cells per node,
+    and a node rounded into an occupied cell is moved right along its row, so the matrix stays about as large as the
+    diagram.
+    :return: ``(row, column)`` for each position, with row 0 at the top
+    """
+    num_nodes = len(positions)
+    if not num_nodes:
+        return []
+    # rounded so coordinates that are equal up to floating point error share a row or column
+    xs = [round(x, 9) for x, _ in positions]
+    ys = [round(y, 9) for _, y in positions]
+    distinct_xs = sorted(set(xs))
+    distinct_ys = sorted(set(ys), reverse=True)
+    if len(distinct_xs) * len(distinct_ys) <= 4 * num_nodes + 16:
+        column_of = {x: column for column, x in enumerate(distinct_xs)}
+        row_of = {y: row for row, y in enumerate(distinct_ys)}
+        columns = [column_of[x] for x in xs]
+        rows = [row_of[y] for y in ys]
+    else:
+        width = distinct_xs[-1] - distinct_xs[0]
+        height = distinct_ys[0] - distinct_ys[-1]
+        cells = 4 * num_nodes
+        if not height:
+            num_columns, num_rows = cells, 1
+        elif not width:
+            num_columns, num_rows = 1, cells
+        else:
+            num_columns = max(1, round((cells * width / height) ** 0.5))
+            num_rows = max(1, cells // num_columns)
+        columns = [min(int((x - distinct_xs[0]) / width * num_columns), num_columns - 1) if width else 0 for x in xs]
+        rows = [min(int((distinct_ys[0] - y) / height * num_rows), num_rows - 1) if height else 0 for y in ys]
+    last_row = -1
+    last_column = -1
+    for node in sorted(range(num_nodes), key=lambda node: (rows[node], columns[node], xs[node])):
+        if rows[node] == last_row and columns[node] <= last_column:
+            columns[node] = last_column + 1
+        last_row = rows[node]
+        last_column = columns[node]
+    return list(zip(rows, columns))
@@ -1,17 +1,17 @@
 import os
-from typing import Any
-
-import networkx as nx
+from array import array
+from typing import Any, Iterable, Optional
 
+from src.compact_graph import CompactGraph
 from src.converter import Converter
+from src.stats import Stats, stage
+from src.tokenizer import scan, scan_line, scan_lines, split_chains
 
 
 class MorphismParser(Converter):
     morphs: dict[str, tuple[Any, Any]]
-    morphs_by_domain: dict[int, list[str]]
-    morphs_by_codomain: dict[int, list[str]]
 
-    def __init__(self, filepath: str):
+    def __init__(self, filepath: Optional[str] = None, stats: Optional[Stats] = None, workers: Optional[int] = None):
         """
         Parses a file containing a representation of a list of morphisms.
 
@@ -20,131 +20,344 @@ class MorphismParser(Converter):
             {function 1}{function 2}{function 3} = {function 4}{function 5}
 
 
-        :param filepath: the path to the file containing the representation
+        :param filepath: the path to the file containing the representation. If ``None`` the parser starts with no
+        morphisms, and lines can be added with ``parse_line``.
+        :param stats: records the time taken to parse the file and by later conversions, see ``Converter.stats``
+        :param workers: the number of processes to parse the file in, see ``__parse_chunks``, or ``None`` to parse it
+        all in this one
         """
+        if workers is not None and workers < 1:
+            raise ValueError(f"workers must be at least 1, got {workers}")
         super().__init__()
-        if not os.path.isfile(filepath):
-            raise FileNotFoundError("No such file: " + filepath)
+        if stats is not None:
+            self.stats = stats
         self.counter = 0
         self.morphs: dict[str, tuple[int, int]] = {}
-        self.morphs_by_domain: dict[str, list[str]] = {}
-        self.morphs_by_codomain: dict[str, list[str]] = {}
+        # objects are merged with a union-find while parsing, and the graph is only built once all merges are known.
+        # an object missing from obj_parent is its own representative, and one missing from obj_size has size 1
+        self.obj_parent: dict[int, int] = {}
+        self.obj_size: dict[int, int] = {}
+        # the chains of morphisms on each side of every line with an "=", as written, for src.congruence
+        self.equations: list[list[list[str]]] = []
+        # set when morphisms or merges have been parsed since the graph was last built
+        self._needs_build = False
+        if filepath is None:
+            return
+        if not os.path.isfile(filepath):
+            raise FileNotFoundError("No such file: " + filepath)
+        if workers is not None and workers > 1:
+            self.__parse_chunks(filepath, workers)
+            return
         with open(filepath, 'r') as file:
-            for line in file:
-                self.parse_line(line)
+            text = file.read()
+        if self.stats is None:
+            for tokens in scan(text):
+                self.parse_tokens(tokens)
+            self.build_graph()
+            return
+        # the lines are only tokenized up front when the stages are timed separately
+        with self.stats.stage("tokenize"):
+            token_lines = list(scan(text))
+        with self.stats.stage("build graph"):
+            for tokens in token_lines:
+                self.parse_tokens(tokens)
+            self.build_graph()
+        # every contraction adds exactly one object to obj_parent
+        self.stats.count("contractions", len(self.obj_parent))
 
-    def add_edge(self, morph, domain, codomain):
-        # dealing with graph
-        self.graph.add_edge(domain, codomain, label=morph)
-        self.graph.nodes[domain]['label'] = "$\\bullet$"
-        self.graph.nodes[codomain]['label'] = "$\\bullet$"
+    def __parse_chunks(self, filepath: str, workers: int):
+        """
+        Splits the file into a chunk of whole lines for each worker and parses each of them in its own process, into
+        its own morphisms and union-find of objects, numbered from 0. The chunks are then merged in order, each as it
+        is parsed, with ``__merge_chunk``, leaving the same morphisms, equations, merged objects and graph as parsing the
+        whole file in one go.
+        """
+        from concurrent.futures import ProcessPoolExecutor
+        size = os.path.getsize(filepath)
+        bounds = [0]
+        with open(filepath, "rb") as file:
+            for chunk in range(1, workers):
+                # each chunk ends at the end of the line containing its last byte
+                file.seek(max(size * chunk // workers - 1, bounds[-1]))
+                file.readline()
+                if bounds[-1] < file.tell() < size:
+                    bounds.append(file.tell())
+        bounds.append(size)
+        num_chunks = len(bounds) - 1
+        # each chunk is merged while the later ones are still being parsed
+        with stage(self.stats, "parse chunks"):
+            with ProcessPoolExecutor(min(workers, num_chunks)) as pool:
+                for chunk in pool.map(_parse_chunk, [filepath] * num_chunks, bounds[:-1], bounds[1:]):
+                    self.__merge_chunk(*chunk)
+        with stage(self.stats, "build graph"):
+            self.build_graph()
+        if self.stats is not None:
+            self.stats.count("contractions", len(self.obj_parent))
 
-        # dealing with dicts
-        # if morph in self.morphs it's in the relevant dicts, so don't bother adding it
-        if morph not in self.morphs:
-            # checking if I need to initialise the list of morphs or just add to it
-            if domain in self.morphs_by_domain:
-                self.morphs_by_domain[domain].append(morph)
-            else:
-                self.morphs_by_domain[domain] = [morph]
-            if codomain in self.morphs_by_codomain:
-                self.morphs_by_codomain[codomain].append(morph)
+    def __merge_chunk(self, counter: int, morphs: dict[str, tuple[int, int]], merges: array,
+                      equations: list[list[list[str]]]):
+        """
+        Adds the morphisms, merged objects and equations of a chunk parsed on its own after everything parsed so far,
+        as if its lines had been parsed here.
+
+        Parsing the chunk after the lines before it would number its objects from ``self.counter``, except that a
+        morphism already parsed wouldn't be given a new domain. Its domain in the chunk is the morphism's domain here,
+        and the objects after it are moved down by one, so every object has the number it would have had. Where the
+        chunk gave the morphism its codomain, it's merged with the morphism's codomain here instead, as
+        ``process_morph`` would have done.
+
+        The chunk's merges are then made again in the same order, along with those, so the object kept for each set of
+        merged objects is the same as in a sequential parse too. Two objects already merged in the chunk are always
+        already merged here, so only the merges that changed something in the chunk are needed.
+        :param merges: as recorded by ``_ChunkParser``
+        """
+        known = self.morphs
+        base = self.counter
+        shared = {domain: morph for morph, (domain, _) in morphs.items() if morph in known}
+        # the number of each object of the chunk here
+        new_id: list[Any] = []
+        start = 0
+        for shift, obj in enumerate(sorted(shared)):
+            new_id.extend(range(base + start - shift, base + obj - shift))
+            new_id.append(known[shared[obj]][0])
+            start = obj + 1
+        new_id.extend(range(base + start - len(shared), base + counter - len(shared)))
+
+        contract_objects = self.contract_objects
+        new_morphs = iter(morphs.items())
+        pending = iter(merges)
+        for obj in pending:
+            if obj >= 0:
+                contract_objects(new_id[obj], new_id[next(pending)])
+                continue
+            morph, (domain, codomain) = next(new_morphs)
+            if domain in shared:
+                contract_objects(known[morph][1], new_id[codomain])
             else:
-                self.morphs_by_codomain[codomain] = [morph]
+                known[morph] = (new_id[domain], new_id[codomain])
+        self.equations.extend(equations)
+        self.counter = base + counter - len(shared)
+        self._needs_build = True
+
+    @classmethod
+    def from_stream(cls, stream: Iterable[str]) -> "MorphismParser":
+        """
+        Parses a list of morphisms from any stream of lines, e.g. an open file, ``sys.stdin`` or a list of strings.
+        :param stream: an iterable of lines in the representation described in ``__init__``
+        :return: a parser containing the parsed diagram
+        """
+        parser = cls()
+        for tokens in scan_lines(stream):
+            parser.parse_tokens(tokens)
+        parser.build_graph()
+        return parser
+
+    def add_edge(self, morph, domain, codomain):
+        """
+        Records that ``morph`` goes from ``domain`` to ``codomain``, if it hasn't been seen before. The graph is
+        rebuilt the next time it's used.
+        """
+        if morph not in self.morphs:
             self.morphs[morph] = (domain, codomain)
+            self._needs_build = True
+
+    def add_morphism(self, morph, domain, codomain):
+        """
+        Adds ``morph: domain -> codomain`` to the parsed morphisms and updates ``morphism_equations``, as in
+        ``Converter.add_morphism``. ``domain`` and ``codomain`` can be objects of the graph, or any objects that have
+        been merged into them, or new objects.
 
-    def contract_objects(self, old_obj, new_obj):
+        The graph can only hold one morphism between two objects, so unlike ``Converter.add_morphism`` this won't
+        replace a morphism that's already there.
+        """
+        if morph in self.morphs:
+            raise Exception(f"The morphism {morph} has already been parsed")
+        self._update()
+        domain = self.find_object(domain)
+        codomain = self.find_object(codomain)
+        if self.compact_graph().has_edge(domain, codomain):
+            raise Exception(f"There is already a morphism from {domain} to {codomain}")
+        super().add_morphism(morph, domain, codomain)
+        # added after the graph is updated, so it isn't rebuilt
+        self.morphs[morph] = (domain, codomain)
+        for obj in (domain, codomain):
+            # so objects made by later lines don't reuse the new objects
+            if isinstance(obj, int) and obj >= self.counter:
+                self.counter = obj + 1
+
+    def remove_morphism(self, domain, codomain):
+        """
+        Removes the morphism going from ``domain`` to ``codomain``, along with every parsed morphism that was merged
+        onto it, and updates ``morphism_equations``.
+        """
+        self._update()
+        domain = self.find_object(domain)
+        codomain = self.find_object(codomain)
+        super().remove_morphism(domain, codomain)
+        for morph in [morph for morph, objs in self.morphs.items() if objs == (domain, codomain)]:
+            del self.morphs[morph]
+
+    def _object_label(self, obj) -> str:
+        return "$\\bullet$"
+
+    def find_object(self, obj) -> Any:
+        """
+        Finds the object that ``obj`` has been merged into.
+        :param obj: an object that may have been merged with others
+        :return: the representative of every object merged with ``obj``
         """
-        Takes every morphism going into/out of ``obj``, and makes the morphism go into/out of ``new_obj``, then
-        deletes ``obj``.
+        parent = self.obj_parent
+        while obj in parent:
+            grandparent = parent.get(parent[obj])
+            if grandparent is None:
+                return parent[obj]
+            # path halving, so later finds are shorter
+            parent[obj] = grandparent
+            obj = grandparent
+        return obj
+
+    def contract_objects(self, old_obj, new_obj) -> Any:
+        """
+        Merges ``old_obj`` and ``new_obj`` into a single object, so every morphism going into/out of either goes
+        into/out of the merged object. The smaller of the two merges into the larger, with ``new_obj`` kept if they
+        are the same size.
         :param old_obj:
         :param new_obj:
+        :return: the representative of the merged object
+        """
+        old_root = self.find_object(old_obj)
+        new_root = self.find_object(new_obj)
+        if old_root == new_root:
+            return new_root
+        old_size = self.obj_size.get(old_root, 1)
+        new_size = self.obj_size.get(new_root, 1)
+        if old_size > new_size:
+            old_root, new_root = new_root, old_root
+        self.obj_parent[old_root] = new_root
+        self.obj_size[new_root] = old_size + new_size
+        self.obj_size.pop(old_root, None)
+        self._needs_build = True
+        return new_root
+
+    def build_graph(self):
         """
-        # ensure we have a spot for the new_obj in lists
-        if new_obj not in self.morphs_by_domain:
-            self.morphs_by_domain[new_obj] = []
-        if new_obj not in self.morphs_by_codomain:
-            self.morphs_by_codomain[new_obj] = []
-
-        # contract objects
-        nx.contracted_nodes(self.graph, new_obj, old_obj, copy=False)
-        self.graph.nodes[new_obj]['label'] = "$\\bullet$"
-        if old_obj in self.morphs_by_domain.keys():
-            for adjusted_morph in self.morphs_by_domain.pop(old_obj):
-                self.morphs_by_domain[new_obj].append(adjusted_morph)
-                prev_codomain = self.morphs[adjusted_morph][1]
-                self.morphs[adjusted_morph] = (new_obj, prev_codomain)
-        if old_obj in self.morphs_by_codomain.keys():
-            for adjusted_morph in self.morphs_by_codomain.pop(old_obj):
-                self.morphs_by_codomain[new_obj].append(adjusted_morph)
-                prev_domain = self.morphs[adjusted_morph][0]
-                self.morphs[adjusted_morph] = (prev_domain, new_obj)
+        Builds the graph from the parsed morphisms, with each merged object as a single node. The objects in
+        ``self.morphs`` are also updated to their representatives. This is done automatically the first time the graph
+        is used after parsing.
+
+        The graph can only hold one morphism between two objects, so when several are merged onto the same pair of
+        objects the one parsed first labels the edge.
+        """
+        graph = CompactGraph()
+        for morph, (domain, codomain) in self.morphs.items():
+            domain = self.find_object(domain)
+            codomain = self.find_object(codomain)
+            self.morphs[morph] = (domain, codomain)
+            if not graph.has_edge(domain, codomain):
+                graph.add_edge(domain, codomain, morph)
+        graph.node_labels = ["$\\bullet$"] * graph.number_of_nodes()
+        self.core = graph
+        self._needs_build = False
+
+    def _update(self):
+        if self._needs_build:
+            self.build_graph()
 
     def parse_line(self, line: str):
-        i = 0
+        """
+        Parses a line of the form::
+
+            {function 1}{function 2}{function 3} = {function 4}{function 5}
+
+        The graph is rebuilt once, the next time it's used, rather than after every line.
+        :param line: the line to be parsed
+        """
+        self.parse_tokens(scan_line(line))
+
+    def parse_tokens(self, tokens: list[str]):
+        """
+        Parses the tokens of a single line, see ``src.tokenizer.scan_line``. The graph is rebuilt the next time it's
+        used.
+        :param tokens: the tokens of the line to be parsed
+        """
         domain = self.counter
         codomain = self.counter + 1
         self.counter += 2
-        while i < len(line):
-            char = line[i]
-            if char == "%":
-                break
-            if char == "{":
-                i, domain, codomain = self.parse_composed_morph(line, i, domain, codomain)
-            else:
-                i += 1
+        chains = split_chains(tokens)
+        if len(chains) > 1:
+            self.equations.append(chains)
+        for chain in chains:
+            domain, codomain = self.parse_composed_morph(chain, domain, codomain)
 
-    def parse_composed_morph(self, line: str, start_pos: int, domain: int, codomain: int):
-        i = start_pos
+    def parse_composed_morph(self, chain: list[str], domain: int, codomain: int):
+        """
+        Adds the morphisms in a composed morphism, with the composition going from ``domain`` to ``codomain``.
+        :param chain: the labels of the morphisms being composed, in the order they are written
+        :param domain: the object the composed morphism should start at
+        :param codomain: the object the composed morphism should end at
+        :return: ``(domain, codomain)``, updated if either has been merged into a different object
+        """
         prev_domain = codomain
-        prev_morph = ""
-        is_initial = True
-        # if we encounter the end of the line or an = we know chain has ended
-        while i < len(line) and line[i] != "=" and line[i] != "%":
-            if line[i] == "{":
-                prev_domain, i, prev_morph, assigned_codomain = self.process_morph(i, line, prev_domain)
-                # updating codomain if it's been contracted into a different vertex
-                if is_initial and assigned_codomain != codomain:
-                    codomain = assigned_codomain
-                is_initial = False
-            else:
-                i += 1
-        if prev_morph in self.morphs:
-            old_domain = self.morphs[prev_morph][0]
-            if old_domain != domain:
-                # finding the vertex with the least amount of edges to contract
-                old_domain_degree = self.graph.in_degree[old_domain] + self.graph.out_degree[old_domain]
-                if domain in self.graph.nodes:
-                    domain_degree = self.graph.in_degree[domain] + self.graph.out_degree[domain]
-                    if old_domain_degree <= domain_degree:
-                        self.contract_objects(old_domain, domain)
-                    else:
-                        self.contract_objects(domain, old_domain)
-                        domain = old_domain
-                # if domain isn't already a vertex, we just need to override it with the existing vertex
-                else:
-                    domain = old_domain
-        return i, domain, codomain
-
-    def process_morph(self, pos, line, prev_domain):
-        morph, pos = self.extract_label(line, pos + 1)
+        for morph in chain:
+            prev_domain = self.process_morph(morph, prev_domain)
+        # the domain of the last morphism applied is the domain of the whole composition
+        domain = self.contract_objects(prev_domain, domain)
+        return domain, self.find_object(codomain)
+
+    def process_morph(self, morph: str, prev_domain) -> Any:
+        """
+        Adds ``morph`` with ``prev_domain`` as its codomain, merging objects if ``morph`` already has a codomain.
+        :param morph: the label of the morphism
+        :param prev_domain: the domain of the morphism applied after ``morph``
+        :return: the domain of ``morph``
+        """
         if morph in self.morphs:
             curr_domain, morph_codomain = self.morphs[morph]
-            # if the domains already match we don't have a problem, if they don't we need to merge the nodes
-            if morph_codomain != prev_domain:
-                degree_morph_codomain = self.graph.in_degree[morph_codomain] + self.graph.out_degree[morph_codomain]
-                if prev_domain in self.graph.nodes:
-                    degree_prev_domain = self.graph.in_degree[prev_domain] + self.graph.out_degree[prev_domain]
-                    if degree_prev_domain < degree_morph_codomain:
-                        self.contract_objects(prev_domain, morph_codomain)
-                        prev_domain = morph_codomain
-                    else:
-                        self.contract_objects(morph_codomain, prev_domain)
-                else:
-                    prev_domain = morph_codomain
-        else:
-            # if we haven't seen the morphism before we need to assign it a codomain
-            curr_domain = self.counter
-            self.counter += 1
+            self.contract_objects(morph_codomain, prev_domain)
+            return curr_domain
+        # if we haven't seen the morphism before we need to assign it a domain
+        curr_domain = self.counter
+        self.counter += 1
         self.add_edge(morph, curr_domain, prev_domain)
-        return curr_domain, pos, morph, prev_domain
+        return curr_domain
+
+
+class _ChunkParser(MorphismParser):
+    """
+    Parses a chunk of a file in a worker process, see ``MorphismParser.__merge_chunk``, recording in ``merges`` the
+    arguments of every call to ``contract_objects`` that merged two objects, and ``-1`` whenever a morphism is added.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.merges = array("q")
+
+    def add_edge(self, morph, domain, codomain):
+        super().add_edge(morph, domain, codomain)
+        self.merges.append(-1)
+
+    def contract_objects(self, old_obj, new_obj) -> Any:
+        num_merged = len(self.obj_parent)
+        root = super().contract_objects(old_obj, new_obj)
+        if len(self.obj_parent) != num_merged:
+            self.merges.extend((old_obj, new_obj))
+        return root
+
+
+def _parse_chunk(filepath: str, start: int, end: int) -> tuple[int, dict[str, tuple[int, int]], array,
+                                                                list[list[list[str]]]]:
+    """
+    Parses the lines between bytes ``start`` and ``end`` of a file on their own, run in a worker process by
+    ``MorphismParser``.
+    :return: the number of objects made, the morphisms, the merges made, see ``_ChunkParser``, and the equations
+    """
+    with open(filepath, "rb") as file:
+        file.seek(start)
+        text = file.read(end - start).decode()
+    if "\r" in text:
+        # as reading the file in text mode would
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    parser = _ChunkParser()
+    for tokens in scan(text):
+        parser.parse_tokens(tokens)
+    return parser.counter, parser.morphs, parser.merges, parser.equations
@@ -0,0 +1,63 @@
+from array import array
+
+
+class PathTrie:
+    """
+    Stores many paths that share prefixes, as used by ``Converter.to_morphism_representation``, without copying the
+    shared parts.
+
+    Every entry of the trie is a node of some graph, with a pointer to the entry before it. A path is stored as a span,
+    the entry it ends at and its number of nodes, so a path and any suffix of it share the same entries, and a path
+    extending another only needs entries for the new nodes. A span can also continue with another span, so joining two
+    stored paths doesn't copy either of them. Everything is kept in flat ``array`` buffers, and paths are only turned
+    back into lists of nodes by ``path``.
+    """
+
+    def __init__(self):
+        self.parent = array("l")  # entry -> the entry before it, or -1
+        self.node = array("l")  # entry -> graph node
+        self.span_end = array("l")  # span -> the entry the path ends at
+        self.span_length = array("l")  # span -> number of nodes in the path, not counting the spans after it
+        self.span_next = array("l")  # span -> the span continuing the path, or -1
+
+    def __len__(self) -> int:
+        return len(self.node)
+
+    def add(self, parent: int, node: int) -> int:
+        """
+        :param parent: the entry before the new one, or -1 to start a new path
+        :param node: the graph node of the new entry
+        :return: the new entry
+        """
+        self.parent.append(parent)
+        self.node.append(node)
+        return len(self.node) - 1
+
+    def add_span(self, end: int, length: int, next_span: int = -1) -> int:
+        """
+        :param end: the entry the path ends at
+        :param length: the number of nodes in the path before ``next_span``
+        :param next_span: a path which continues this one, or -1
+        :return: an id for the path
+        """
+        self.span_end.append(end)
+        self.span_length.append(length)
+        self.span_next.append(next_span)
+        return len(self.span_end) - 1
+
+    def path(self, span: int) -> list[int]:
+        """
+        :return: the nodes of the path with id ``span``, from first to last
+        """
+        parent = self.parent
+        node = self.node
+        nodes = []
+        while span != -1:
+            entry = self.span_end[span]
+            segment = [0] * self.span_length[span]
+            for i in range(len(segment) - 1, -1, -1):
+                segment[i] = node[entry]
+                entry = parent[entry]
+            nodes.extend(segment)
+            span = self.span_next[span]
+        return nodes
@@ -0,0 +1,238 @@
+"""
+Serves conversions over HTTP from a long-running process, so callers don't pay for starting Python, importing and
+laying out again for every diagram.
+
+From the ``code`` directory::
+
+    python -m src.server --port 8765 --workers 4
+    python -m src.server --socket /tmp/commutative-diagrams.sock
+
+Then ``POST /convert`` a JSON object like ``{"text": "...", "from": "diagram", "to": "tikz"}``, with ``from`` and
+``to`` as in ``src.batch``. The response is ``{"output": "..."}``, or ``{"error": "..."}`` with status 400 if the text
+couldn't be converted. ``GET /stats`` returns the number of cache hits and misses.
+"""
+import argparse
+import hashlib
+import json
+import os
+import socketserver
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, HTTPServer, ThreadingHTTPServer
+from typing import Optional
+
+from src.batch import OUTPUTS, PARSERS, positive_int, use_layout_cache
+from src.cache import LRUCache
+
+# the largest request body accepted, in bytes
+MAX_REQUEST_BYTES = 64 * 1024 * 1024
+
+
+def convert_text(text: str, input_format: str, output_format: str) -> str:
+    """
+    Parses a diagram from ``text`` and converts it, as ``src.batch.convert_file`` does for a file.
+    :param input_format: ``"diagram"`` or ``"morphism"``, the representation used in ``text``
+    :param output_format: ``"tikz"``, ``"tikzcd"``, ``"diagram"`` or ``"morphism"``
+    """
+    parser = PARSERS[input_format].from_stream(text.splitlines())
+    return OUTPUTS[output_format](parser)
+
+
+def _warm_up(layout_cache: Optional[str]):
+    """
+    Runs in each worker as it starts, importing and running everything a conversion needs, so the first request it
+    handles is as fast as the rest.
+    """
+    if layout_cache is not None:
+        use_layout_cache(layout_cache)
+    convert_text("{f}{A}{B}\n{g}{B}{C}", "diagram", "tikz")
+
+
+class ConversionService:
+    """
+    Converts diagrams in a pool of worker processes started up front, remembering the most recent results by a hash of
+    their input, so converting the same text again doesn't need a worker at all. Safe to use from several threads.
+    """
+
+    def __init__(self, workers: Optional[int] = None, cache_size: int = 1024, layout_cache: Optional[str] = None):
+        """
+        :param workers: the number of processes to use, defaults to the number of CPUs
+        :param cache_size: the most results to keep
+        :param layout_cache: a directory for the workers to keep layouts in between runs, see
+        ``src.cache.LayoutCache``
+        """
+        if workers is not None and workers < 1:
+            raise ValueError(f"workers must be at least 1, got {workers}")
+        self.workers = workers or os.cpu_count() or 1
+        self.layout_cache = layout_cache
+        self.cache = LRUCache(cache_size)
+        self.__lock = threading.Lock()
+        self.__pool = self.__start_pool()
+
+    def __start_pool(self) -> ProcessPoolExecutor:
+        pool = ProcessPoolExecutor(self.workers, initializer=_warm_up, initargs=(self.layout_cache,))
+        # processes are only started as work is submitted, so give each of them something to do now
+        for future in [pool.submit(os.getpid) for _ in range(self.workers)]:
+            future.result()
+        return pool
+
+    @staticmethod
+    def key(text: str, input_format: str, output_format: str) -> str:
+        """
+        :return: the key a conversion's result is cached under
+        """
+        return hashlib.sha256(f"{input_format}\0{output_format}\0{text}".encode()).hexdigest()
+
+    def convert(self, text: str, input_format: str, output_format: str) -> str:
+        """
+        :param text: the diagram to convert
+        :param input_format: ``"diagram"`` or ``"morphism"``, the representation used in ``text``
+        :param output_format: ``"tikz"``, ``"tikzcd"``, ``"diagram"`` or ``"morphism"``
+        :return: the converted diagram. Anything raised while converting it is raised here
+        """
+        if input_format not in PARSERS:
+            raise ValueError(f"Unknown input format: {input_format}")
+        if output_format not in OUTPUTS:
+            raise ValueError(f"Unknown output format: {output_format}")
+        key = self.key(text, input_format, output_format)
+        with self.__lock:
+            output = self.cache.get(key)
+            pool = self.__pool
+        if output is not None:
+            return output
+        try:
+            output = pool.submit(convert_text, text, input_format, output_format).result()
+        except BrokenProcessPool:
+            # a worker died, e.g. running out of memory on this diagram. The pool can't be used again, so the next
+            # request gets a new one
+            with self.__lock:
+                if self.__pool is pool:
+                    self.__pool = self.__start_pool()
+            pool.shutdown(wait=False)
+            raise
+        with self.__lock:
+            self.cache.put(key, output)
+        return output
+
+    def stats(self) -> dict[str, int]:
+        """
+        :return: the number of cache hits and misses, and of results cached
+        """
+        with self.__lock:
+            return {"hits": self.cache.hits, "misses": self.cache.misses, "entries": len(self.cache)}
+
+    def close(self):
+        self.__pool.shutdown()
+
+
+class ConversionHandler(BaseHTTPRequestHandler):
+    """
+    Handles the requests described at the top of ``src.server`` with the server's ``service``.
+    """
+
+    def do_GET(self):
+        if self.path == "/stats":
+            self.__respond(200, self.server.service.stats())
+        else:
+            self.__respond(404, {"error": f"Not found: {self.path}"})
+
+    def do_POST(self):
+        if self.path != "/convert":
+            self.__respond(404, {"error": f"Not found: {self.path}"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            if length > MAX_REQUEST_BYTES:
+                raise ValueError(f"The request is larger than {MAX_REQUEST_BYTES} bytes")
+            request = json.loads(self.rfile.read(length))
+            text = request["text"]
+            if not isinstance(text, str):
+                raise ValueError("text must be a string")
+            output = self.server.service.convert(text, request.get("from", "diagram"), request.get("to", "tikz"))
+        except Exception as e:
+            self.__respond(400, {"error": f"{type(e).__name__}: {e}"})
+            return
+        self.__respond(200, {"output": output})
+
+    def __respond(self, status: int, body: dict):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def address_string(self) -> str:
+        # a client on a Unix socket has no address
+        return self.client_address[0] if self.client_address else "unix socket"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer, HTTPServer):
+    daemon_threads = True
+
+    def server_bind(self):
+        # HTTPServer.server_bind expects a host and port
+        socketserver.UnixStreamServer.server_bind(self)
+        self.server_name = "localhost"
+        self.server_port = 0
+
+
+def make_server(service: ConversionService, host: str = "127.0.0.1", port: int = 8765,
+                socket_path: Optional[str] = None, verbose: bool = False) -> HTTPServer:
+    """
+    :param service: does the conversions
+    :param host: the address to listen on
+    :param port: the port to listen on, or 0 for any free port, which is then in ``server_address``
+    :param socket_path: a Unix socket to listen on instead of ``host`` and ``port``, replacing any file already there
+    :param verbose: whether to log every request to stderr
+    :return: a server that handles each request in its own thread, which starts with ``serve_forever()``
+    """
+    if socket_path is not None:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = UnixHTTPServer(socket_path, ConversionHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), ConversionHandler)
+    server.service = service
+    server.verbose = verbose
+    return server
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    arg_parser = argparse.ArgumentParser(prog="python -m src.server", description=__doc__.splitlines()[1])
+    arg_parser.add_argument("--host", default="127.0.0.1", help="the address to listen on")
+    arg_parser.add_argument("--port", type=int, default=8765, help="the port to listen on")
+    arg_parser.add_argument("--socket", default=None, metavar="PATH",
+                            help="listen on this Unix socket instead of a port")
+    arg_parser.add_argument("-j", "--workers", type=positive_int, default=None,
+                            help="number of worker processes, defaults to the number of CPUs")
+    arg_parser.add_argument("--cache-size", type=positive_int, default=1024,
+                            help="the most conversions to remember")
+    arg_parser.add_argument("--layout-cache", default=None, metavar="DIR",
+                            help="keep layouts in this directory, so unchanged diagrams aren't laid out again")
+    arg_parser.add_argument("-v", "--verbose", action="store_true", help="log every request")
+    args = arg_parser.parse_args(argv)
+
+    service = ConversionService(args.workers, args.cache_size, args.layout_cache)
+    server = make_server(service, args.host, args.port, args.socket, args.verbose)
+    print(f"Listening on {args.socket or '%s:%d' % server.server_address[:2]}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+        if args.socket is not None and os.path.exists(args.socket):
+            os.remove(args.socket)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,209 @@
+import hashlib
+import os
+import struct
+import sys
+from array import array
+from typing import Optional, Type, TypeVar, Union
+
+from src.compact_graph import CompactGraph
+from src.converter import Converter
+from src.diagram_parser import DiagramParser
+from src.morphism_parser import MorphismParser
+from src.symbols import SymbolTable
+
+Parser = TypeVar("Parser", DiagramParser, MorphismParser)
+
+MAGIC = b"CDSNAP\x00\x02"
+# magic, sha256 of the source, kind, flags, MorphismParser.counter, then the number of strings, bytes of strings,
+# nodes, edges, morphisms, merged objects, object sizes and ints in the equations section
+HEADER = struct.Struct("<8s32sBBqqqqqqqqq")
+KINDS = {DiagramParser: 0, MorphismParser: 1}
+# ids are written as 8 byte ints, and read into the same type of array as CompactGraph uses where that's the same size
+ID = "l" if array("l").itemsize == 8 else "q"
+INT_NODES = 1  # the nodes are ints rather than strings
+HAS_LAYOUT = 2  # the positions from position_nodes() follow everything else
+# the layout stored in a snapshot is position_nodes() with its defaults, and this is its layout, scale and options as
+# they appear in its key in the layout cache
+LAYOUT_PARAMS = ("auto", 4, [])
+
+
+def source_hash(text: Union[str, bytes]) -> bytes:
+    """
+    :return: the hash of the source of a diagram, which a snapshot of it is only valid for
+    """
+    if isinstance(text, str):
+        text = text.encode()
+    return hashlib.sha256(text).digest()
+
+
+def save_snapshot(parser: Converter, path: str, digest: bytes, layout: bool = False):
+    """
+    Writes the parsed diagram in ``parser`` to ``path`` as a snapshot, which ``load`` can read back much faster than
+    the source can be parsed. Every label is written once, and everything else as arrays of ints indexing them.
+    :param parser: a ``DiagramParser`` or ``MorphismParser``
+    :param digest: the ``source_hash`` of the text ``parser`` was parsed from
+    :param layout: whether to also store the layout found by ``parser.position_nodes()``
+    """
+    kind = KINDS[type(parser)]
+    core = parser.compact_graph()
+    strings = SymbolTable()
+
+    def symbol(label) -> int:
+        if label is None:
+            return -1
+        if not isinstance(label, str) or "\0" in label:
+            raise ValueError(f"Can't write {label!r} to a snapshot")
+        return strings.symbol(label)
+
+    flags = 0
+    if all(type(node) is int for node in core.nodes):
+        flags |= INT_NODES
+        nodes = array(ID, core.nodes)
+    else:
+        nodes = array(ID, map(symbol, core.nodes))
+    node_labels = array(ID, map(symbol, core.node_labels))
+    # removed edges are left out, so the ids of the loaded edges may differ but their order doesn't
+    live = [edge for edge in range(len(core.edge_src)) if core.edge_src[edge] >= 0]
+    edge_src = array(ID, (core.edge_src[edge] for edge in live))
+    edge_dst = array(ID, (core.edge_dst[edge] for edge in live))
+    edge_labels = array(ID, (symbol(core.edge_labels[edge]) for edge in live))
+
+    sections = [nodes, node_labels, edge_src, edge_dst, edge_labels]
+    counter = 0
+    num_morphs = num_merged = num_sizes = 0
+    equations = array(ID)
+    if isinstance(parser, MorphismParser):
+        counter = parser.counter
+        num_morphs = len(parser.morphs)
+        num_merged = len(parser.obj_parent)
+        num_sizes = len(parser.obj_size)
+        sections += [array(ID, map(symbol, parser.morphs)),
+                     array(ID, (domain for domain, _ in parser.morphs.values())),
+                     array(ID, (codomain for _, codomain in parser.morphs.values())),
+                     array(ID, parser.obj_parent.keys()), array(ID, parser.obj_parent.values()),
+                     array(ID, parser.obj_size.keys()), array(ID, parser.obj_size.values())]
+        # each equation is its number of chains, then each chain's length followed by its morphisms
+        for chains in parser.equations:
+            equations.append(len(chains))
+            for chain in chains:
+                equations.append(len(chain))
+                equations.extend(map(symbol, chain))
+    sections.append(equations)
+    if layout:
+        flags |= HAS_LAYOUT
+        layout_name, scale, _ = LAYOUT_PARAMS
+        positions = parser.position_nodes(scale, layout_name)
+        sections.append(array("d", (coordinate for node in core.nodes for coordinate in positions[node])))
+
+    blob = "\0".join(strings.labels).encode()
+    header = HEADER.pack(MAGIC, digest, kind, flags, counter, len(strings), len(blob), len(nodes), len(edge_src),
+                         num_morphs, num_merged, num_sizes, len(equations))
+    if sys.byteorder != "little":
+        for section in sections:
+            section.byteswap()
+    # written to a temporary file and renamed, so a reader never sees half a snapshot
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(header)
+        f.write(blob)
+        for section in sections:
+            section.tofile(f)
+    os.replace(temp_path, path)
+
+
+def read_snapshot(path: str, parser_class: Type[Parser], digest: Optional[bytes] = None) -> Optional[Parser]:
+    """
+    Reads a snapshot written by ``save_snapshot``.
+    :param parser_class: ``DiagramParser`` or ``MorphismParser``, whichever the snapshot was written from
+    :param digest: the ``source_hash`` of the source the snapshot should be of, or ``None`` to not check
+    :return: a parser holding the diagram, or ``None`` if there's no valid snapshot for ``digest`` at ``path``
+    """
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    if len(data) < HEADER.size:
+        return None
+    (magic, snapshot_digest, kind, flags, counter, num_strings, blob_size, num_nodes, num_edges, num_morphs,
+     num_merged, num_sizes, num_equations) = HEADER.unpack_from(data)
+    if magic != MAGIC or kind != KINDS[parser_class] or (digest is not None and snapshot_digest != digest):
+        return None
+    counts = ([num_nodes] * 2 + [num_edges] * 3 + [num_morphs] * 3 + [num_merged] * 2 + [num_sizes] * 2
+              + [num_equations])
+    layout_size = 2 * num_nodes if flags & HAS_LAYOUT else 0
+    if len(data) != HEADER.size + blob_size + 8 * (sum(counts) + layout_size):
+        return None  # truncated, or not a snapshot at all
+
+    view = memoryview(data)
+    pos = HEADER.size + blob_size
+    strings = view[HEADER.size:pos].tobytes().decode().split("\0") if num_strings else []
+    sections = []
+    for count in counts:
+        section = array(ID)
+        section.frombytes(view[pos:pos + 8 * count])
+        pos += 8 * count
+        sections.append(section)
+    layout = array("d")
+    layout.frombytes(view[pos:pos + 8 * layout_size])
+    if sys.byteorder != "little":
+        for section in sections + [layout]:
+            section.byteswap()
+    (nodes, node_labels, edge_src, edge_dst, edge_labels, morphs, morph_domains, morph_codomains, merged, merged_into,
+     sized, sizes, equations) = sections
+
+    strings.append(None)  # so the symbol -1 is None
+    node_list = nodes.tolist() if flags & INT_NODES else [strings[symbol] for symbol in nodes]
+    if node_labels == nodes and not flags & INT_NODES:
+        label_list = node_list.copy()  # every object labelled with itself, as DiagramParser does by default
+    else:
+        label_list = [strings[symbol] for symbol in node_labels]
+    core = CompactGraph.from_arrays(node_list, label_list, edge_src, edge_dst,
+                                    [strings[symbol] for symbol in edge_labels])
+
+    parser = parser_class()
+    parser.core = core
+    if isinstance(parser, MorphismParser):
+        parser.counter = counter
+        parser.morphs = {strings[symbol]: (domain, codomain)
+                         for symbol, domain, codomain in zip(morphs, morph_domains, morph_codomains)}
+        parser.obj_parent = dict(zip(merged, merged_into))
+        parser.obj_size = dict(zip(sized, sizes))
+        pos = 0
+        while pos < len(equations):
+            num_chains = equations[pos]
+            pos += 1
+            chains = []
+            for _ in range(num_chains):
+                length = equations[pos]
+                chains.append([strings[symbol] for symbol in equations[pos + 1:pos + 1 + length]])
+                pos += 1 + length
+            parser.equations.append(chains)
+    cache = Converter.layout_cache
+    if layout_size and cache is not None:
+        # the key is a hash of the whole diagram, so this takes about as long as reading it
+        cache.put(cache.key(core, *LAYOUT_PARAMS), [[layout[i], layout[i + 1]] for i in range(0, layout_size, 2)])
+    return parser
+
+
+def load(filepath: str, parser_class: Type[Parser] = DiagramParser, snapshot_path: Optional[str] = None,
+         layout: bool = False) -> Parser:
+    """
+    Parses ``filepath`` with ``parser_class``, or reads the snapshot of it if there is one for the file's current
+    contents. Otherwise the snapshot is written after parsing, so the next load is fast.
+    :param parser_class: ``DiagramParser`` or ``MorphismParser``
+    :param snapshot_path: where the snapshot is kept, by default ``filepath`` followed by ``".snap"``
+    :param layout: whether a new snapshot should also store the default layout, which is put in
+    ``Converter.layout_cache`` when the snapshot is read
+    :return: a parser holding the diagram, as if ``parser_class(filepath)`` had been called
+    """
+    if snapshot_path is None:
+        snapshot_path = filepath + ".snap"
+    with open(filepath, "rb") as f:
+        digest = source_hash(f.read())
+    parser = read_snapshot(snapshot_path, parser_class, digest)
+    if parser is not None:
+        return parser
+    parser = parser_class(filepath)
+    save_snapshot(parser, snapshot_path, digest, layout)
+    return parser
@@ -0,0 +1,69 @@
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Callable, ContextManager, Iterator, Optional
+
+
+class Stats:
+    """
+    Records how long each stage of a conversion takes, and counts of the work done, when given to
+    ``Converter.stats`` or a parser. The stages are:
+
+    * ``"tokenize"`` and ``"build graph"``: parsing a file, see ``DiagramParser`` and ``MorphismParser``, and
+      ``"parse chunks"`` in place of ``"tokenize"`` when ``MorphismParser`` is given ``workers``
+    * ``"search"``, ``"parse paths"`` and ``"find links"``: the parts of ``to_morphism_representation``
+    * ``"planarity"``, ``"layout"`` and ``"pack"``: ``position_nodes``, when the layout isn't cached, and packing its
+      components if they are laid out separately
+    * ``"emit"``: writing out the text of a representation or diagram
+
+    and the counts are ``"nodes visited"`` and ``"paths stored"`` by the search, ``"equations"`` found by it, and
+    ``"contractions"`` of objects made while parsing morphisms.
+
+    Times and counts add up over every conversion the stats are used for.
+    """
+
+    def __init__(self, callback: Optional[Callable[[str, float], None]] = None):
+        """
+        :param callback: called with the name of each stage and the seconds it took, as soon as it finishes
+        """
+        self.seconds: dict[str, float] = {}
+        self.counts: dict[str, int] = {}
+        self.callback = callback
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+        Times the body of a ``with`` statement as part of the stage ``name``.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.seconds[name] = self.seconds.get(name, 0.0) + elapsed
+            if self.callback is not None:
+                self.callback(name, elapsed)
+
+    def count(self, name: str, amount: int = 1):
+        self.counts[name] = self.counts.get(name, 0) + amount
+
+    def clear(self):
+        self.seconds.clear()
+        self.counts.clear()
+
+    def as_dict(self) -> dict[str, dict]:
+        """
+        :return: the times and counts recorded so far, e.g. to be written as JSON
+        """
+        return {"seconds": dict(self.seconds), "counts": dict(self.counts)}
+
+    def __repr__(self) -> str:
+        return f"Stats(seconds={self.seconds}, counts={self.counts})"
+
+
+def stage(stats: Optional[Stats], name: str) -> ContextManager:
+    """
+    :return: ``stats.stage(name)``, or a context manager that does nothing if ``stats`` is ``None``
+    """
+    if stats is None:
+        return nullcontext()
+    return stats.stage(name)
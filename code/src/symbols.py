@@ -0,0 +1,40 @@
+from typing import Iterable
+
+
+class SymbolTable:
+    """
+    Gives each distinct label an integer id, its symbol, and keeps a single copy of it. Every occurrence of a label
+    read from a file is a new string, so passing them through ``intern`` means a label repeated across millions of
+    morphisms is only stored once.
+    """
+
+    def __init__(self, labels: Iterable[str] = ()):
+        self.labels: list[str] = []  # symbol -> label
+        self.symbols: dict[str, int] = {}
+        for label in labels:
+            self.symbol(label)
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def __contains__(self, label: str) -> bool:
+        return label in self.symbols
+
+    def __getitem__(self, symbol: int) -> str:
+        return self.labels[symbol]
+
+    def symbol(self, label: str) -> int:
+        """
+        :return: the symbol of ``label``, adding it to the table if it's new
+        """
+        symbol = self.symbols.get(label)
+        if symbol is None:
+            symbol = self.symbols[label] = len(self.labels)
+            self.labels.append(label)
+        return symbol
+
+    def intern(self, label: str) -> str:
+        """
+        :return: the copy of ``label`` kept by the table, which is ``label`` itself the first time it's seen
+        """
+        return self.labels[self.symbol(label)]
@@ -0,0 +1,155 @@
+import re
+from typing import Iterable, Iterator, Optional
+
+
+def _nested_group_pattern(depth: int) -> str:
+    """
+    Python's regexes can't match arbitrarily nested braces, so this builds one matching a balanced group on a single
+    line with up to ``depth`` levels of braces.
+
+    Each level is written as text, then any number of nested groups each followed by more text. There is only one way
+    for it to match a given string, so a group that fails to match can't cause catastrophic backtracking, without
+    needing the possessive quantifiers only available from Python 3.11.
+    """
+    interior = r"[^{}\n]*"
+    for _ in range(depth - 1):
+        interior = r"[^{}\n]*(?:\{" + interior + r"\}[^{}\n]*)*"
+    return r"\{" + interior + r"\}"
+
+
+# anything nested deeper than this falls back to counting braces in extract_label
+_GROUP = re.compile(_nested_group_pattern(5))
+# every token, including line breaks, the start of comments, and a lone "{" when _GROUP can't match
+_TOKEN = re.compile(_GROUP.pattern + r"|^L[^{\n]*|[=%\n{]", re.MULTILINE)
+
+
+def extract_label(text: str, start_pos: int, end: Optional[int] = None) -> tuple[str, int]:
+    """
+    Extracts a balanced ``{...}`` group. Groups on a single line are matched by a compiled regex, anything else is
+    found by jumping between braces with ``str.find`` rather than inspecting every character.
+    :param text: text containing the label, should be of the form ``"some text{Label}some more text"``.
+    :param start_pos: the position of the first character of the Label, i.e. just after the opening "``{``".
+    :param end: the position to stop searching at, defaults to the end of ``text``.
+    :return: tuple of the form ``({Label},`` the position of the closing "``}``"+1``)``
+    """
+    if end is None:
+        end = len(text)
+    match = _GROUP.match(text, start_pos - 1, end)
+    if match is not None:
+        return match.group(), match.end()
+    unmatched_brackets = 1  # we should always start with an unmatched bracket
+    i = start_pos
+    while True:
+        close = text.find("}", i, end)
+        if close == -1:
+            raise Exception("Unmatched \"{\"\n" + text[start_pos - 1:end])
+        opening = text.find("{", i, close)
+        if opening == -1:
+            unmatched_brackets -= 1
+            i = close + 1
+            if unmatched_brackets == 0:
+                return text[start_pos - 1:i], i  # include the opening {
+        else:
+            unmatched_brackets += 1
+            i = opening + 1
+
+
+def scan_line(text: str, start: int = 0, end: Optional[int] = None) -> list[str]:
+    """
+    Splits a single line into its tokens. A token is either a whole ``{...}`` group, braces included, or ``"="``.
+    Anything after a ``%`` outside of a group is a comment and is dropped, as is any other text between groups. If the
+    line starts with ``L`` the first token is ``"L"``, marking it as a label line. Any text between the ``L`` and the
+    first ``{`` is kept in that token, so parsers can reject it.
+    :param text: the text containing the line
+    :param start: the position the line starts at
+    :param end: the position the line ends at, defaults to the end of ``text``.
+    :return: the tokens of the line in order
+    """
+    if end is None:
+        end = len(text)
+    tokens = []
+    search = _TOKEN.search
+    i = start
+    while True:
+        match = search(text, i, end)
+        if match is None:
+            return tokens
+        token = match.group()
+        i = match.end()
+        if token == "%":
+            return tokens
+        elif token == "{":
+            # too deeply nested for the regex, or unbalanced
+            token, i = extract_label(text, i, end)
+        elif token == "\n":
+            continue
+        tokens.append(token)
+
+
+def scan(text: str) -> Iterator[list[str]]:
+    """
+    Tokenizes a whole buffer in a single pass, without splitting it into separate line strings first.
+    :param text: the contents of a diagram or morphism file
+    :return: a generator yielding the tokens of each line, see ``scan_line``
+    """
+    tokens = _TOKEN.findall(text)
+    if "{" in tokens:
+        # some group couldn't be matched by the regex, so fall back to scanning line by line
+        yield from _scan_by_line(text)
+        return
+    line = []
+    in_comment = False
+    for token in tokens:
+        if token == "\n":
+            yield line
+            line = []
+            in_comment = False
+        elif in_comment:
+            continue
+        elif token == "%":
+            in_comment = True
+        else:
+            line.append(token)
+    if line or (text and text[-1] != "\n"):
+        yield line
+
+
+def _scan_by_line(text: str) -> Iterator[list[str]]:
+    pos = 0
+    length = len(text)
+    while pos < length:
+        line_end = text.find("\n", pos)
+        if line_end == -1:
+            line_end = length
+        yield scan_line(text, pos, line_end)
+        pos = line_end + 1
+
+
+def scan_lines(lines: Iterable[str]) -> Iterator[list[str]]:
+    """
+    Tokenizes a stream of lines, see ``scan_line``.
+    :param lines: an iterable of lines
+    :return: a generator yielding the tokens of each line
+    """
+    for line in lines:
+        yield scan_line(line)
+
+
+def split_chains(tokens: list[str]) -> list[list[str]]:
+    """
+    Splits the tokens of a line of the morphism representation into the composed morphisms either side of each ``=``.
+    :param tokens: tokens from ``scan_line``
+    :return: a list of the non-empty chains of morphisms, each chain being written left to right as in the line
+    """
+    chains = []
+    chain = []
+    for token in tokens:
+        if token == "=":
+            if chain:
+                chains.append(chain)
+            chain = []
+        elif token[0] != "L":
+            chain.append(token)
+    if chain:
+        chains.append(chain)
+    return chains
@@ -0,0 +1,129 @@
+import contextlib
+import io
+import multiprocessing
+import os
+import shutil
+import tempfile
+import unittest
+
+import src.batch
+from src.batch import convert_batch, convert_file, find_inputs, main
+from src.converter import Converter
+
+if __name__ == '__main__':
+    unittest.main()
+
+
+class TestFindInputs(unittest.TestCase):
+    def test_directory(self):
+        files = find_inputs(["testfiles/graph_txt"])
+        self.assertEqual(7, len(files))
+        self.assertEqual(sorted(files), files)
+
+    def test_glob(self):
+        self.assertEqual(["testfiles/morphisms_txt/fig8_long_fst.txt", "testfiles/morphisms_txt/fig8_long_last.txt",
+                          "testfiles/morphisms_txt/fig8_long_mid.txt"],
+                         find_inputs(["testfiles/morphisms_txt/fig8*"]))
+
+
+class TestConvertBatch(unittest.TestCase):
+    def test_keeps_order(self):
+        paths = find_inputs(["testfiles/graph_txt"])
+        results = convert_batch(paths, "diagram", "diagram", workers=2)
+        self.assertEqual(paths, [result.path for result in results])
+        for path, result in zip(paths, results):
+            self.assertIsNone(result.error)
+            self.assertEqual(convert_file(path, "diagram", "diagram"), result.output)
+
+    def test_failures_are_reported(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as f:
+            f.write("{f}{A}{B}\n{g}{A}\n")
+        self.addCleanup(os.remove, f.name)
+        paths = [f.name, "testfiles/graph_txt/exfig.txt", "testfiles/missing.txt"]
+        results = convert_batch(paths, "diagram", "morphism", workers=2)
+        self.assertIn("Invalid number of objects", results[0].error)
+        self.assertIsNone(results[1].error)
+        self.assertEqual(2, results[1].output.count("="))
+        self.assertTrue(results[2].error.startswith("FileNotFoundError"))
+
+    def test_tikzcd(self):
+        results = convert_batch(["testfiles/graph_txt/exfig.txt"], "diagram", "tikzcd")
+        self.assertTrue(results[0].output.startswith("\\begin{tikzcd}"))
+
+    def test_unknown_format(self):
+        self.assertRaises(ValueError, convert_batch, [], "latex", "tikz")
+
+    def test_no_workers(self):
+        self.assertRaises(ValueError, convert_batch, [], "diagram", "tikz", workers=0)
+
+    @unittest.skipUnless(multiprocessing.get_start_method() == "fork", "workers must inherit the patched _convert")
+    def test_worker_dies(self):
+        convert = src.batch._convert
+
+        def crash_on_exfig(job):
+            if job[0].endswith("/exfig.txt"):
+                os._exit(1)
+            return convert(job)
+
+        self.addCleanup(setattr, src.batch, "_convert", convert)
+        src.batch._convert = crash_on_exfig
+        paths = find_inputs(["testfiles/graph_txt"])
+        results = convert_batch(paths, "diagram", "diagram", workers=2)
+        self.assertEqual(paths, [result.path for result in results])
+        for path, result in zip(paths, results):
+            if path.endswith("/exfig.txt"):
+                self.assertTrue(result.error.startswith("BrokenProcessPool"))
+            else:
+                self.assertIsNone(result.error)
+
+
+class TestMain(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        for sub in ("one", "two"):
+            os.mkdir(os.path.join(self.dir, sub))
+            shutil.copy("testfiles/graph_txt/exfig.txt", os.path.join(self.dir, sub, "a.txt"))
+
+    def run_main(self, argv: list[str]) -> tuple[int, str]:
+        stderr = io.StringIO()
+        with contextlib.redirect_stderr(stderr):
+            status = main(argv + ["-j", "1"])
+        return status, stderr.getvalue()
+
+    def test_workers_validated(self):
+        with contextlib.redirect_stderr(io.StringIO()) as stderr:
+            self.assertRaises(SystemExit, main, ["--from", "diagram", "-j", "0", os.path.join(self.dir, "one")])
+        self.assertIn("must be at least 1", stderr.getvalue())
+
+    def test_writes_outputs(self):
+        out = os.path.join(self.dir, "out")
+        status, _ = self.run_main(["--from", "diagram", "--to", "morphism", "-o", out,
+                                   os.path.join(self.dir, "one")])
+        self.assertEqual(0, status)
+        self.assertEqual(["a.txt"], os.listdir(out))
+
+    def test_name_collision(self):
+        out = os.path.join(self.dir, "out")
+        status, errors = self.run_main(["--from", "diagram", "--to", "tikz", "-o", out,
+                                        os.path.join(self.dir, "one"), os.path.join(self.dir, "two")])
+        self.assertEqual(1, status)
+        self.assertIn("already written for", errors)
+        self.assertEqual(["a.tex"], os.listdir(out))
+
+    def test_input_not_overwritten(self):
+        one = os.path.join(self.dir, "one")
+        status, errors = self.run_main(["--from", "diagram", "--to", "morphism", "-o", one, one])
+        self.assertEqual(1, status)
+        self.assertIn("it is one of the inputs", errors)
+        with open(os.path.join(one, "a.txt")) as f, open("testfiles/graph_txt/exfig.txt") as expected:
+            self.assertEqual(expected.read(), f.read())
+
+    def test_layout_cache(self):
+        self.addCleanup(setattr, Converter, "layout_cache", Converter.layout_cache)
+        cache = os.path.join(self.dir, "cache")
+        status, _ = self.run_main(["--from", "diagram", "--to", "tikz", "--layout-cache", cache,
+                                   os.path.join(self.dir, "one")])
+        self.assertEqual(0, status)
+        self.assertEqual(1, len(os.listdir(cache)))
+
@@ -0,0 +1,71 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from src.cache import DiskCache, LayoutCache, LRUCache
+from src.compact_graph import CompactGraph
+
+if __name__ == '__main__':
+    unittest.main()
+
+
+class TestLRUCache(unittest.TestCase):
+    def test_eviction(self):
+        cache = LRUCache(2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        self.assertEqual(1, cache.get("a"))
+        cache.put("c", 3)
+        # b was the least recently used
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(3, cache.get("c"))
+        self.assertEqual(2, len(cache))
+        self.assertEqual((2, 1), (cache.hits, cache.misses))
+
+
+class TestDiskCache(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+
+    def test_round_trip(self):
+        DiskCache(self.dir).put("key", [[1.5, 2.0]])
+        # a new cache, as in a later run
+        self.assertEqual([[1.5, 2.0]], DiskCache(self.dir).get("key"))
+        self.assertIsNone(DiskCache(self.dir).get("other"))
+
+    def test_eviction(self):
+        cache = DiskCache(self.dir, max_bytes=100)
+        for i in range(10):
+            cache.put(str(i), "x" * 20)
+            # make sure each file has a later modification time than the last
+            os.utime(os.path.join(self.dir, f"{i}.json"), (i, i))
+        files = sorted(os.listdir(self.dir))
+        self.assertLessEqual(len(files), 4)
+        self.assertIn("9.json", files)
+        self.assertNotIn("0.json", files)
+
+
+class TestLayoutCache(unittest.TestCase):
+    def test_key(self):
+        graph = CompactGraph.from_edges([("A", "B", "{f}"), ("B", "C", "{g}")])
+        key = LayoutCache.key(graph, 4)
+        self.assertEqual(key, LayoutCache.key(CompactGraph.from_edges([("A", "B", "{f}"), ("B", "C", "{g}")]), 4))
+        self.assertNotEqual(key, LayoutCache.key(graph, 5))
+        self.assertNotEqual(key, LayoutCache.key(CompactGraph.from_edges([("A", "B", "{f}"), ("B", "C", "{h}")]), 4))
+        graph.add_node("A", "X")
+        self.assertNotEqual(key, LayoutCache.key(graph, 4))
+
+    def test_tiers(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        cache = LayoutCache(directory=directory)
+        self.assertIsNone(cache.get("key"))
+        cache.put("key", [[0.0, 1.0]])
+        self.assertEqual([[0.0, 1.0]], cache.get("key"))
+        later = LayoutCache(directory=directory)
+        self.assertEqual([[0.0, 1.0]], later.get("key"))
+        self.assertEqual([[0.0, 1.0]], later.get("key"))
+        self.assertEqual({"hits": 2, "misses": 0, "memory_hits": 1, "memory_misses": 1, "disk_hits": 1,
+                          "disk_misses": 0}, later.stats())
@@ -0,0 +1,73 @@
+import unittest
+
+import networkx as nx
+
+from src.compact_graph import CompactGraph
+
+if __name__ == '__main__':
+    unittest.main()
+
+EXFIG = nx.DiGraph([
+    ("A", "B", {"label": "f"}),
+    ("A", "C", {"label": "g"}),
+    ("B", "C", {"label": "h"}),
+    ("D", "B", {"label": "i"}),
+    ("D", "C", {"label": "j"})
+])
+
+
+class TestCompactGraph(unittest.TestCase):
+    def test_interning(self):
+        graph = CompactGraph.from_edges([("A", "B", "f"), ("B", "C", "g"), ("A", "B", "h")])
+        self.assertEqual(["A", "B", "C"], graph.nodes)
+        self.assertEqual(2, graph.number_of_edges())
+        # like nx.DiGraph, adding an existing edge replaces its label
+        self.assertEqual("h", graph.edge_label(0, 1))
+        self.assertTrue(graph.has_edge("B", "C"))
+        self.assertFalse(graph.has_edge("C", "B"))
+
+    def test_degrees(self):
+        graph = CompactGraph.from_networkx(EXFIG)
+        self.assertEqual([2, 1, 0, 2], list(graph.out_degree))
+        self.assertEqual([0, 2, 3, 0], list(graph.in_degree))
+        self.assertEqual([1, 2], graph.successors(0))
+        self.assertEqual([0, 1, 3], graph.predecessors(2))
+
+    def test_networkx_round_trip(self):
+        graph = CompactGraph.from_networkx(EXFIG).to_networkx()
+        self.assertEqual(list(EXFIG.nodes.data()), list(graph.nodes.data()))
+        self.assertEqual(list(EXFIG.edges.data()), list(graph.edges.data()))
+
+    def test_reverse_matches_networkx(self):
+        graph = nx.DiGraph([(0, 3), (2, 1), (0, 1), (3, 1), (2, 3)])
+        reverse = CompactGraph.from_networkx(graph).reverse()
+        expected = graph.reverse()
+        for node in expected.nodes:
+            node_id = reverse.node_ids[node]
+            self.assertEqual(list(expected.adj[node]), [reverse.nodes[adj] for adj in reverse.successors(node_id)])
+
+    def test_from_arrays(self):
+        expected = CompactGraph.from_networkx(EXFIG)
+        graph = CompactGraph.from_arrays(expected.nodes, expected.node_labels, expected.edge_src, expected.edge_dst,
+                                         expected.edge_labels)
+        self.assertNotIn("edge_ids", vars(graph))
+        self.assertTrue(graph.has_edge("D", "C"))
+        self.assertEqual(expected.node_ids, graph.node_ids)
+        self.assertEqual(expected.edge_ids, graph.edge_ids)
+        self.assertRaises(AttributeError, getattr, graph, "missing")
+
+    def test_remove_edge(self):
+        graph = CompactGraph.from_networkx(EXFIG)
+        self.assertEqual(1, graph.remove_edge("A", "C"))
+        self.assertEqual(4, graph.number_of_edges())
+        self.assertFalse(graph.has_edge("A", "C"))
+        self.assertEqual([1], graph.successors(0))
+        self.assertEqual([1, 3], graph.predecessors(2))
+        expected = nx.DiGraph(EXFIG)
+        expected.remove_edge("A", "C")
+        self.assertEqual(list(expected.edges.data()), list(graph.to_networkx().edges.data()))
+        reverse = graph.reverse()
+        self.assertEqual(list(expected.reverse().edges),
+                         [(reverse.nodes[reverse.edge_src[edge]], reverse.nodes[reverse.edge_dst[edge]])
+                          for edge in reverse.edges()])
+
@@ -0,0 +1,70 @@
+import unittest
+
+from src.congruence import Congruence
+from src.morphism_parser import MorphismParser
+
+if __name__ == '__main__':
+    unittest.main()
+
+
+class TestCongruence(unittest.TestCase):
+    def test_equations(self):
+        congruence = Congruence(MorphismParser("testfiles/morphisms_txt/intro_ex_fig"))
+        self.assertTrue(congruence.equal("{$g$}{$f$}", "{$i$}{$h$}"))
+        # {$i$} = {$m$}{$l$} and {$h$} = {$k$}{$j$}, composed with other morphisms
+        self.assertTrue(congruence.equal("{$m$}{$l$}{$h$}", "{$g$}{$f$}"))
+        self.assertTrue(congruence.equal("{$m$}{$l$}{$k$}{$j$}", "{$g$}{$f$}"))
+        self.assertTrue(congruence.equal("{$l$}{$k$}{$n$}", "{$p$}"))
+        self.assertFalse(congruence.equal("{$m$}{$p$}", "{$m$}{$l$}{$k$}{$j$}"))
+
+    def test_different_objects(self):
+        congruence = Congruence(MorphismParser("testfiles/morphisms_txt/intro_ex_fig"))
+        self.assertFalse(congruence.equal("{$h$}", "{$g$}{$f$}"))
+        self.assertFalse(congruence.equal("{$f$}", "{$h$}"))
+
+    def test_incremental(self):
+        parser = MorphismParser()
+        parser.parse_line("{g}{f}")
+        parser.parse_line("{i}{h}")
+        congruence = Congruence(parser)
+        self.assertFalse(congruence.equal("{g}{f}", "{i}{h}"))
+        congruence.add_equation("{g}{f} = {i}{h}")
+        self.assertTrue(congruence.equal("{g}{f}", "{i}{h}"))
+        congruence.add_equation("{k}{g} = {l}")
+        self.assertTrue(congruence.equal("{k}{g}{f}", "{l}{f}"))
+        self.assertTrue(congruence.equal("{k}{i}{h}", "{l}{f}"))
+
+    def test_idempotent(self):
+        parser = MorphismParser()
+        parser.parse_line("{e}{e} = {e}")
+        parser.parse_line("{f}{e}")
+        congruence = Congruence(parser)
+        self.assertTrue(congruence.equal("{e}{e}{e}{e}", "{e}"))
+        self.assertTrue(congruence.equal("{f}{e}{e}", "{f}{e}"))
+        self.assertFalse(congruence.equal("{f}{e}", "{f}"))
+
+    def test_commuting_grid(self):
+        n = 8
+        parser = MorphismParser.from_stream(
+            f"{{g_{i + 1}{j}}}{{f_{i}{j}}} = {{f_{i}{j + 1}}}{{g_{i}{j}}}" for i in range(n) for j in range(n))
+        congruence = Congruence(parser)
+        right_then_down = "".join(f"{{f_{i}{n}}}" for i in reversed(range(n))) + \
+            "".join(f"{{g_0{j}}}" for j in reversed(range(n)))
+        down_then_right = "".join(f"{{g_{n}{j}}}" for j in reversed(range(n))) + \
+            "".join(f"{{f_{i}0}}" for i in reversed(range(n)))
+        self.assertTrue(congruence.equal(right_then_down, down_then_right))
+        # every composite of the grid is equal to one with the same ends, so there's a class for each object
+        self.assertEqual((n + 1) ** 2, len(congruence))
+
+    def test_max_classes(self):
+        parser = MorphismParser()
+        parser.parse_line("{e} = {e}{e}{e}")  # an idempotent-like endomorphism that grows every composite
+        parser.parse_line("{s}{e} = {e}{s}{s}")
+        congruence = Congruence(parser, max_classes=100)
+        with self.assertRaises(RuntimeError):
+            congruence.equal("{s}{e}", "{e}{s}")
+
+    def test_unknown_morphism(self):
+        congruence = Congruence(MorphismParser("testfiles/morphisms_txt/intro_ex_fig"))
+        with self.assertRaises(KeyError):
+            congruence.equal("{$g$}{$f$}", "{$x$}")
@@ -3,6 +3,7 @@ import unittest
 import networkx as nx
 
 from morphism_parser import MorphismParser
+from src.compact_graph import CompactGraph
 from src.converter import Converter
 
 # https://q.uiver.app/#q=WzAsOCxbMCwyLCIwIl0sWzEsMiwiMSJdLFsyLDEsIjIiXSxbMywyLCIzIl0sWzQsMiwiNCJdLFsyLDMsIjUiXSxbMSwwLCI2Il0sWzMsMCwiNyJdLFswLDEsImYiLDJdLFsxLDIsImciXSxbMiwzLCJoIl0sWzMsNCwiaSJdLFsxLDUsImoiLDJdLFs1LDMsImsiLDJdLFswLDYsImwiXSxbNiw3LCJtIl0sWzcsNCwibiJdXQ
@@ -257,6 +258,75 @@ class TestToLatex(unittest.TestCase):
         print(parser.to_tikz_diagram())
 
 
+    def test_layout_cached(self):
+        parser = Converter()
+        parser.graph = nx.DiGraph(EXAMPLE_FIG)
+        hits = Converter.layout_cache.hits
+        positions = parser.position_nodes()
+        self.assertEqual(positions, parser.position_nodes())
+        self.assertEqual(hits + 1, Converter.layout_cache.hits)
+        self.assertNotEqual(positions, parser.position_nodes(scale=2))
+
+    def test_layout_after_kept_reference_edited(self):
+        parser = Converter()
+        graph = parser.graph
+        graph.add_edge(0, 1, label="{f}")
+        parser.to_tikz_diagram()
+        graph.add_edge(1, 2, label="{g}")
+        self.assertEqual({0, 1, 2}, set(parser.position_nodes()))
+        self.assertIn("{g}", parser.to_tikz_diagram())
+
+    def test_wrong_length_cached_layout_ignored(self):
+        parser = Converter()
+        parser.graph = nx.DiGraph(EXAMPLE_FIG)
+        key = Converter.layout_cache.key(parser.compact_graph(), "spring", 4)
+        Converter.layout_cache.put(key, [[0.0, 0.0]])
+        self.assertEqual(set(EXAMPLE_FIG), set(parser.position_nodes()))
+
+
+class TestToTikzcd(unittest.TestCase):
+    def assert_arrows_reach_codomains(self, parser: Converter, graph: nx.DiGraph):
+        lines = parser.to_tikzcd_diagram().split("\n")
+        self.assertEqual(["\\begin{tikzcd}", "\\end{tikzcd}"], [lines[0], lines[-1]])
+        cells = {}
+        arrows = []
+        for i, row in enumerate(lines[1].split(" \\\\ ")):
+            for j, cell in enumerate(row.split(" & ")):
+                obj, *cell_arrows = cell.strip().split(" \\arrow")
+                if obj:
+                    cells[obj] = (i, j)
+                arrows.extend((i, j, arrow) for arrow in cell_arrows)
+        self.assertEqual(len(graph), len(cells))
+        reached = set()
+        for i, j, arrow in arrows:
+            direction, label = arrow[1:-1].split(", ")
+            i += direction.count("d") - direction.count("u")
+            j += direction.count("r") - direction.count("l")
+            reached.add((i, j, label))
+        expected = {cells[str(codomain)] + (f'"{label}"',) for _, codomain, label in graph.edges(data="label")}
+        self.assertEqual(expected, reached)
+
+    def test_planar(self):
+        parser = Converter()
+        parser.graph = nx.DiGraph(BRIDGE)
+        self.assert_arrows_reach_codomains(parser, BRIDGE)
+
+    def test_not_planar(self):
+        graph = nx.complete_graph(5, nx.DiGraph)
+        nx.set_edge_attributes(graph, {edge: "{%d%d}" % edge for edge in graph.edges}, "label")
+        parser = Converter()
+        parser.graph = graph
+        self.assert_arrows_reach_codomains(parser, graph)
+
+    def test_labels(self):
+        parser = Converter()
+        parser.core = CompactGraph.from_edges([(0, 1, "a,b"), (1, 1, "{e}")])
+        parser.core.node_labels[0] = "$\\bullet$"
+        diagram = parser.to_tikzcd_diagram()
+        self.assertIn('\\bullet \\arrow[r, "{a,b}"]', diagram)
+        self.assertIn('\\arrow[loop right, "{e}"]', diagram)
+
+
 class TestToDiagramRepresentation(unittest.TestCase):
     def test_exfig(self):
         parser = Converter()
@@ -300,6 +370,36 @@ class TestToDiagramRepresentation(unittest.TestCase):
 
         self.assertEquals(parser.to_diagram_representation(), expected_output)
 
+    def test_unlabelled_objects(self):
+        parser = Converter()
+        parser.graph = nx.DiGraph([("A", "B", {"label": "f"})])
+        parser.graph.nodes["B"]["label"] = "X"
+        self.assertEqual("L{B}{X}\n{f}{A}{B}", parser.to_diagram_representation())
+
+
+class TestGraph(unittest.TestCase):
+    def test_core_reused(self):
+        parser = Converter()
+        parser.graph = nx.DiGraph(EXAMPLE_FIG)
+        core = parser.compact_graph()
+        parser.to_morphism_representation()
+        self.assertIs(core, parser.compact_graph())
+
+    def test_edits_seen(self):
+        parser = Converter()
+        parser.graph = nx.DiGraph(EXAMPLE_FIG)
+        self.assertEqual(5, parser.compact_graph().number_of_edges())
+        parser.graph.add_edge(0, 4, label="{k}")
+        self.assertEqual(6, parser.compact_graph().number_of_edges())
+
+    def test_kept_reference_edited(self):
+        parser = Converter()
+        parser.core = CompactGraph.from_edges([(0, 1, "{f}")])
+        graph = parser.graph
+        self.assertEqual("", parser.to_morphism_representation())
+        graph.add_edge(1, 2, label="{g}")
+        self.assertEqual("{g}{f}", parser.to_morphism_representation())
+
 
 class TestToMorphisms(unittest.TestCase):
     def can_graph_be_reconstructed(self, graph: nx.DiGraph):
@@ -342,6 +442,34 @@ class TestToMorphisms(unittest.TestCase):
         ])
         self.assertEquals(parser.to_morphism_representation(), "{g}{f}")
 
+    def test_three_links(self):
+        parser = Converter()
+        parser.graph = nx.DiGraph([
+            (0, 1, {"label": "{f}"}),
+            (1, 2, {"label": "{g}"}),
+            (2, 3, {"label": "{h}"})
+        ])
+        self.assertEqual("{h}{g}{f}", parser.to_morphism_representation())
+
+    def test_square_with_tail(self):
+        self.can_graph_be_reconstructed(nx.DiGraph([
+            (0, 1, {"label": "{f}"}),
+            (0, 2, {"label": "{g}"}),
+            (1, 3, {"label": "{h}"}),
+            (2, 3, {"label": "{i}"}),
+            (3, 4, {"label": "{j}"}),
+            (4, 5, {"label": "{k}"}),
+            (5, 6, {"label": "{l}"})
+        ]))
+
+    def test_long_chain(self):
+        # longer than Python's recursion limit
+        parser = Converter()
+        parser.graph = nx.DiGraph([(i, i + 1, {"label": f"{{f{i}}}"}) for i in range(5000)])
+        representation = parser.to_morphism_representation()
+        self.assertTrue(representation.startswith("{f4999}{f4998}"))
+        self.assertTrue(representation.endswith("{f1}{f0}"))
+
     def test_limit(self):
         self.can_graph_be_reconstructed(LIMIT_DEF)
 
@@ -398,3 +526,164 @@ class TestToMorphisms(unittest.TestCase):
 
     def test_wedge_example(self):
         self.can_graph_be_reconstructed(WEDGE)
+
+
+class TestIncremental(unittest.TestCase):
+    def assert_matches_full(self, parser: Converter):
+        full = Converter()
+        full.graph = nx.DiGraph(parser.graph)
+        expected = set(full.to_morphism_representation().split("\n")) - {""}
+        self.assertEqual(expected, set(parser.morphism_equations()))
+
+    def test_add(self):
+        parser = Converter()
+        for domain, codomain, label in BRIDGE.edges.data("label"):
+            parser.add_morphism(label, domain, codomain)
+            self.assert_matches_full(parser)
+        parser.add_morphism("{x}", 4, 0)
+        self.assert_matches_full(parser)
+
+    def test_remove_splits_component(self):
+        parser = Converter()
+        parser.graph = nx.DiGraph(FIG_8)
+        self.assert_matches_full(parser)
+        parser.remove_morphism(2, 4)
+        parser.remove_morphism(2, 6)
+        self.assert_matches_full(parser)
+        self.assertEqual(4, parser.morphism_component(0).core.number_of_edges())
+        self.assertEqual(2, parser.morphism_component(5).core.number_of_edges())
+        parser.graph.add_node(9)
+        self.assertIsNone(parser.morphism_component(9))
+
+    def test_shared_equations(self):
+        parser = Converter()
+        for i in (0, 3):
+            parser.add_morphism("{f}", i, i + 1)
+            parser.add_morphism("{g}", i + 1, i + 2)
+        self.assertEqual({"{g}{f}"}, set(parser.morphism_equations()))
+        parser.remove_morphism(0, 1)
+        self.assertEqual({"{g}{f}"}, set(parser.morphism_equations()))
+        parser.remove_morphism(3, 4)
+        self.assertEqual(set(), set(parser.morphism_equations()))
+
+    def test_remove_missing(self):
+        parser = Converter()
+        parser.add_morphism("{f}", 0, 1)
+        parser.add_morphism("{g}", 1, 2)
+        self.assertRaises(KeyError, parser.remove_morphism, 0, 2)
+        self.assertRaises(KeyError, parser.remove_morphism, 0, 3)
+        self.assertEqual({"{g}{f}"}, set(parser.morphism_equations()))
+        parser.remove_morphism(1, 2)
+        self.assertEqual(set(), set(parser.morphism_equations()))
+
+    def test_other_edits(self):
+        parser = Converter()
+        parser.add_morphism("{f}", 0, 1)
+        parser.graph.add_edge(1, 2, label="{g}")
+        self.assertEqual({"{g}{f}"}, set(parser.morphism_equations()))
+
+
+
+class TestCanonicalHash(unittest.TestCase):
+    @staticmethod
+    def converter(edges) -> Converter:
+        converter = Converter()
+        converter.core = CompactGraph.from_edges(edges)
+        return converter
+
+    def test_equation_order(self):
+        with open("testfiles/morphisms_txt/intro_ex_fig") as f:
+            lines = [line for line in f.read().splitlines() if not line.startswith("%")]
+        first = MorphismParser.from_stream(lines)
+        second = MorphismParser.from_stream(reversed(lines))
+        self.assertNotEqual(first.to_diagram_representation(), second.to_diagram_representation())
+        self.assertEqual(first.canonical_hash(), second.canonical_hash())
+
+    def test_object_names(self):
+        renamed = {node: f"X{node}" for node in BRIDGE}
+        first = self.converter(BRIDGE.edges.data("label"))
+        second = self.converter(reversed([(renamed[domain], renamed[codomain], label)
+                                          for domain, codomain, label in BRIDGE.edges.data("label")]))
+        self.assertEqual(first.canonical_hash(object_labels=False), second.canonical_hash(object_labels=False))
+        # objects without labels are displayed as their names
+        self.assertNotEqual(first.canonical_hash(), second.canonical_hash())
+
+    def test_different_diagrams(self):
+        bridge = self.converter(BRIDGE.edges.data("label"))
+        relabelled = self.converter((domain, codomain, "{f}" if label == "{g}" else label)
+                                    for domain, codomain, label in BRIDGE.edges.data("label"))
+        reversed_edge = self.converter((codomain, domain, label) if label == "{g}" else (domain, codomain, label)
+                                       for domain, codomain, label in BRIDGE.edges.data("label"))
+        hashes = {converter.canonical_hash() for converter in (bridge, relabelled, reversed_edge)}
+        self.assertEqual(3, len(hashes))
+
+    def test_repeated_labels(self):
+        # every object of a cycle looks the same, but a chain's can be told apart by how far they are from its ends
+        cycle = self.converter((i, (i + 1) % 4, "{f}") for i in range(4))
+        shifted = self.converter(((i + 2) % 4, (i + 3) % 4, "{f}") for i in range(4))
+        chain = self.converter((i, i + 1, "{f}") for i in range(5))
+        shifted_chain = self.converter((4 - i, 5 - i, "{f}") for i in range(5))
+        self.assertEqual(cycle.canonical_hash(object_labels=False), shifted.canonical_hash(object_labels=False))
+        self.assertEqual(chain.canonical_hash(object_labels=False), shifted_chain.canonical_hash(object_labels=False))
+        self.assertNotEqual(cycle.canonical_hash(object_labels=False), chain.canonical_hash(object_labels=False))
+
+
+class TestCycleMethod(unittest.TestCase):
+    def assert_reconstructed(self, graph: nx.DiGraph):
+        for diagram in (graph, nx.reverse(graph)):
+            parser = Converter()
+            parser.graph = nx.DiGraph(diagram)
+            representation = parser.to_morphism_representation(method="cycles")
+            morph_parser = MorphismParser.from_stream(representation.splitlines())
+            self.assertTrue(nx.is_isomorphic(parser.graph, morph_parser.graph), representation)
+
+    def test_reconstructed(self):
+        for graph in (BRIDGE, GOGGLES, STAGGERED, DOUBLY_STAGGERED, EXAMPLE_FIG, HOUSE, INTRO_EXFIG, THREE_BRANCHES,
+                      FIG_8, WEDGE, BIG_CYCLE_TRIANGLES, BULKY_DIAMOND, BULKIER_DIAMOND, CYCLE):
+            self.assert_reconstructed(graph)
+
+    def test_equations(self):
+        parser = Converter()
+        parser.graph = nx.DiGraph([("A", "B", {"label": "{f}"}), ("A", "C", {"label": "{g}"}),
+                                   ("B", "C", {"label": "{h}"}), ("D", "B", {"label": "{i}"}),
+                                   ("D", "C", {"label": "{j}"})])
+        self.assertEqual({"{g} = {h}{f}", "{h}{i} = {j}"},
+                         set(parser.to_morphism_representation(method="cycles").split("\n")))
+
+    def test_loops(self):
+        parser = Converter()
+        parser.graph = nx.DiGraph([(0, 0, {"label": "{e}"}), (0, 1, {"label": "{f}"}), (1, 2, {"label": "{g}"}),
+                                   (2, 0, {"label": "{h}"})])
+        self.assertEqual({"{e}{e}", "{f}{h}{g}{f}", "{e}{h}"},
+                         set(parser.to_morphism_representation(method="cycles").split("\n")))
+
+    def test_isolated_morphism(self):
+        parser = Converter()
+        parser.graph = nx.DiGraph([(0, 1, {"label": "{f}"})])
+        self.assertEqual("{f}", parser.to_morphism_representation(method="cycles"))
+
+    def test_unknown_method(self):
+        self.assertRaises(ValueError, Converter().to_morphism_representation, "paths")
+
+
+class TestParallel(unittest.TestCase):
+    @staticmethod
+    def atlas() -> Converter:
+        # copies of several diagrams side by side, some sharing labels, so some lines come from more than one
+        graph = nx.DiGraph()
+        for i, diagram in enumerate((BRIDGE, FIG_8, INTRO_EXFIG, CYCLE, BRIDGE, HOUSE)):
+            graph.update(nx.relabel_nodes(diagram, {node: (i, node) for node in diagram}))
+        graph.add_node((6, 0))
+        parser = Converter()
+        parser.graph = graph
+        return parser
+
+    def test_same_lines(self):
+        parser = self.atlas()
+        for method in ("search", "cycles"):
+            expected = set(parser.to_morphism_representation(method).split("\n"))
+            for workers in (1, 2):
+                self.assertEqual(expected, set(parser.to_morphism_representation(method, workers).split("\n")))
+
+    def test_no_workers(self):
+        self.assertRaises(ValueError, self.atlas().to_morphism_representation, workers=0)
@@ -1,3 +1,4 @@
+import io
 import unittest
 
 from networkx import DiGraph
@@ -83,3 +84,57 @@ class TestTxtToGraph(unittest.TestCase):
     def test_intro_exfig(self):
         prs = DiagramParser("testfiles/graph_txt/intro_ex_fig.txt")
         print(prs.to_tikz_diagram())
+
+
+class TestParseStream(unittest.TestCase):
+    def test_matches_file(self):
+        with open("testfiles/graph_txt/exfig_some_endo.txt", "r") as f:
+            prs = DiagramParser.from_stream(io.StringIO(f.read()))
+        expected = DiagramParser("testfiles/graph_txt/exfig_some_endo.txt")
+        self.assertEqual(list(expected.graph.nodes.data()), list(prs.graph.nodes.data()))
+        self.assertEqual(list(expected.graph.edges.data()), list(prs.graph.edges.data()))
+
+    def test_yields_morphisms(self):
+        lines = ["L{A}{X}\n", "{f}{A}{B}\n", "% a comment\n", "{g}{B}{C} % another\n"]
+        prs = DiagramParser()
+        records = prs.parse_stream(iter(lines))
+        self.assertEqual(("{f}", "{A}", "{B}"), next(records))
+        # the graph is built as the stream is read
+        self.assertEqual(1, prs.graph.number_of_edges())
+        self.assertEqual(("{g}", "{B}", "{C}"), next(records))
+        self.assertRaises(StopIteration, next, records)
+        self.assertEqual("{X}", prs.graph.nodes["{A}"]["label"])
+
+    def test_late_label_line(self):
+        self.assertRaises(Exception, DiagramParser.from_stream, ["{f}{A}{B}\n", "L{A}{X}\n"])
+
+    def test_label_line_syntax(self):
+        for line in ("Lx{A}{X}\n", "L {A}{X}\n", "L\n"):
+            with self.assertRaisesRegex(Exception, "Unexpected Character"):
+                DiagramParser.from_stream([line, "{f}{A}{B}\n"])
+
+    def test_assigned_graph(self):
+        prs = DiagramParser()
+        prs.graph = DiGraph([("{A}", "{B}", {"label": "{f}"})])
+        prs.graph.nodes["{A}"]["label"] = "{X}"
+        list(prs.parse_stream(["{g}{A}{C}\n"]))
+        self.assertEqual("{X}", prs.graph.nodes["{A}"]["label"])
+        self.assertEqual("{C}", prs.graph.nodes["{C}"]["label"])
+
+    def test_add_morphism(self):
+        prs = DiagramParser.from_stream(["L{A}{X}\n", "{f}{A}{B}\n"])
+        prs.add_morphism("{g}", "{B}", "{C}")
+        self.assertEqual("{X}", prs.graph.nodes["{A}"]["label"])
+        self.assertEqual("{C}", prs.graph.nodes["{C}"]["label"])
+        self.assertEqual(["{g}{f}"], list(prs.morphism_equations()))
+
+
+class TestSymbols(unittest.TestCase):
+    def test_repeated_labels_shared(self):
+        prs = DiagramParser.from_stream(["L{A}{X}\n", "L{B}{X}\n", "{f}{A}{B}\n", "{f}{B}{C}\n", "{g}{C}{A}\n"])
+        core = prs.core
+        self.assertIs(core.edge_labels[0], core.edge_labels[1])
+        self.assertIs(core.node_labels[0], core.node_labels[1])
+        self.assertEqual(["{A}", "{X}", "{B}", "{f}", "{C}", "{g}"], prs.symbols.labels)
+        self.assertEqual(3, prs.symbols.symbol("{f}"))
+        self.assertEqual("{g}", prs.symbols[5])
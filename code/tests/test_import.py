@@ -0,0 +1,37 @@
+import os
+import subprocess
+import sys
+import unittest
+
+if __name__ == '__main__':
+    unittest.main()
+
+CODE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run(code: str) -> str:
+    """
+    Runs ``code`` in a fresh interpreter from the tests directory.
+    :return: what it printed
+    """
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([CODE_DIR, os.path.join(CODE_DIR, "src")]))
+    return subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True, env=env,
+                          cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+
+
+class TestLazyImport(unittest.TestCase):
+    def test_conversion_without_networkx(self):
+        output = run("import sys\n"
+                     "from src.diagram_parser import DiagramParser\n"
+                     "from src.morphism_parser import MorphismParser\n"
+                     "DiagramParser('testfiles/graph_txt/exfig.txt').to_morphism_representation()\n"
+                     "MorphismParser('testfiles/morphisms_txt/square.txt').to_diagram_representation()\n"
+                     "print('networkx' in sys.modules)")
+        self.assertEqual("False", output)
+
+    def test_imported_when_needed(self):
+        output = run("import sys\n"
+                     "from src.diagram_parser import DiagramParser\n"
+                     "DiagramParser('testfiles/graph_txt/exfig.txt').to_tikz_diagram()\n"
+                     "print('networkx' in sys.modules)")
+        self.assertEqual("True", output)
@@ -0,0 +1,274 @@
+import unittest
+
+import networkx as nx
+import numpy
+
+from src.compact_graph import CompactGraph
+from src.converter import Converter
+from src.cache import LayoutCache
+from src.layout import (_repulsion, count_crossings, feedback_arcs, force_positions, grid_cells, layered_positions,
+                        pack_rectangles, planar_grid_positions, rescale)
+
+if __name__ == '__main__':
+    unittest.main()
+
+
+def squares(n: int) -> CompactGraph:
+    """
+    :return: an ``n`` by ``n`` grid of commuting squares
+    """
+    edges = []
+    for i in range(n + 1):
+        for j in range(n + 1):
+            if i < n:
+                edges.append(((i, j), (i + 1, j), f"{{f_{i}_{j}}}"))
+            if j < n:
+                edges.append(((i, j), (i, j + 1), f"{{g_{i}_{j}}}"))
+    return CompactGraph.from_edges(edges)
+
+
+def crosses(p1, p2, q1, q2) -> bool:
+    def orientation(a, b, c):
+        return (b[0] - a[0]) * (c[1] - a[1]) - (b[1] - a[1]) * (c[0] - a[0])
+    return (orientation(p1, p2, q1) * orientation(p1, p2, q2) < 0
+            and orientation(q1, q2, p1) * orientation(q1, q2, p2) < 0)
+
+
+class TestPlanarGrid(unittest.TestCase):
+    def test_no_crossings(self):
+        graph = squares(4)
+        positions = planar_grid_positions(graph)
+        self.assertEqual(graph.number_of_nodes(), len(set(positions)))
+        for x, y in positions:
+            self.assertIsInstance(x, int)
+            self.assertIsInstance(y, int)
+        edges = [(graph.edge_src[edge], graph.edge_dst[edge]) for edge in graph.edges()]
+        for a, b in edges:
+            for c, d in edges:
+                if len({a, b, c, d}) == 4:
+                    self.assertFalse(crosses(positions[a], positions[b], positions[c], positions[d]))
+
+    def test_not_planar(self):
+        self.assertIsNone(planar_grid_positions(CompactGraph.from_networkx(nx.complete_graph(5, nx.DiGraph))))
+
+    def test_disconnected(self):
+        graph = CompactGraph.from_edges([(0, 1, "f"), (2, 3, "g"), (4, 4, "h")])
+        self.assertEqual(5, len(set(planar_grid_positions(graph))))
+
+    def test_rescale(self):
+        self.assertEqual([(-2.0, -1.0), (2.0, 1.0)], rescale([(0, 0), (4, 2)], 2))
+        self.assertEqual([(0.0, 0.0)], rescale([(3, 3)], 4))
+
+
+class TestPositionNodes(unittest.TestCase):
+    def setUp(self):
+        self.addCleanup(setattr, Converter, "layout_cache", Converter.layout_cache)
+        Converter.layout_cache = None
+
+    def test_auto(self):
+        converter = Converter()
+        converter.core = squares(3)
+        self.assertEqual(converter.position_nodes(layout="grid"), converter.position_nodes())
+        converter.graph = nx.complete_graph(5, nx.DiGraph)
+        self.assertEqual(5, len(converter.position_nodes()))
+        self.assertRaises(ValueError, converter.position_nodes, layout="grid")
+
+    def test_deterministic(self):
+        converter = Converter()
+        converter.core = squares(3)
+        positions = converter.position_nodes(scale=2, layout="grid")
+        self.assertEqual(positions, converter.position_nodes(scale=2, layout="grid"))
+        self.assertAlmostEqual(2, max(max(abs(x), abs(y)) for x, y in positions.values()))
+
+    def test_unknown_layout(self):
+        self.assertRaises(ValueError, Converter().position_nodes, layout="circle")
+
+    def test_spring(self):
+        converter = Converter()
+        converter.core = squares(2)
+        self.assertEqual(9, len(converter.position_nodes(layout="spring")))
+
+
+class TestComponents(unittest.TestCase):
+    def setUp(self):
+        self.addCleanup(setattr, Converter, "layout_cache", Converter.layout_cache)
+        Converter.layout_cache = LayoutCache()
+
+    @staticmethod
+    def diagram(num_components: int) -> CompactGraph:
+        graph = CompactGraph()
+        for component in range(num_components):
+            for i in range(component + 1):
+                graph.add_edge((component, i), (component, i + 1), f"{{f_{component}_{i}}}")
+        graph.add_node("lonely")
+        return graph
+
+    def test_pack_rectangles(self):
+        sizes = [(3, 1), (1, 2), (2, 2), (1, 1), (4, 0.5)]
+        corners = pack_rectangles(sizes)
+        self.assertEqual(corners, pack_rectangles(sizes))
+        boxes = [(x, y, x + w, y + h) for (x, y), (w, h) in zip(corners, sizes)]
+        for a in range(len(boxes)):
+            self.assertLessEqual(boxes[a][3], 0)
+            for b in range(a):
+                overlap_x = min(boxes[a][2], boxes[b][2]) - max(boxes[a][0], boxes[b][0])
+                overlap_y = min(boxes[a][3], boxes[b][3]) - max(boxes[a][1], boxes[b][1])
+                self.assertFalse(overlap_x > 0 and overlap_y > 0, (sizes[a], sizes[b]))
+        self.assertEqual([], pack_rectangles([]))
+
+    def test_components_apart(self):
+        converter = Converter()
+        converter.core = self.diagram(4)
+        positions = converter.position_nodes(layout="layered", components=True)
+        self.assertEqual(converter.core.number_of_nodes(), len(positions))
+        self.assertAlmostEqual(4, max(max(abs(x), abs(y)) for x, y in positions.values()))
+        boxes = []
+        for component in range(4):
+            points = [positions[(component, i)] for i in range(component + 2)]
+            boxes.append((min(x for x, _ in points), min(y for _, y in points),
+                          max(x for x, _ in points), max(y for _, y in points)))
+        for a in range(4):
+            for b in range(a):
+                self.assertTrue(boxes[a][2] < boxes[b][0] or boxes[b][2] < boxes[a][0]
+                                or boxes[a][3] < boxes[b][1] or boxes[b][3] < boxes[a][1])
+        self.assertEqual(positions, converter.position_nodes(layout="layered", components=True))
+
+    def test_cached_separately(self):
+        converter = Converter()
+        converter.core = self.diagram(3)
+        converter.position_nodes(layout="force", components=True, seed=1)
+        self.assertEqual(3, Converter.layout_cache.misses)
+        # only the new component is laid out
+        converter.core.add_edge("A", "B", "{g}")
+        converter.position_nodes(layout="force", components=True, seed=1)
+        self.assertEqual(4, Converter.layout_cache.misses)
+        self.assertEqual(3, Converter.layout_cache.hits)
+
+    def test_one_component(self):
+        converter = Converter()
+        converter.core = squares(2)
+        self.assertEqual(converter.position_nodes(), converter.position_nodes(components=True))
+
+    def test_workers(self):
+        converter = Converter()
+        converter.core = self.diagram(5)
+        expected = converter.position_nodes(components=True)
+        Converter.layout_cache = None
+        self.assertEqual(expected, converter.position_nodes(workers=2))
+        self.assertRaises(ValueError, converter.position_nodes, workers=0)
+
+
+class TestLayered(unittest.TestCase):
+    def test_feedback_arcs(self):
+        graph = CompactGraph.from_networkx(nx.DiGraph([(0, 1), (1, 2), (2, 0), (2, 3), (3, 3)]))
+        arcs = feedback_arcs(graph)
+        self.assertEqual({graph.edge_id(2, 0), graph.edge_id(3, 3)}, arcs)
+        self.assertEqual(set(), feedback_arcs(squares(3)))
+
+    def test_morphisms_point_down(self):
+        graph = squares(4)
+        positions = layered_positions(graph)
+        for edge in graph.edges():
+            self.assertGreater(positions[graph.edge_src[edge]][1], positions[graph.edge_dst[edge]][1])
+        self.assertEqual(graph.number_of_nodes(), len(set(positions)))
+
+    def test_cycles(self):
+        graph = CompactGraph.from_networkx(nx.DiGraph([(0, 1), (1, 2), (2, 0), (1, 1)]))
+        self.assertEqual(3, len(set(layered_positions(graph))))
+
+    def test_crossings_removed(self):
+        # the second layer starts in the reverse of the order of the first
+        graph = CompactGraph.from_edges([(0, 5, "f"), (1, 4, "g"), (2, 3, "h"), (0, 4, "i")])
+        positions = layered_positions(graph)
+        edges = [(graph.edge_src[edge], graph.edge_dst[edge]) for edge in graph.edges()]
+        for a, b in edges:
+            for c, d in edges:
+                if len({a, b, c, d}) == 4:
+                    self.assertFalse(crosses(positions[a], positions[b], positions[c], positions[d]))
+        self.assertRaises(ValueError, layered_positions, graph, heuristic="mean")
+
+    def test_count_crossings(self):
+        down = [[2, 3], [2], [], []]
+        self.assertEqual(1, count_crossings([0, 1], down, [0, 1, 0, 1]))
+        self.assertEqual(0, count_crossings([0, 1], down, [1, 0, 0, 1]))
+
+    def test_long_morphisms(self):
+        graph = CompactGraph.from_edges([(0, 1, "f"), (1, 2, "g"), (0, 2, "h")])
+        positions = layered_positions(graph)
+        self.assertEqual([0.0, -1.0, -2.0], [y for _, y in positions])
+        # without a dummy node the long morphism doesn't take up room in the middle layer
+        self.assertEqual(0.0, layered_positions(graph, max_dummies=0)[1][0])
+
+    def test_selected(self):
+        self.addCleanup(setattr, Converter, "layout_cache", Converter.layout_cache)
+        Converter.layout_cache = None
+        converter = Converter()
+        converter.core = squares(2)
+        self.assertNotEqual(converter.position_nodes(layout="grid"), converter.position_nodes(layout="layered"))
+        self.assertIn("\\draw", converter.to_tikz_diagram(layout="layered", iterations=2))
+        converter.graph = nx.complete_graph(5, nx.DiGraph)
+        self.assertEqual(converter.position_nodes(layout="layered"), converter.position_nodes())
+
+
+class TestForce(unittest.TestCase):
+    def test_repulsion_approximation(self):
+        # compared with the exact repulsion between every pair of nodes
+        rng = numpy.random.default_rng(1)
+        pos = rng.random((300, 2))
+        delta = pos[:, None, :] - pos[None, :, :]
+        distance2 = (delta ** 2).sum(axis=2)
+        numpy.fill_diagonal(distance2, numpy.inf)
+        exact = (delta * (0.01 / distance2)[:, :, None]).sum(axis=1)
+        approx = _repulsion(pos, 5, 0.1)
+        self.assertLess(numpy.linalg.norm(approx - exact) / numpy.linalg.norm(exact), 0.1)
+
+    def test_seeded(self):
+        graph = squares(5)
+        positions = force_positions(graph, seed=3)
+        self.assertEqual(positions, force_positions(graph, seed=3))
+        self.assertNotEqual(positions, force_positions(graph, seed=4))
+        self.assertEqual(graph.number_of_nodes(), len(set(positions)))
+
+    def test_converges(self):
+        # a looser threshold stops sooner
+        graph = squares(5)
+        self.assertNotEqual(force_positions(graph, threshold=1e-4), force_positions(graph, threshold=1.0))
+        self.assertEqual(force_positions(graph, iterations=1), force_positions(graph, threshold=1.0))
+
+    def test_connected_nodes_closer(self):
+        graph = CompactGraph.from_edges([(0, 1, "f"), (2, 3, "g"), (3, 4, "h"), (4, 2, "i")])
+        positions = numpy.array(force_positions(graph, iterations=200))
+        self.assertLess(numpy.hypot(*(positions[0] - positions[1])), numpy.hypot(*(positions[0] - positions[3])))
+
+    def test_small(self):
+        self.assertEqual([], force_positions(CompactGraph()))
+        self.assertEqual([(0.0, 0.0)], force_positions(CompactGraph.from_edges([(0, 0, "f")])))
+
+    def test_selected(self):
+        self.addCleanup(setattr, Converter, "layout_cache", Converter.layout_cache)
+        Converter.layout_cache = None
+        converter = Converter()
+        converter.core = squares(2)
+        self.assertEqual(converter.position_nodes(layout="force", seed=1),
+                         converter.position_nodes(layout="force", seed=1))
+        self.assertIn("\\draw", converter.to_tikz_diagram(layout="force"))
+
+
+class TestGridCells(unittest.TestCase):
+    def test_distinct_values(self):
+        self.assertEqual([(1, 0), (0, 1), (1, 2)], grid_cells([(-1.0, 0.0), (0.0, 0.5), (1.0, 0.0)]))
+
+    def test_same_position(self):
+        self.assertEqual([(0, 0), (0, 1)], grid_cells([(0.0, 0.0), (0.0, 0.0)]))
+
+    def test_rounded_to_grid(self):
+        rng = numpy.random.default_rng(0)
+        positions = [(float(x), float(y)) for x, y in rng.random((200, 2))]
+        cells = grid_cells(positions)
+        self.assertEqual(200, len(set(cells)))
+        # about four cells per node
+        self.assertLess(max(row for row, _ in cells) * max(column for _, column in cells), 1000)
+        for a in range(200):
+            for b in range(200):
+                if cells[a][0] == cells[b][0] and positions[a][0] < positions[b][0]:
+                    self.assertLess(cells[a][1], cells[b][1])
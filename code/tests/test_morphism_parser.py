@@ -1,4 +1,6 @@
+import os
 import random
+import tempfile
 import unittest
 
 import networkx as nx
@@ -13,89 +15,42 @@ class TestAddEdge(unittest.TestCase):
     def test_adding_to_empty(self):
         parser = MorphismParser("testfiles/blank.txt")
         expected_morphs = {"{f}": (0, 1)}
-        expected_morphs_by_domain = {0: ["{f}"]}
-        expected_morphs_by_codomain = {1: ["{f}"]}
         parser.add_edge("{f}", 0, 1)
         self.assertEqual(expected_morphs, parser.morphs)
-        self.assertEqual(expected_morphs_by_domain, parser.morphs_by_domain)
-        self.assertEqual(expected_morphs_by_codomain, parser.morphs_by_codomain)
 
     def test_adding_to_existing_func(self):
         parser = MorphismParser("testfiles/blank.txt")
         parser.morphs = {"{g}": (0, 2), "{h}": (3, 1)}
-        parser.morphs_by_domain = {0: ["{g}"], 3: ["{h}"]}
-        parser.morphs_by_codomain = {2: ["{g}"], 1: ["{h}"]}
 
         expected_morphs = {"{f}": (0, 1), "{g}": (0, 2), "{h}": (3, 1)}
-        expected_morphs_by_domain = {0: ["{g}", "{f}"], 3: ["{h}"]}
-        expected_morphs_by_codomain = {1: ["{h}", "{f}"], 2: ["{g}"]}
 
         parser.add_edge("{f}", 0, 1)
+        parser.add_edge("{g}", 4, 5)
 
         self.assertEqual(expected_morphs, parser.morphs)
-        self.assertEqual(expected_morphs_by_domain, parser.morphs_by_domain)
-        self.assertEqual(expected_morphs_by_codomain, parser.morphs_by_codomain)
 
 
 class TestContractDomain(unittest.TestCase):
 
-    def verify_result(self, expected_edges, expected_graph, expected_morphs, expected_morphs_by_codomain,
-                      expected_morphs_by_domain, parser):
-        nonempty_morphs_by_domain = {}
-        for key in parser.morphs_by_domain.keys():
-            if parser.morphs_by_domain[key]:
-                nonempty_morphs_by_domain[key] = parser.morphs_by_domain[key]
-        nonempty_morphs_by_codomain = {}
-        for key in parser.morphs_by_codomain.keys():
-            if parser.morphs_by_codomain[key]:
-                nonempty_morphs_by_codomain[key] = parser.morphs_by_codomain[key]
-        for edge in list(parser.graph.edges.data()):
-            expected_edges.pop(expected_edges.index(edge))
-        self.assertTrue(expected_edges == [])
-        self.assertTrue(nx.is_isomorphic(parser.graph, expected_graph))
+    def verify_result(self, expected_edges, expected_morphs, parser):
+        parser.build_graph()
+        self.assertEqual(sorted(expected_edges), sorted(parser.graph.edges.data("label")))
         self.assertEqual(expected_morphs, parser.morphs)
-        self.assertEqual(expected_morphs_by_domain, nonempty_morphs_by_domain)
-        self.assertEqual(expected_morphs_by_codomain, nonempty_morphs_by_codomain)
 
     def test_two_maps(self):
         parser = MorphismParser("testfiles/blank.txt")
         parser.morphs = {"f": (0, 1), "g": (2, 3)}
-        parser.morphs_by_domain = {0: ["f"], 2: ["g"]}
-        parser.morphs_by_codomain = {1: ["f"], 3: ["g"]}
-        parser.graph = nx.DiGraph([(0, 1, {"name": "f"}), (2, 3, {"name": "g"})])
 
-        parser.contract_objects(2, 0)
+        self.assertEqual(0, parser.contract_objects(2, 0))
 
-        expected_edges = [(0, 1, {"name": "f"}), (0, 3, {"name": "g"})]
-        expected_graph = nx.DiGraph([(0, 1, {"name": "f"}), (0, 3, {"name": "g"})])
+        expected_edges = [(0, 1, "f"), (0, 3, "g")]
         expected_morphs = {"f": (0, 1), "g": (0, 3)}
-        expected_morphs_by_domain = {0: ["f", "g"]}
-        expected_morphs_by_codomain = {1: ["f"], 3: ["g"]}
 
-        self.verify_result(expected_edges, expected_graph, expected_morphs, expected_morphs_by_codomain,
-                           expected_morphs_by_domain, parser)
+        self.verify_result(expected_edges, expected_morphs, parser)
 
     def test_when_domains_in_chains(self):
         parser = MorphismParser("testfiles/blank.txt")
         parser.morphs = {"f": (0, 1), "g": (1, 2), "h": (3, 4), "k": (4, 5)}
-        parser.morphs_by_domain = {
-            0: ["f"],
-            1: ["g"],
-            3: ["h"],
-            4: ["k"]
-        }
-        parser.morphs_by_codomain = {
-            1: ["f"],
-            2: ["g"],
-            4: ["h"],
-            5: ["k"]
-        }
-        parser.graph = nx.DiGraph([
-            (0, 1, {"name": "f"}),
-            (1, 2, {"name": "g"}),
-            (3, 4, {"name": "h"}),
-            (4, 5, {"name": "k"}),
-        ])
 
         expected_morphs = {
             "f": (0, 1),
@@ -103,48 +58,42 @@ class TestContractDomain(unittest.TestCase):
             "h": (3, 1),
             "k": (1, 5)
         }
-        expected_morphs_by_domain = {
-            0: ["f"],
-            1: ["g", "k"],
-            3: ["h"],
-        }
-
-        expected_morphs_by_codomain = {
-            1: ["f", "h"],
-            2: ["g"],
-            5: ["k"],
-        }
 
         expected_edges = [
-            (0, 1, {"name": "f"}),
-            (1, 2, {"name": "g"}),
-            (3, 1, {"name": "h"}),
-            (1, 5, {"name": "k"}),
+            (0, 1, "f"),
+            (1, 2, "g"),
+            (3, 1, "h"),
+            (1, 5, "k"),
         ]
-        expected_graph = nx.DiGraph(expected_edges)
 
         parser.contract_objects(4, 1)
 
-        self.verify_result(expected_edges, expected_graph, expected_morphs, expected_morphs_by_codomain,
-                           expected_morphs_by_domain, parser)
+        self.verify_result(expected_edges, expected_morphs, parser)
 
     def test_merging_codomains(self):
         parser = MorphismParser("testfiles/blank.txt")
         parser.morphs = {"f": (0, 1), "g": (2, 3)}
-        parser.morphs_by_domain = {0: ["f"], 2: ["g"]}
-        parser.morphs_by_codomain = {1: ["f"], 3: ["g"]}
-        parser.graph = nx.DiGraph([(0, 1, {"name": "f"}), (2, 3, {"name": "g"})])
 
         parser.contract_objects(3, 1)
 
-        expected_edges = [(0, 1, {"name": "f"}), (2, 1, {"name": "g"})]
-        expected_graph = nx.DiGraph(expected_edges)
+        expected_edges = [(0, 1, "f"), (2, 1, "g")]
         expected_morphs = {"f": (0, 1), "g": (2, 1)}
-        expected_morphs_by_domain = {0: ["f"], 2: ["g"]}
-        expected_morphs_by_codomain = {1: ["f", "g"]}
 
-        self.verify_result(expected_edges, expected_graph, expected_morphs, expected_morphs_by_codomain,
-                           expected_morphs_by_domain, parser)
+        self.verify_result(expected_edges, expected_morphs, parser)
+
+    def test_larger_object_kept(self):
+        parser = MorphismParser("testfiles/blank.txt")
+        parser.morphs = {"f": (0, 1), "g": (2, 3), "h": (4, 5)}
+
+        parser.contract_objects(3, 1)
+        # 1 has already absorbed 3, so it is kept even though it is the object being contracted
+        self.assertEqual(1, parser.contract_objects(1, 5))
+        self.assertEqual(1, parser.contract_objects(5, 3))
+
+        expected_edges = [(0, 1, "f"), (2, 1, "g"), (4, 1, "h")]
+        expected_morphs = {"f": (0, 1), "g": (2, 1), "h": (4, 1)}
+
+        self.verify_result(expected_edges, expected_morphs, parser)
 
 
 class TestParseLine(unittest.TestCase):
@@ -173,6 +122,39 @@ class TestParseLine(unittest.TestCase):
         print(parser.to_tikz_diagram())
         self.assertTrue(nx.is_isomorphic(expected_graph, parser.graph))
 
+    def test_line_by_line(self):
+        parser = MorphismParser()
+        with open("testfiles/morphisms_txt/fig8_long_mid.txt", "r") as f:
+            for line in f:
+                parser.parse_line(line)
+        expected = MorphismParser("testfiles/morphisms_txt/fig8_long_mid.txt")
+        self.assertEqual(list(expected.graph.edges.data()), list(parser.graph.edges.data()))
+        # the graph is only rebuilt when something new has been parsed
+        core = parser.compact_graph()
+        self.assertIs(core, parser.compact_graph())
+        parser.parse_line("{x}{y}")
+        self.assertEqual(core.number_of_edges() + 2, parser.compact_graph().number_of_edges())
+
+    def test_add_morphism(self):
+        parser = MorphismParser()
+        parser.parse_line("{g}{f}={h}")
+        parser.build_graph()
+        domain, codomain = parser.morphs["{f}"]
+        parser.add_morphism("{k}", codomain, parser.counter)
+        self.assertEqual(domain, parser.morphs["{f}"][0])
+        self.assertEqual("$\\bullet$", parser.graph.nodes[parser.morphs["{k}"][1]]["label"])
+        self.assertRaises(Exception, parser.add_morphism, "{k}", 0, 1)
+        self.assertRaises(Exception, parser.add_morphism, "{x}", domain, codomain)
+        # later lines don't reuse the new object, and rebuilding the graph keeps the new morphism
+        parser.parse_line("{y}={z}")
+        self.assertEqual(5, parser.graph.number_of_edges())
+        self.assertEqual(len(set(parser.graph)), len(parser.graph))
+
+        parser.remove_morphism(domain, codomain)
+        self.assertNotIn("{f}", parser.morphs)
+        parser.parse_line("{w}")
+        self.assertEqual(5, parser.graph.number_of_edges())
+
     def test_intro_ex_fig(self):
         parser = MorphismParser("testfiles/morphisms_txt/intro_ex_fig")
         print(parser.to_tikz_diagram())
@@ -249,3 +231,45 @@ class TestMorphismParser(unittest.TestCase):
         print(list(parser.graph.edges))
         self.assertTrue(nx.is_isomorphic(expected_graph, parser.graph))
 
+
+    def test_from_stream(self):
+        with open("testfiles/morphisms_txt/exfig.txt", "r") as f:
+            parser = MorphismParser.from_stream(f.read().splitlines())
+        expected = MorphismParser("testfiles/morphisms_txt/exfig.txt")
+        self.assertTrue(nx.is_isomorphic(expected.graph, parser.graph))
+
+
+class TestChunks(unittest.TestCase):
+    def assert_same_parse(self, path: str, workers: int):
+        expected = MorphismParser(path)
+        parser = MorphismParser(path, workers=workers)
+        self.assertEqual(expected.counter, parser.counter)
+        self.assertEqual(expected.equations, parser.equations)
+        self.assertEqual([expected.find_object(obj) for obj in range(expected.counter)],
+                         [parser.find_object(obj) for obj in range(parser.counter)])
+        self.assertEqual(expected.obj_size, parser.obj_size)
+        self.assertEqual(expected.morphs, parser.morphs)
+        self.assertEqual(expected.to_diagram_representation(), parser.to_diagram_representation())
+        self.assertEqual(set(expected.to_morphism_representation().split("\n")),
+                         set(parser.to_morphism_representation().split("\n")))
+
+    def test_same_as_sequential(self):
+        for name in ("exfig.txt", "fig8_long_mid.txt", "bubble.txt", "cycle.txt", "multi-edges.txt"):
+            for workers in (2, 3, 5):
+                with self.subTest(name=name, workers=workers):
+                    self.assert_same_parse(f"testfiles/morphisms_txt/{name}", workers)
+
+    def test_shuffled_grid(self):
+        lines = []
+        for i in range(6):
+            for j in range(6):
+                lines.append(f"{{g_{i}_{j + 1}}}{{f_{i}_{j}}} = {{f_{i}_{j + 1}}}{{g_{i}_{j}}}")
+        random.Random(0).shuffle(lines)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "grid.txt")
+            with open(path, "w", newline="") as f:
+                f.write("\r\n".join(lines))
+            self.assert_same_parse(path, 4)
+
+    def test_invalid_workers(self):
+        self.assertRaises(ValueError, MorphismParser, "testfiles/morphisms_txt/exfig.txt", workers=0)
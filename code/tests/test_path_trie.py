@@ -0,0 +1,28 @@
+import unittest
+
+from src.path_trie import PathTrie
+
+if __name__ == '__main__':
+    unittest.main()
+
+
+class TestPathTrie(unittest.TestCase):
+    def test_shared_prefix(self):
+        trie = PathTrie()
+        a = trie.add(-1, 0)
+        b = trie.add(a, 1)
+        c = trie.add(b, 2)
+        d = trie.add(b, 3)
+        self.assertEqual(4, len(trie))
+        self.assertEqual([0, 1, 2], trie.path(trie.add_span(c, 3)))
+        self.assertEqual([1, 3], trie.path(trie.add_span(d, 2)))
+        self.assertEqual([3], trie.path(trie.add_span(d, 1)))
+
+    def test_joined_spans(self):
+        trie = PathTrie()
+        first = trie.add(trie.add(-1, 0), 1)
+        second = trie.add(trie.add(-1, 2), 3)
+        tail = trie.add_span(second, 2)
+        self.assertEqual([0, 1, 2, 3], trie.path(trie.add_span(first, 2, tail)))
+        self.assertEqual([1, 2, 3], trie.path(trie.add_span(first, 1, tail)))
+        self.assertEqual(4, len(trie))
@@ -0,0 +1,109 @@
+import http.client
+import json
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import unittest
+
+from src.batch import convert_file
+from src.server import ConversionService, convert_text, make_server
+
+if __name__ == '__main__':
+    unittest.main()
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path: str):
+        super().__init__("localhost")
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.path)
+
+
+class TestConvertText(unittest.TestCase):
+    def test_same_as_file(self):
+        with open("testfiles/graph_txt/exfig.txt") as f:
+            text = f.read()
+        self.assertEqual(convert_file("testfiles/graph_txt/exfig.txt", "diagram", "morphism"),
+                         convert_text(text, "diagram", "morphism"))
+
+
+class TestServer(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.service = ConversionService(workers=1, cache_size=2)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.service.close()
+
+    def serve(self, **kwargs):
+        server = make_server(self.service, port=0, **kwargs)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def request(self, connection: http.client.HTTPConnection, method: str, path: str, body=None) -> tuple[int, dict]:
+        connection.request(method, path, None if body is None else json.dumps(body))
+        response = connection.getresponse()
+        return response.status, json.loads(response.read())
+
+    def test_convert(self):
+        server = self.serve()
+        connection = http.client.HTTPConnection(*server.server_address[:2])
+        self.addCleanup(connection.close)
+        with open("testfiles/morphisms_txt/square.txt") as f:
+            text = f.read()
+        expected = convert_file("testfiles/morphisms_txt/square.txt", "morphism", "diagram")
+        before = self.service.stats()
+        for _ in range(3):
+            status, body = self.request(connection, "POST", "/convert", {"text": text, "from": "morphism",
+                                                                         "to": "diagram"})
+            self.assertEqual(200, status)
+            self.assertEqual(expected, body["output"])
+        status, stats = self.request(connection, "GET", "/stats")
+        self.assertEqual(200, status)
+        # only the first request was converted, the others came from the cache
+        self.assertEqual(before["misses"] + 1, stats["misses"])
+        self.assertEqual(before["hits"] + 2, stats["hits"])
+
+    def test_errors(self):
+        server = self.serve()
+        connection = http.client.HTTPConnection(*server.server_address[:2])
+        self.addCleanup(connection.close)
+        status, body = self.request(connection, "POST", "/convert", {"text": "{f}{A}{B}\n{g}{A}\n"})
+        self.assertEqual(400, status)
+        self.assertIn("Invalid number of objects", body["error"])
+        status, body = self.request(connection, "POST", "/convert", {"text": "{f}{A}{B}", "to": "latex"})
+        self.assertEqual(400, status)
+        self.assertIn("Unknown output format", body["error"])
+        self.assertEqual(404, self.request(connection, "GET", "/convert")[0])
+        # the service still works after failing
+        status, body = self.request(connection, "POST", "/convert", {"text": "{f}{A}{B}", "to": "diagram"})
+        self.assertEqual((200, "{{f}}{{A}}{{B}}"), (status, body["output"]))
+
+    def test_unix_socket(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, "server.sock")
+        self.serve(socket_path=path)
+        connection = UnixHTTPConnection(path)
+        self.addCleanup(connection.close)
+        status, body = self.request(connection, "POST", "/convert", {"text": "{f}{A}{B}\n{g}{B}{C}", "to": "tikz"})
+        self.assertEqual(200, status)
+        self.assertIn("\\begin{tikzpicture}", body["output"])
+
+    def test_cache_is_bounded(self):
+        for i in range(5):
+            self.service.convert(f"{{f{i}}}{{A}}{{B}}", "diagram", "diagram")
+        self.assertEqual(2, self.service.stats()["entries"])
+
+    def test_no_workers(self):
+        self.assertRaises(ValueError, ConversionService, workers=0)
@@ -0,0 +1,93 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from src.cache import LayoutCache
+from src.converter import Converter
+from src.diagram_parser import DiagramParser
+from src.morphism_parser import MorphismParser
+from src.snapshot import load, read_snapshot, save_snapshot, source_hash
+
+if __name__ == '__main__':
+    unittest.main()
+
+
+class TestSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+
+    def copy(self, source: str) -> str:
+        path = os.path.join(self.dir, os.path.basename(source))
+        shutil.copy(source, path)
+        return path
+
+    def test_diagram_round_trip(self):
+        path = self.copy("testfiles/graph_txt/intro_ex_fig.txt")
+        expected = DiagramParser(path)
+        self.assertEqual(expected.to_diagram_representation(), load(path).to_diagram_representation())
+        with open(path, "rb") as f:
+            loaded = read_snapshot(path + ".snap", DiagramParser, source_hash(f.read()))
+        self.assertIsNotNone(loaded)
+        self.assertEqual(expected.core.nodes, loaded.core.nodes)
+        self.assertEqual(expected.core.node_labels, loaded.core.node_labels)
+        self.assertEqual(expected.to_diagram_representation(), loaded.to_diagram_representation())
+        self.assertEqual(expected.to_morphism_representation(), loaded.to_morphism_representation())
+
+    def test_labels(self):
+        path = self.copy("testfiles/graph_txt/exfig_some_endo.txt")
+        load(path)
+        self.assertEqual(DiagramParser(path).to_diagram_representation(), load(path).to_diagram_representation())
+
+    def test_morphism_round_trip(self):
+        path = self.copy("testfiles/morphisms_txt/fig8_long_mid.txt")
+        expected = MorphismParser(path)
+        load(path, MorphismParser)
+        loaded = read_snapshot(path + ".snap", MorphismParser)
+        self.assertEqual(expected.morphs, loaded.morphs)
+        self.assertEqual(expected.obj_parent, loaded.obj_parent)
+        self.assertEqual(expected.obj_size, loaded.obj_size)
+        self.assertEqual(expected.counter, loaded.counter)
+        self.assertEqual(expected.equations, loaded.equations)
+        self.assertEqual(expected.to_diagram_representation(), loaded.to_diagram_representation())
+        # still usable for further edits
+        loaded.add_morphism("{new}", 0, loaded.counter)
+        self.assertIn("{new}", loaded.to_diagram_representation())
+
+    def test_source_changed(self):
+        path = self.copy("testfiles/graph_txt/exfig.txt")
+        load(path)
+        with open(path, "a") as f:
+            f.write("\n{k}{C}{E}\n")
+        self.assertIn("{{k}}{{C}}{{E}}", load(path).to_diagram_representation())
+        self.assertIsNone(read_snapshot(path + ".snap", DiagramParser, source_hash("{f}{A}{B}")))
+        self.assertIsNone(read_snapshot(path + ".snap", MorphismParser))
+
+    def test_damaged(self):
+        path = self.copy("testfiles/graph_txt/exfig.txt")
+        snapshot_path = os.path.join(self.dir, "exfig.bin")
+        load(path, snapshot_path=snapshot_path)
+        with open(snapshot_path, "r+b") as f:
+            f.truncate(os.path.getsize(snapshot_path) - 1)
+        self.assertIsNone(read_snapshot(snapshot_path, DiagramParser))
+        self.assertEqual(DiagramParser(path).to_diagram_representation(),
+                         load(path, snapshot_path=snapshot_path).to_diagram_representation())
+        self.assertIsNotNone(read_snapshot(snapshot_path, DiagramParser))
+
+    def test_layout(self):
+        self.addCleanup(setattr, Converter, "layout_cache", Converter.layout_cache)
+        path = self.copy("testfiles/graph_txt/exfig.txt")
+        Converter.layout_cache = None
+        expected = DiagramParser(path).position_nodes()
+        load(path, layout=True)
+        Converter.layout_cache = LayoutCache()
+        loaded = load(path)
+        self.assertEqual(1, len(Converter.layout_cache.memory))
+        self.assertEqual(expected, loaded.position_nodes())
+        self.assertEqual(1, Converter.layout_cache.hits)
+
+    def test_unsupported_labels(self):
+        parser = DiagramParser()
+        parser.core.add_edge("A", "B", ("not", "a", "string"))
+        self.assertRaises(ValueError, save_snapshot, parser, os.path.join(self.dir, "x.snap"), source_hash(""))
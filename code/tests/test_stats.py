@@ -0,0 +1,73 @@
+import unittest
+
+from src.converter import Converter
+from src.diagram_parser import DiagramParser
+from src.morphism_parser import MorphismParser
+from src.stats import Stats
+
+if __name__ == '__main__':
+    unittest.main()
+
+
+class TestStats(unittest.TestCase):
+    def setUp(self):
+        self.addCleanup(setattr, Converter, "layout_cache", Converter.layout_cache)
+        Converter.layout_cache = None
+
+    def test_diagram_stages(self):
+        stats = Stats()
+        prs = DiagramParser("testfiles/graph_txt/exfig.txt", stats=stats)
+        rep = prs.to_morphism_representation()
+        prs.to_tikzcd_diagram()
+        self.assertEqual({"tokenize", "build graph", "search", "parse paths", "find links", "emit", "planarity",
+                          "layout"}, set(stats.seconds))
+        self.assertEqual(rep.count("\n") + 1, stats.counts["equations"])
+        self.assertGreater(stats.counts["nodes visited"], 0)
+        self.assertGreater(stats.counts["paths stored"], 0)
+        self.assertEqual(rep, DiagramParser("testfiles/graph_txt/exfig.txt").to_morphism_representation())
+
+    def test_contractions(self):
+        stats = Stats()
+        prs = MorphismParser("testfiles/morphisms_txt/square.txt", stats=stats)
+        # the two sides of the equation share their domain and codomain, and each side has a middle object
+        self.assertEqual(2, stats.counts["contractions"])
+        self.assertEqual(4, len(prs.core.nodes))
+        prs.to_diagram_representation()
+        self.assertIn("emit", stats.seconds)
+
+    def test_callback(self):
+        calls = []
+        stats = Stats(callback=lambda name, seconds: calls.append((name, seconds)))
+        prs = DiagramParser("testfiles/graph_txt/exfig.txt", stats=stats)
+        prs.to_morphism_representation()
+        self.assertEqual(["tokenize", "build graph", "search", "parse paths", "find links", "emit"],
+                         [name for name, _ in calls])
+        self.assertAlmostEqual(sum(stats.seconds.values()), sum(seconds for _, seconds in calls))
+
+    def test_shared(self):
+        self.addCleanup(setattr, Converter, "stats", Converter.stats)
+        Converter.stats = Stats()
+        DiagramParser("testfiles/graph_txt/exfig.txt").to_morphism_representation()
+        DiagramParser("testfiles/graph_txt/exfig.txt").to_morphism_representation()
+        self.assertEqual(2 * 2, Converter.stats.counts["equations"])
+        Converter.stats.clear()
+        self.assertEqual({"seconds": {}, "counts": {}}, Converter.stats.as_dict())
+
+    def test_disabled(self):
+        prs = DiagramParser("testfiles/graph_txt/exfig.txt")
+        self.assertIsNone(prs.stats)
+        prs.to_morphism_representation()
+        prs.position_nodes()
+
+    def test_incremental(self):
+        stats = Stats()
+        converter = Converter()
+        converter.stats = stats
+        converter.add_morphism("{f}", "A", "B")
+        self.assertEqual(0, stats.counts["equations"])
+        searched = stats.counts["nodes visited"]
+        converter.add_morphism("{g}", "B", "C")
+        # the component containing the new morphism is searched again
+        self.assertEqual(1, stats.counts["equations"])
+        self.assertGreater(stats.counts["nodes visited"], searched)
+        self.assertEqual(["{g}{f}"], list(converter.morphism_equations()))
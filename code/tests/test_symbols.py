@@ -0,0 +1,25 @@
+import unittest
+
+from src.symbols import SymbolTable
+
+if __name__ == '__main__':
+    unittest.main()
+
+
+class TestSymbolTable(unittest.TestCase):
+    def test_symbols(self):
+        table = SymbolTable(["{f}", "{g}"])
+        self.assertEqual(2, len(table))
+        self.assertEqual(1, table.symbol("{g}"))
+        self.assertEqual(2, table.symbol("{h}"))
+        self.assertEqual("{h}", table[2])
+        self.assertIn("{f}", table)
+        self.assertNotIn("{i}", table)
+
+    def test_intern(self):
+        table = SymbolTable()
+        first = "".join(["{", "f", "}"])
+        second = "".join(["{", "f", "}"])
+        self.assertIsNot(first, second)
+        self.assertIs(first, table.intern(first))
+        self.assertIs(first, table.intern(second))
@@ -0,0 +1,55 @@
+import unittest
+
+from src.tokenizer import extract_label, scan, scan_line, split_chains
+
+if __name__ == '__main__':
+    unittest.main()
+
+
+class TestExtractLabel(unittest.TestCase):
+    def test_nested(self):
+        line = '{\\mathbf{I}^{\\mathscal{A}}_{X,Y}}{B}'
+        self.assertEqual(('{\\mathbf{I}^{\\mathscal{A}}_{X,Y}}', 33), extract_label(line, 1))
+
+    def test_end(self):
+        self.assertEqual(('{A}', 4), extract_label('x{A}{B}', 2, 4))
+
+    def test_unmatched(self):
+        self.assertRaises(Exception, extract_label, '{A{B}', 1)
+        self.assertRaises(Exception, extract_label, '{A}', 1, 2)
+
+
+class TestScanLine(unittest.TestCase):
+    def test_morph_line(self):
+        self.assertEqual(["{f}", "{A}", "{B}"], scan_line("{f}{A}{B}\n"))
+
+    def test_comments(self):
+        self.assertEqual([], scan_line("% {f}{A}{B}"))
+        self.assertEqual(["{f}", "{A}"], scan_line("{f}{A}% {B}"))
+        self.assertEqual(["{50\\%}"], scan_line("{50\\%}"))
+
+    def test_label_line(self):
+        self.assertEqual(["L", "{A}", "{X}"], scan_line("L{A}{X}"))
+        self.assertEqual(["Lx ", "{A}", "{X}"], scan_line("Lx {A}{X}"))
+
+    def test_equations(self):
+        tokens = scan_line("{g}{f} = {i}{h = k}")
+        self.assertEqual(["{g}", "{f}", "=", "{i}", "{h = k}"], tokens)
+        self.assertEqual([["{g}", "{f}"], ["{i}", "{h = k}"]], split_chains(tokens))
+
+    def test_empty_chains(self):
+        self.assertEqual([["{g}"], ["{h}"]], split_chains(scan_line("= {g} = = {h}")))
+
+
+class TestScan(unittest.TestCase):
+    def test_matches_lines(self):
+        with open("testfiles/graph_txt/complex_labels.txt", "r") as f:
+            text = f.read()
+        self.assertEqual([scan_line(line) for line in text.splitlines()], list(scan(text)))
+
+    def test_deep_nesting(self):
+        label = "{a{b{c{d{e{f}}}}}}"
+        self.assertEqual([["{g}", label, "{B}"], ["{h}"]], list(scan("{g}" + label + "{B}\n{h}")))
+
+    def test_group_cannot_span_lines(self):
+        self.assertRaises(Exception, list, scan("{f\n}{A}{B}"))